@@ -0,0 +1 @@
+call devpython.bat src\bench.py %*
\ No newline at end of file
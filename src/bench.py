@@ -0,0 +1,470 @@
+import sys, argparse, os, time, json, platform, subprocess, tempfile, tracemalloc
+
+SCRIPT = os.path.abspath(__file__)
+SRC_DIR = os.path.dirname(SCRIPT)
+LIB_DIR = os.path.join(SRC_DIR, "lib")
+PIMO_DIR = os.path.dirname(SRC_DIR)
+
+sys.path += [SRC_DIR, LIB_DIR]
+
+import pimo
+import lib.info as info
+import lib.logger as logger
+import lib.incremental as incremental
+import lib.parser as parser
+import lib.synth as synth
+
+# Parse-only run of `pimo`, who prints the llvmlite modules it imported
+STARTUP_SCRIPT = f"""
+import sys, json
+sys.path.insert(0, {SRC_DIR!r})
+import pimo
+try: pimo.Main(sys.argv[1:]).start()
+finally: print(json.dumps(sorted(name for name in sys.modules if name.split(".")[0] == "llvmlite")))
+"""
+
+# Library preloaded in the sample programs, who writes how many times they
+# called `malloc` and `free`, and their peak resident memory in kilobytes, in
+# the file given by `PIMO_ALLOCATION_COUNTS`
+ALLOCATION_COUNTER_SOURCE = """
+#define _GNU_SOURCE
+#include <dlfcn.h>
+#include <fcntl.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+static unsigned long mallocs = 0, frees = 0;
+static void *(*real_malloc)(size_t) = NULL;
+static void (*real_free)(void *) = NULL;
+
+void *malloc(size_t size) {
+    if (!real_malloc) real_malloc = dlsym(RTLD_NEXT, "malloc");
+    mallocs++;
+    return real_malloc(size);
+}
+
+void free(void *pointer) {
+    if (!real_free) real_free = dlsym(RTLD_NEXT, "free");
+    if (pointer) frees++;
+    real_free(pointer);
+}
+
+static unsigned long read_peak_rss(void) {
+    /* Since the exec, unlike `ru_maxrss` who counts the forked process before it */
+    char status[4096];
+    int file = open("/proc/self/status", O_RDONLY);
+    if (file < 0) return 0;
+    ssize_t length = read(file, status, sizeof(status) - 1);
+    close(file);
+    if (length <= 0) return 0;
+    status[length] = 0;
+    char *line = strstr(status, "VmHWM:");
+    return line ? strtoul(line + 6, NULL, 10) : 0;
+}
+
+__attribute__((destructor)) static void write_counts(void) {
+    const char *path = getenv("PIMO_ALLOCATION_COUNTS");
+    if (!path) return;
+    char buffer[96];  /* Without allocating */
+    int length = snprintf(buffer, sizeof(buffer), "%lu %lu %lu\\n", mallocs, frees, read_peak_rss());
+    int file = open(path, O_WRONLY | O_CREAT | O_TRUNC, 0644);
+    if (file < 0) return;
+    if (write(file, buffer, length) < 0) {}
+    close(file);
+}
+"""
+
+class Bench():
+    """
+    Compiles synthetic programs of growing size, and records the time and the
+    peak memory of each compile phase.
+    """
+
+    class UnknownScenario(BaseException): ...
+    class InvalidResults(BaseException): ...
+    class UnsupportedPlatform(BaseException): ...
+
+    MIN_COMPARED_TIME = 0.001  # Shorter phases are too noisy to compare
+    STARTUP_PROGRAM = ("functions", 100)  # Scenario and size of the program parsed by the startup check
+    ALLOCATION_CHECKS = {  # Sample program of `tests/`: its exit code, and if its allocations are all "freed" or "none"
+        "leak.pim": (0, "freed"),  # A million iterations of loops with stacks
+        "arena.pim": (42, "none")  # The stacks are in the `#mem ~` arena
+    }
+
+    PHASES = ["read", "lex", "parse_blocks", "parse_rest", "compile", "backend", "optimize", "emit_object"]
+
+    def __init__(self, argv:list[str]) -> None:
+        self.arg_parser = argparse.ArgumentParser(prog="bench", description="Benchmark the Pimo compiler on synthetic programs.")
+        self.arg_parser.add_argument("-sc", "--scenarios", type=str, nargs="+", default=list(synth.SCENARIOS.keys()))  # For choose the scenarios to run
+        self.arg_parser.add_argument("-sz", "--sizes", type=int, nargs="+")  # For replace the default sizes of the scenarios
+        self.arg_parser.add_argument("-n", "--repeat", type=int, default=3)  # For the number of timed runs, the fastest is kept
+        self.arg_parser.add_argument("-o", "--output", type=str)  # For write the results in a JSON file
+        self.arg_parser.add_argument("-cmp", "--compare", type=str)  # For compare the results with a previous JSON file
+        self.arg_parser.add_argument("-th", "--threshold", type=float, default=1.25)  # For the slowdown ratio reported as a regression
+        self.arg_parser.add_argument("-g", "--generate", type=str)  # For only write the synthetic programs in a directory
+        self.arg_parser.add_argument("-opt", "--optimize", action="store_true")  # For run the optimization phase
+        self.arg_parser.add_argument("-ss", "--static-stacks", action="store_true")  # For compile with the stacks simulated at compile time
+        self.arg_parser.add_argument("-is", "--inline-slots", action="store_true")  # For compile with the scalars stored in the stack slots
+        self.arg_parser.add_argument("-fs", "--fitted-stacks", action="store_true")  # For compile with the stacks sized to their maximum depth
+        self.arg_parser.add_argument("-uc", "--unchecked", action="store_true")  # For compile without the checks of the bounded stacks
+        self.arg_parser.add_argument("-st", "--startup", action="store_true")  # For only check the startup of a parse-only run
+        self.arg_parser.add_argument("-sb", "--startup-budget", type=float, default=0.3)  # For the startup time allowed to a parse-only run, in seconds
+        self.arg_parser.add_argument("-mc", "--memory-checks", action="store_true")  # For only check the allocations and memory of the sample programs, on Linux
+        self.arg_parser.add_argument("-ip", "--incremental", type=int, default=0)  # For time this number of edits parsed again incrementally, against full parses
+        self.arg_parser.add_argument("-ul", "--uncolored-logs", action="store_true")  # For uncolored logs
+        self.arg_parser.add_argument("-ue", "--uncolored-errors", action="store_true")  # For uncolored error
+        self.args = vars(self.arg_parser.parse_args(argv))
+
+        self.scenarios:list[str] = self.args["scenarios"]
+        self.sizes:list[int] = self.args["sizes"]
+        self.repeat:int = max(1, self.args["repeat"])
+        self.output:str = self.args["output"]
+        self.compare:str = self.args["compare"]
+        self.threshold:float = self.args["threshold"]
+        self.generate:str = self.args["generate"]
+        self.optimize:bool = self.args["optimize"]
+        self.static_stacks:bool = self.args["static_stacks"]
+        self.inline_slots:bool = self.args["inline_slots"]
+        self.fitted_stacks:bool = self.args["fitted_stacks"]
+        self.unchecked:bool = self.args["unchecked"]
+        self.startup:bool = self.args["startup"]
+        self.startup_budget:float = self.args["startup_budget"]
+        self.memory_checks:bool = self.args["memory_checks"]
+        self.incremental:int = self.args["incremental"]
+
+        self.logger = logger.Logger(True, self.args["uncolored_logs"])
+        self.error_logger = logger.ErrorLogger(self.args["uncolored_errors"])
+
+        for scenario in self.scenarios:
+            if not scenario in synth.SCENARIOS.keys():
+                self.raise_exception(self.UnknownScenario, scenario, f"Available scenarios : {', '.join(synth.SCENARIOS.keys())}")
+
+    def raise_exception(self, exception:BaseException, *args):
+        error_args = f"\n{self.error_logger.start}      ↳ ".join(args)
+        exception_name = f'{exception=}'.replace("=", "").split(".")[-1].replace("'>", "")
+        self.error_logger.log(f"{exception_name}: {error_args}", "error")
+        sys.exit(1)
+
+    def get_programs(self) -> list[tuple[str, int, str]]:
+        programs = []
+        for scenario in self.scenarios:
+            generator, default_sizes = synth.SCENARIOS[scenario]
+            for size in self.sizes or default_sizes:
+                programs.append((scenario, size, generator(size)))
+        return programs
+
+    def get_commit(self) -> str|None:
+        try: return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=PIMO_DIR, stderr=subprocess.DEVNULL).decode("utf-8").strip()
+        except (OSError, subprocess.CalledProcessError): return None
+
+    def get_codegen_args(self) -> list[str]:
+        return (["-opt"] if self.optimize else []) + (["-ss"] if self.static_stacks else []) + (["-is"] if self.inline_slots else []) + (["-fs"] if self.fitted_stacks else []) + (["-uc"] if self.unchecked else [])
+
+    def run_phases(self, sourcecode_path:str, memory:bool) -> dict[str, dict]:
+        """
+        Compiles the program once, up to the object code, phase by phase.
+        """
+        import lib.backend as backend
+        import lib.compiler as compiler
+
+        phases = {}
+        state = {}
+        instance = pimo.Main([sourcecode_path, "-sl", "-o", os.path.splitext(sourcecode_path)[0]] + self.get_codegen_args())
+
+        def measure(name:str, function):
+            if memory: tracemalloc.start()
+            start_time = time.perf_counter()
+            try: function()
+            finally:
+                duration = time.perf_counter() - start_time
+                peak = None
+                if memory:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                phases[name] = {"time": duration, "peak_memory": peak}
+
+        def parse_rest():
+            state["blocks"] = state["parser"].parse_rest(state["blocks"])
+
+        def compile_program():
+            compiler.reset_global_state()
+            state["compiler"] = compiler.Compiler(instance)
+            state["compiler"].compile(state["segments"], state["blocks"])
+
+        state["parser"] = parser.Parser(instance)
+        measure("read", instance.read_sourcecode)
+        measure("lex", lambda: state.update(segments=state["parser"].parse(instance.sourcecode.get_lines())))
+        measure("parse_blocks", lambda: state.update(blocks=state["parser"].parse_blocks(state["segments"])))
+        measure("parse_rest", parse_rest)
+        measure("compile", compile_program)
+        measure("backend", lambda: state.update(backend=backend.Backend(instance, state["compiler"].get_llvm_module())))
+        if self.optimize: measure("optimize", state["backend"].optimize)
+        measure("emit_object", state["backend"].emit_object)
+        return phases
+
+    def run_incremental(self, sourcecode_path:str, content:str) -> dict|None:
+        """
+        Applies edits spread over the indented lines, every other one adding
+        a line, and times them against a full parse of the edited text.
+        """
+        instance = pimo.Main([sourcecode_path, "-sl", "-b"])
+        try:
+            incremental_parser = incremental.IncrementalParser(instance, content)
+            lines = [index + 1 for index, line in enumerate(incremental_parser.lines) if line.startswith("    ")]
+            if not lines: return None
+            edit_times = []
+            for edit_index in range(self.incremental):
+                line = lines[edit_index * len(lines) // self.incremental] + (edit_index + 1) // 2  # The added lines come before
+                text = f"byte bench_{edit_index} = 1;" + ("\n    " if edit_index % 2 == 0 else " ")
+                start_time = time.perf_counter()
+                incremental_parser.apply_edit(line, 4, line, 4, text)
+                edit_times.append(time.perf_counter() - start_time)
+            fallbacks = incremental_parser.full_parses - 1
+            full_times = []
+            for _ in range(self.repeat):
+                start_time = time.perf_counter()
+                incremental_parser.parse_all()
+                full_times.append(time.perf_counter() - start_time)
+        except SystemExit:
+            return None
+        return {
+            "edits": self.incremental,
+            "fallbacks": fallbacks,  # Edits parsed with the whole text again
+            "edit_time": sum(edit_times) / len(edit_times),
+            "full_time": min(full_times)
+        }
+
+    def run_startup(self) -> dict:
+        """
+        Runs `pimo -b` in new processes, like the editors parsing on every
+        keystroke. It must start within the budget, the fastest run is kept,
+        and must never import llvmlite.
+        """
+        scenario, size = self.STARTUP_PROGRAM
+        generator = synth.SCENARIOS[scenario][0]
+        times = []
+        llvmlite_modules = None  # Unknown if the run failed
+        with tempfile.TemporaryDirectory(prefix="pimo-bench-") as directory:
+            sourcecode_path = os.path.join(directory, f"{scenario}_{size}.pim")
+            with open(sourcecode_path, "w", encoding="utf-8") as file: file.write(generator(size))
+            for _ in range(self.repeat):
+                start_time = time.perf_counter()
+                process = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, sourcecode_path, "-b", "-sl"], capture_output=True, text=True)
+                times.append(time.perf_counter() - start_time)
+                try: llvmlite_modules = json.loads(process.stdout.splitlines()[-1])
+                except (IndexError, ValueError): llvmlite_modules = None
+                if process.returncode != 0 or llvmlite_modules is None: break
+        startup = {
+            "time": min(times),
+            "budget": self.startup_budget,
+            "llvmlite_modules": llvmlite_modules
+        }
+        startup["ok"] = llvmlite_modules == [] and startup["time"] <= self.startup_budget
+        return startup
+
+    def show_startup(self, startup:dict):
+        llvmlite_modules = startup["llvmlite_modules"]
+        if llvmlite_modules is None: imports = "the run failed"
+        elif llvmlite_modules: imports = f"imported {', '.join(llvmlite_modules)}"
+        else: imports = "llvmlite not imported"
+        message = f"Startup of a parse-only run : {startup['time'] * 1000:.1f}ms for a budget of {startup['budget'] * 1000:.0f}ms, {imports}."
+        if startup["ok"]: self.logger.log(message, "success")
+        else: self.error_logger.log(message, "error")
+
+    def run_allocation_checks(self) -> list[dict]:
+        """
+        Compiles the sample programs and runs them with a library counting
+        their calls to `malloc` and `free`, so what they allocate is checked
+        and not only their exit code. Their peak resident memory is kept.
+        """
+        if platform.system() != "Linux":
+            self.raise_exception(self.UnsupportedPlatform, platform.system(), "The allocations are counted through `LD_PRELOAD`, on Linux only.")
+        checks = []
+        with tempfile.TemporaryDirectory(prefix="pimo-bench-") as directory:
+            counter_source = os.path.join(directory, "counter.c")
+            counter_library = os.path.join(directory, "counter.so")
+            with open(counter_source, "w", encoding="utf-8") as file: file.write(ALLOCATION_COUNTER_SOURCE)
+            try: subprocess.run(["clang", "-shared", "-fPIC", "-O2", counter_source, "-o", counter_library, "-ldl"], check=True, capture_output=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                self.raise_exception(self.UnsupportedPlatform, "The allocation counter didn't compile.", str(e))
+
+            for program, (exit_code, allocations) in self.ALLOCATION_CHECKS.items():
+                sourcecode_path = os.path.join(PIMO_DIR, "tests", program)
+                output = os.path.join(directory, os.path.splitext(program)[0])
+                counts_path = f"{output}.counts"
+                check = {"program": program, "allocations": allocations, "ok": False}
+                checks.append(check)
+                compilation = subprocess.run([sys.executable, os.path.join(SRC_DIR, "pimo.py"), sourcecode_path, "-o", output, "-sl"] + self.get_codegen_args(), capture_output=True)
+                if compilation.returncode != 0: continue
+
+                process = subprocess.run([output], env={**os.environ, "LD_PRELOAD": counter_library, "PIMO_ALLOCATION_COUNTS": counts_path})
+                try:
+                    with open(counts_path, "r", encoding="utf-8") as file: mallocs, frees, peak_rss = map(int, file.read().split())
+                except (OSError, ValueError): continue
+                check.update({
+                    "exit_code": process.returncode,
+                    "mallocs": mallocs,
+                    "frees": frees,
+                    "peak_rss": peak_rss * 1024
+                })
+                check["ok"] = process.returncode == exit_code and (mallocs == frees if allocations == "freed" else mallocs == 0)
+        return checks
+
+    def show_allocation_checks(self, checks:list[dict]):
+        for check in checks:
+            if "mallocs" not in check:
+                self.error_logger.log(f"`{check['program']}` didn't compile or run.", "error")
+                continue
+            wanted = "all freed" if check["allocations"] == "freed" else "none"
+            message = f"`{check['program']}` : {check['mallocs']} malloc and {check['frees']} free calls for {wanted} wanted, {check['peak_rss'] / 1024 / 1024:.1f}MB at most, exit code {check['exit_code']}."
+            if check["ok"]: self.logger.log(message, "success")
+            else: self.error_logger.log(message, "error")
+
+    def run_program(self, sourcecode_path:str) -> dict[str, dict]|None:
+        """
+        Keeps the fastest of the timed runs, the peak memory comes from one
+        more run since tracing the allocations slows everything down.
+        """
+        try:
+            runs = [self.run_phases(sourcecode_path, False) for _ in range(self.repeat)]
+            memory_run = self.run_phases(sourcecode_path, True)
+        except SystemExit:  # The compiler already logged the error
+            return None
+        phases = {}
+        for phase in memory_run.keys():
+            phases[phase] = {
+                "time": min(run[phase]["time"] for run in runs),
+                "peak_memory": memory_run[phase]["peak_memory"]
+            }
+        return phases
+
+    def run(self) -> dict:
+        results = {
+            "pimo_version": info.PIMO_VERSION,
+            "commit": self.get_commit(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": self.repeat,
+            "optimize": self.optimize,
+            "static_stacks": self.static_stacks,
+            "inline_slots": self.inline_slots,
+            "fitted_stacks": self.fitted_stacks,
+            "unchecked": self.unchecked,
+            "startup": self.run_startup(),
+            "results": []
+        }
+        with tempfile.TemporaryDirectory(prefix="pimo-bench-") as directory:
+            for scenario, size, content in self.get_programs():
+                sourcecode_path = os.path.join(directory, f"{scenario}_{size}.pim")
+                with open(sourcecode_path, "w", encoding="utf-8") as file: file.write(content)
+                self.logger.log(f"Running `{scenario}` with a size of {size}...", "work")
+                phases = self.run_program(sourcecode_path)
+                result = {
+                    "scenario": scenario,
+                    "size": size,
+                    "lines": len(content.splitlines()),
+                    "bytes": len(content.encode("utf-8")),
+                    "ok": phases is not None,
+                    "phases": phases or {},
+                    "total_time": sum(phase["time"] for phase in (phases or {}).values())
+                }
+                if self.incremental: result["incremental"] = self.run_incremental(sourcecode_path, content)
+                results["results"].append(result)
+                if phases is None:
+                    self.error_logger.log(f"The `{scenario}` program with a size of {size} didn't compile.", "error")
+                else:
+                    self.logger.log(f"`{scenario}` ({size}) compiled in {result['total_time']:.3f}s.", "success")
+        return results
+
+    def write_programs(self):
+        os.makedirs(self.generate, exist_ok=True)
+        for scenario, size, content in self.get_programs():
+            sourcecode_path = os.path.join(self.generate, f"{scenario}_{size}.pim")
+            with open(sourcecode_path, "w", encoding="utf-8") as file: file.write(content)
+            self.logger.log(f"The file `{sourcecode_path}` now contains the `{scenario}` program.", "success")
+
+    def show_results(self, results:dict):
+        lines = [f"{'scenario':<10} {'size':>6} {'lines':>7}  " + "  ".join(f"{phase:>12}" for phase in self.PHASES) + f"  {'total':>9}  {'peak':>9}"]
+        for result in results["results"]:
+            phases = result["phases"]
+            times = "  ".join(f"{phases[phase]['time'] * 1000:10.1f}ms" if phase in phases else f"{'-':>12}" for phase in self.PHASES)
+            peak = max((phase["peak_memory"] for phase in phases.values()), default=0) / 1024 / 1024
+            status = f"{result['total_time']:8.3f}s  {peak:7.1f}MB" if result["ok"] else "FAILED"
+            lines.append(f"{result['scenario']:<10} {result['size']:>6} {result['lines']:>7}  {times}  {status}")
+        self.logger.log(f"\n{self.logger.start}    ↳ ".join(["Results :", *lines]), "out")
+
+        if not self.incremental: return
+        lines = [f"{'scenario':<10} {'size':>6} {'edits':>6} {'fallbacks':>9}  {'edit':>10}  {'full parse':>10}  {'speedup':>8}"]
+        for result in results["results"]:
+            incremental_result = result.get("incremental")
+            if incremental_result is None:
+                lines.append(f"{result['scenario']:<10} {result['size']:>6}  FAILED")
+                continue
+            edit_time, full_time = incremental_result["edit_time"], incremental_result["full_time"]
+            lines.append(f"{result['scenario']:<10} {result['size']:>6} {incremental_result['edits']:>6} {incremental_result['fallbacks']:>9}  {edit_time * 1000:8.2f}ms  {full_time * 1000:8.1f}ms  {full_time / edit_time:7.1f}x")
+        self.logger.log(f"\n{self.logger.start}    ↳ ".join(["Incremental parsing :", *lines]), "out")
+
+    def compare_results(self, old_results:dict, results:dict) -> bool:
+        """
+        Compares the phase times with the old results, returns False when a
+        phase got slower than the threshold.
+        """
+        old = {(result["scenario"], result["size"]): result for result in old_results["results"]}
+        lines = [f"Compared with {old_results.get('commit') or self.compare} :"]
+        regressions = 0
+        for result in results["results"]:
+            old_result = old.get((result["scenario"], result["size"]))
+            if old_result is None or not (old_result["ok"] and result["ok"]): continue
+            for phase, data in result["phases"].items():
+                old_data = old_result["phases"].get(phase)
+                if old_data is None or old_data["time"] < self.MIN_COMPARED_TIME: continue
+                ratio = data["time"] / old_data["time"]
+                if ratio <= self.threshold: continue
+                regressions += 1
+                lines.append(f"{result['scenario']} ({result['size']}) {phase} : {old_data['time'] * 1000:.1f}ms -> {data['time'] * 1000:.1f}ms (x{ratio:.2f})")
+            old_time = old_result["total_time"]
+            if old_time: lines.append(f"{result['scenario']} ({result['size']}) total : x{result['total_time'] / old_time:.2f}")
+        lines.append(f"{regressions} phases slower than x{self.threshold}.")
+        self.logger.log(f"\n{self.logger.start}    ↳ ".join(lines), "out")
+        return not regressions
+
+    def start(self):
+        if self.generate:
+            self.write_programs()
+            return
+
+        if self.memory_checks:
+            checks = self.run_allocation_checks()
+            self.show_allocation_checks(checks)
+            if not all(check["ok"] for check in checks): sys.exit(1)
+            return
+
+        if self.startup:
+            startup = self.run_startup()
+            self.show_startup(startup)
+            if not startup["ok"]: sys.exit(1)
+            return
+
+        old_results = None
+        if self.compare:
+            try:
+                with open(self.compare, "r", encoding="utf-8") as file: old_results = json.load(file)
+            except (OSError, ValueError) as e:
+                self.raise_exception(self.InvalidResults, self.compare, str(e))
+
+        results = self.run()
+        self.show_results(results)
+        self.show_startup(results["startup"])
+
+        if self.output:
+            with open(self.output, "w", encoding="utf-8") as file: json.dump(results, file, indent=4)
+            self.logger.log(f"The file `{self.output}` now contains the results.", "success")
+
+        if not all(result["ok"] for result in results["results"]) or not results["startup"]["ok"]: sys.exit(1)
+        if old_results and not self.compare_results(old_results, results): sys.exit(1)
+
+if __name__ == "__main__":
+    Bench(sys.argv[1:]).start()
@@ -0,0 +1,142 @@
+import llvmlite.ir as ir
+import lib.lang as lang
+import lib.runtime as runtime
+
+class Arena():
+    """
+    Memory set up by the `#mem` preprocessor command, allocated by moving its
+    top and released in bulk by moving it back. The allocations who don't fit
+    are made with `malloc`, and released with `free`.
+    """
+    ALIGNMENT = 16
+
+    def __init__(self, builder:ir.IRBuilder, size:int, id:str, local:bool, runtime:runtime.Runtime):
+        self.size = size
+        self.id = id
+        self.local = local  # In the frame of a function, else in the program
+        self.builder = builder
+        self.module = self.builder.block.module
+        self.runtime = runtime  # Shared by the arenas and the stacks of the module
+
+        self.runtime.init_memory_functions()
+        self.init_runtime()
+        self.arena_type = self.runtime.arena_type
+
+        buffer_type = ir.ArrayType(lang.UNSIGNED_8, self.size)
+        if self.local:
+            buffer = self.builder.alloca(buffer_type, name=f"arenabuffer_{self.id}")
+            buffer.align = Arena.ALIGNMENT
+            self.arena = self.builder.alloca(self.arena_type, name=f"arena_{self.id}")
+            self.builder.store(
+                self.builder.bitcast(buffer, lang.VOID_PTR),
+                self.builder.gep(self.arena, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 0)])
+            )
+            self.builder.store(
+                ir.Constant(lang.UNSIGNED_64, 0),
+                self.builder.gep(self.arena, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 1)])
+            )
+            self.builder.store(
+                ir.Constant(lang.UNSIGNED_64, self.size),
+                self.builder.gep(self.arena, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 2)])
+            )
+        else:
+            buffer = ir.GlobalVariable(self.module, buffer_type, name=f"arenabuffer_{self.id}")
+            buffer.initializer = ir.Constant(buffer_type, None)
+            buffer.align = Arena.ALIGNMENT
+            self.arena = ir.GlobalVariable(self.module, self.arena_type, name=f"arena_{self.id}")
+            self.arena.initializer = ir.Constant(self.arena_type, [
+                buffer.bitcast(lang.VOID_PTR),
+                ir.Constant(lang.UNSIGNED_64, 0),
+                ir.Constant(lang.UNSIGNED_64, self.size)
+            ])
+
+    def init_runtime(self):
+        """
+        Defines the arena type and its functions once per module.
+        """
+        if self.runtime.arena_type is None:
+            self.runtime.arena_type = self.runtime.get_identified_type("arenatype")
+            self.runtime.arena_type.set_body(
+                lang.VOID_PTR,  # Base
+                lang.UNSIGNED_64,  # Top, from the base
+                lang.UNSIGNED_64  # Size
+            )
+            self.runtime.alloc_func = self.define_alloc()
+            self.runtime.release_func = self.define_release()
+
+    def alloc(self, builder:ir.IRBuilder, size_in_bytes:ir.Value) -> ir.Value:
+        return builder.call(self.runtime.alloc_func, [self.arena, size_in_bytes])
+
+    def release(self, builder:ir.IRBuilder, pointer:ir.Value):
+        """
+        Releases the allocation and all the ones made after it.
+        """
+        builder.call(self.runtime.release_func, [self.arena, pointer])
+
+    def define_alloc(self):
+        alloc_func_type = ir.FunctionType(lang.VOID_PTR, [self.runtime.arena_type.as_pointer(), lang.UNSIGNED_64])
+        alloc_func = ir.Function(self.module, alloc_func_type, name="arena_alloc")
+
+        alloc_block = alloc_func.append_basic_block(name="entry")
+        alloc_builder = ir.IRBuilder(alloc_block)
+
+        arena_ptr, size_in_bytes = alloc_func.args
+
+        base_ptr = alloc_builder.gep(arena_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 0)], name="base_ptr")
+        top_ptr = alloc_builder.gep(arena_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 1)], name="top_ptr")
+        size_ptr = alloc_builder.gep(arena_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 2)], name="size_ptr")
+
+        top = alloc_builder.load(top_ptr, name="top")
+        size = alloc_builder.load(size_ptr, name="size")
+
+        # The allocations stay aligned, their sizes are rounded up
+        mask = ir.Constant(lang.UNSIGNED_64, Arena.ALIGNMENT - 1)
+        aligned_size = alloc_builder.and_(alloc_builder.add(size_in_bytes, mask), alloc_builder.not_(mask), name="aligned_size")
+        new_top = alloc_builder.add(top, aligned_size, name="new_top")
+
+        fits = alloc_builder.icmp_unsigned("<=", new_top, size, name="fits")
+        with alloc_builder.if_else(fits) as (then, otherwise):
+            with then:
+                alloc_builder.store(new_top, top_ptr)
+                base = alloc_builder.load(base_ptr, name="base")
+                alloc_builder.ret(alloc_builder.gep(base, [top], name="allocation"))
+
+            with otherwise:
+                alloc_builder.ret(alloc_builder.call(self.runtime.malloc_func, [size_in_bytes], name="allocation"))
+
+        alloc_builder.unreachable()
+
+        return alloc_func
+
+    def define_release(self):
+        release_func_type = ir.FunctionType(ir.VoidType(), [self.runtime.arena_type.as_pointer(), lang.VOID_PTR])
+        release_func = ir.Function(self.module, release_func_type, name="arena_release")
+
+        release_block = release_func.append_basic_block(name="entry")
+        release_builder = ir.IRBuilder(release_block)
+
+        arena_ptr, pointer = release_func.args
+
+        base_ptr = release_builder.gep(arena_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 0)], name="base_ptr")
+        top_ptr = release_builder.gep(arena_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 1)], name="top_ptr")
+        size_ptr = release_builder.gep(arena_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 2)], name="size_ptr")
+
+        base = release_builder.load(base_ptr, name="base")
+        size = release_builder.load(size_ptr, name="size")
+        offset = release_builder.sub(
+            release_builder.ptrtoint(pointer, lang.UNSIGNED_64),
+            release_builder.ptrtoint(base, lang.UNSIGNED_64),
+            name="offset"
+        )
+
+        in_arena = release_builder.icmp_unsigned("<", offset, size, name="in_arena")  # Below the base, the offset wraps
+        with release_builder.if_else(in_arena) as (then, otherwise):
+            with then:
+                release_builder.store(offset, top_ptr)
+
+            with otherwise:
+                release_builder.call(self.runtime.free_func, [pointer])
+
+        release_builder.ret_void()
+
+        return release_func
@@ -0,0 +1,58 @@
+import llvmlite.binding as llvm
+import llvmlite.ir as ir
+
+class Backend():
+    """
+    Turns the compiled LLVM module into object code and assembly, in-process.
+
+    The module is parsed only once, optimized in memory, then the same target
+    machine emits the object file and the assembly from it.
+    """
+
+    class InvalidLLVMModule(BaseException): ...
+    class UnsupportedTarget(BaseException): ...
+
+    initialized = False
+
+    def __init__(self, pimo_instance, module:ir.Module):
+        self.pimo_instance = pimo_instance
+        self.tracer = self.pimo_instance.tracer
+        self.init_targets()
+        with self.tracer.span("IR serialization", "backend"):
+            llvm_ir = str(module)
+        try:
+            with self.tracer.span("llvm.parse_assembly", "backend"):
+                self.module = llvm.parse_assembly(llvm_ir)
+                self.module.verify()
+        except RuntimeError as e:
+            self.pimo_instance.raise_exception(self.InvalidLLVMModule, *str(e).strip().splitlines())
+        try:
+            self.target = llvm.Target.from_triple(self.module.triple or llvm.get_default_triple())
+        except RuntimeError as e:
+            self.pimo_instance.raise_exception(self.UnsupportedTarget, self.module.triple, str(e).strip())
+        self.target_machine = self.target.create_target_machine(opt=3 if self.pimo_instance.optimize else 0, reloc="pic", codemodel="default")
+        self.module.data_layout = str(self.target_machine.target_data)
+
+    @staticmethod
+    def init_targets():
+        if Backend.initialized: return
+        llvm.initialize_native_target()
+        llvm.initialize_native_asmprinter()
+        Backend.initialized = True
+
+    def optimize(self, level:int=3):
+        tuning_options = llvm.create_pipeline_tuning_options(speed_level=level)
+        pass_builder = llvm.create_pass_builder(self.target_machine, tuning_options)
+        pass_manager = pass_builder.getModulePassManager()
+        with self.tracer.span(f"optimize (O{level})", "backend"):
+            pass_manager.run(self.module, pass_builder)
+
+    def get_llvm_ir(self) -> str: return str(self.module)
+
+    def emit_object(self) -> bytes:
+        with self.tracer.span("emit object", "backend"):
+            return self.target_machine.emit_object(self.module)
+
+    def emit_assembly(self) -> str:
+        with self.tracer.span("emit assembly", "backend"):
+            return self.target_machine.emit_assembly(self.module)
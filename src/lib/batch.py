@@ -0,0 +1,78 @@
+import concurrent.futures, contextlib, io, os, time, traceback
+
+def find_sources(paths:list[str]) -> list[str]:
+    """
+    Expands the directories of `paths` into the `.pim` files they contain.
+    """
+    sources = []
+    for path in paths:
+        if not os.path.isdir(path):
+            sources.append(path)
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if os.path.splitext(filename)[1].lower() == ".pim":
+                    sources.append(os.path.join(dirpath, filename))
+    return sources
+
+def compile_source(main_class, argv:list[str], sourcecode_path:str) -> tuple[str, int, float, str, list[dict]]:
+    """
+    Compiles one source in the current worker, with its logs kept in a buffer.
+    """
+    buffer = io.StringIO()
+    start_time = time.perf_counter()
+    code = 0
+    instance = None
+    with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+        try:
+            instance = main_class(argv, sourcecode_path)
+            instance.start()
+            instance.end()
+        except SystemExit as e:
+            code = e.code or 0
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+    events = instance.tracer.events if instance else []
+    return sourcecode_path, code, time.perf_counter() - start_time, buffer.getvalue(), events
+
+class Batch():
+    """
+    Compiles many sources over a pool of worker processes.
+    """
+
+    def __init__(self, pimo_instance, sources:list[str], jobs:int):
+        self.pimo_instance = pimo_instance
+        self.logger = self.pimo_instance.logger
+        self.error_logger = self.pimo_instance.error_logger
+        self.sources = sources
+        self.jobs = max(1, min(jobs, len(self.sources)))
+        self.results:dict[str, tuple[int, float]] = {}
+
+    def run(self) -> bool:
+        main_class = type(self.pimo_instance)
+        argv = self.pimo_instance.argv
+        self.logger.log(f"Compiling {len(self.sources)} sources with {self.jobs} workers...", "work")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [executor.submit(compile_source, main_class, argv, source) for source in self.sources]
+            for future in concurrent.futures.as_completed(futures):
+                sourcecode_path, code, duration, output, events = future.result()
+                self.results[sourcecode_path] = (code, duration)
+                self.pimo_instance.tracer.events.extend(events)
+                self.logger.log(f"Logs of `{sourcecode_path}` :", "info")
+                print(output, end="")
+        self.show_summary()
+        return all(code == 0 for code, _ in self.results.values())
+
+    def show_summary(self):
+        failed = 0
+        lines = []
+        for source in self.sources:
+            code, duration = self.results[source]
+            status = "OK" if code == 0 else f"FAILED ({code})"
+            if code != 0: failed += 1
+            lines.append(f"{status:<12} {duration:8.3f}s  {source}")
+        total = sum(duration for _, duration in self.results.values())
+        lines.append(f"{len(self.sources) - failed} succeeded, {failed} failed, {total:.3f}s of compile time")
+        self.logger.log(f"\n{self.logger.start}    ↳ ".join(["Batch summary :", *lines]), "out")
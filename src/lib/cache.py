@@ -0,0 +1,223 @@
+import gc, hashlib, json, marshal, os, shutil
+import lib.info as info
+import lib.lang as lang
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pimo")
+SOURCES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # The `src` directory
+
+def get_default_cache_dir() -> str:
+    return os.environ.get("PIMO_CACHE_DIR", DEFAULT_CACHE_DIR)
+
+class BuildCache():
+    """
+    Content-addressed cache for the compiled outputs.
+
+    Entries are keyed by a hash of the source code, the code generation flags
+    and the compiler itself, see `get_compiler_digest`. Each entry is a directory holding the artifacts, its
+    modification time is used to evict the least recently used entries when
+    the cache grows over its size limit.
+
+    The parsed tree of a source is also cached, keyed by the source only, so
+    the runs with other flags don't parse it again. It's stored with `marshal`
+    as the plain values of `lang.pack_tree`, loading it never runs code even
+    if the cache directory is shared.
+    """
+
+    class InvalidCacheDirectory(BaseException): ...
+
+    PARSED_EXTENSION = ".tree"
+
+    ARTIFACTS = {
+        "ll": "module.ll",
+        "obj": "module.o",
+        "asm": "module.s",
+        "bin": "binary"
+    }
+
+    compiler_digest:str|None = None  # Computed once per process
+
+    def __init__(self, pimo_instance, path:str, limit:int):
+        self.pimo_instance = pimo_instance
+        self.path = path
+        self.limit = limit  # In bytes
+        self.entries_path = os.path.join(self.path, "outputs")
+        self.parsed_path = os.path.join(self.path, "parsed")
+        self.stats_path = os.path.join(self.path, "stats.json")
+        try:
+            os.makedirs(self.entries_path, exist_ok=True)
+            os.makedirs(self.parsed_path, exist_ok=True)
+        except OSError as e:
+            self.pimo_instance.raise_exception(self.InvalidCacheDirectory, self.path, str(e))
+
+    @staticmethod
+    def get_compiler_digest() -> str:
+        """
+        Hash of the Pimo version, of the compiler sources and of the llvmlite
+        version, so the outputs of a previous compiler are never served.
+        """
+        if BuildCache.compiler_digest is None:
+            import importlib.metadata  # Slow to import, only needed with `-ca`
+            hash = hashlib.sha256()
+            hash.update(f"pimo {info.PIMO_VERSION}\0".encode("utf-8"))
+            try: llvmlite_version = importlib.metadata.version("llvmlite")  # Without importing it
+            except importlib.metadata.PackageNotFoundError: llvmlite_version = "unknown"
+            hash.update(f"llvmlite {llvmlite_version}\0".encode("utf-8"))
+            sources = [os.path.join(SOURCES_DIR, "pimo.py")]
+            sources += sorted(os.path.join(SOURCES_DIR, "lib", file) for file in os.listdir(os.path.join(SOURCES_DIR, "lib")) if file.endswith(".py"))
+            for source in sources:
+                hash.update(f"{os.path.relpath(source, SOURCES_DIR)}\0".encode("utf-8"))
+                with open(source, "rb") as file: hash.update(file.read())
+                hash.update(b"\0")
+            BuildCache.compiler_digest = hash.hexdigest()
+        return BuildCache.compiler_digest
+
+    @staticmethod
+    def make_key(content:bytes, flags:dict) -> str:
+        hash = hashlib.sha256()
+        hash.update(f"{BuildCache.get_compiler_digest()}\0".encode("utf-8"))
+        hash.update(json.dumps(flags, sort_keys=True).encode("utf-8"))
+        hash.update(b"\0")
+        hash.update(content)
+        return hash.hexdigest()
+
+    @staticmethod
+    def make_parse_key(content:bytes) -> str:
+        hash = hashlib.sha256()
+        hash.update(f"{BuildCache.get_compiler_digest()}\0".encode("utf-8"))
+        hash.update(f"{lang.Token.__slots__} {lang.Block.__slots__}\0".encode("utf-8"))  # The packed layout
+        hash.update(f"marshal {marshal.version}\0".encode("utf-8"))
+        hash.update(content)
+        return hash.hexdigest()
+
+    def get_entry_path(self, key:str) -> str: return os.path.join(self.entries_path, key)
+
+    def lookup(self, key:str, artifacts:list[str]) -> dict[str, str]|None:
+        """
+        Paths of the cached artifacts, the hit is only counted once `restore`
+        copied them.
+        """
+        entry_path = self.get_entry_path(key)
+        paths = {artifact: os.path.join(entry_path, self.ARTIFACTS[artifact]) for artifact in artifacts}
+        found = all(os.path.exists(path) for path in paths.values())
+        if found:
+            try: os.utime(entry_path)  # Most recently used
+            except OSError: found = False  # Evicted by another process
+        if not found:
+            self.count("misses")
+            return None
+        return paths
+
+    def store(self, key:str, artifacts:dict[str, bytes|str]):
+        """
+        Stores artifacts given as contents, or as paths for the `bin` one.
+        """
+        entry_path = self.get_entry_path(key)
+        os.makedirs(entry_path, exist_ok=True)
+        for artifact, data in artifacts.items():
+            path = os.path.join(entry_path, self.ARTIFACTS[artifact])
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            if artifact == "bin":
+                shutil.copy2(data, temp_path)
+            else:
+                if isinstance(data, str): data = data.encode("utf-8")
+                with open(temp_path, "wb") as file: file.write(data)
+            os.replace(temp_path, path)
+        os.utime(entry_path)
+        self.evict()
+
+    def get_parsed_path(self, key:str) -> str: return os.path.join(self.parsed_path, f"{key}{BuildCache.PARSED_EXTENSION}")
+
+    def lookup_parsed(self, key:str) -> tuple|None:
+        path = self.get_parsed_path(key)
+        gc_enabled = gc.isenabled()
+        gc.disable()  # The loading only creates objects, the collections would slow it down a lot
+        try:
+            with open(path, "rb") as file: packed_tree, strings = marshal.load(file)
+            segments, blocks = lang.unpack_tree(packed_tree)
+            os.utime(path)  # Most recently used
+        except (OSError, EOFError, ValueError, TypeError, IndexError, AttributeError):  # Missing or broken entry
+            self.count("parse_misses")
+            return None
+        finally:
+            if gc_enabled: gc.enable()
+        self.count("parse_hits")
+        return segments, blocks, strings
+
+    def store_parsed(self, key:str, segments:list[dict], blocks:list, strings:dict[str, str]):
+        path = self.get_parsed_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        gc_enabled = gc.isenabled()
+        gc.disable()  # Same for the packing
+        try:
+            with open(temp_path, "wb") as file: marshal.dump((lang.pack_tree(segments, blocks), strings), file)
+        finally:
+            if gc_enabled: gc.enable()
+        os.replace(temp_path, path)
+        self.evict()
+
+    def restore(self, paths:dict[str, str], outputs:dict[str, str]) -> bool:
+        """
+        Copies the artifacts found by `lookup` to the outputs, False if the
+        entry was evicted by another process meanwhile.
+        """
+        try:
+            for artifact, output in outputs.items():
+                shutil.copy2(paths[artifact], output)
+        except OSError:
+            self.count("misses")
+            return False
+        self.count("hits")
+        return True
+
+    def get_entries(self) -> list[tuple[str, float, int]]:
+        """
+        Paths, modification times and sizes of the outputs entries and of the
+        parsed trees.
+        """
+        entries = []
+        for key in os.listdir(self.entries_path):
+            entry_path = self.get_entry_path(key)
+            try:
+                size = sum(os.path.getsize(os.path.join(entry_path, file)) for file in os.listdir(entry_path))
+                entries.append((entry_path, os.path.getmtime(entry_path), size))
+            except OSError: continue  # Evicted by another process
+        for file in os.listdir(self.parsed_path):
+            if not file.endswith(self.PARSED_EXTENSION): continue
+            parsed_path = os.path.join(self.parsed_path, file)
+            try: entries.append((parsed_path, os.path.getmtime(parsed_path), os.path.getsize(parsed_path)))
+            except OSError: continue
+        return entries
+
+    def evict(self):
+        entries = sorted(self.get_entries(), key=lambda entry: entry[1])
+        total_size = sum(entry[2] for entry in entries)
+        while entries and total_size > self.limit:
+            path, _, size = entries.pop(0)
+            if os.path.isdir(path): shutil.rmtree(path, ignore_errors=True)
+            else:
+                try: os.remove(path)
+                except OSError: pass
+            total_size -= size
+            self.count("evictions")
+
+    def get_stats(self) -> dict:
+        stats = {"hits": 0, "misses": 0, "parse_hits": 0, "parse_misses": 0, "evictions": 0}
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as file: stats.update(json.load(file))
+        except (OSError, ValueError): pass
+        return stats
+
+    def count(self, stat:str):
+        stats = self.get_stats()
+        stats[stat] += 1
+        temp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file: json.dump(stats, file)
+        os.replace(temp_path, self.stats_path)
+
+    def get_summary(self) -> str:
+        stats = self.get_stats()
+        entries = self.get_entries()
+        lookups = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / lookups * 100 if lookups else 0
+        size = sum(entry[2] for entry in entries) / 1024 / 1024
+        return f"{stats['hits']} hits, {stats['misses']} misses ({ratio:.1f}% hit ratio), {stats['parse_hits']} parse hits, {stats['parse_misses']} parse misses, {stats['evictions']} evictions, {len(entries)} entries using {size:.2f}/{self.limit / 1024 / 1024:.0f} MB"
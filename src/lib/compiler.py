@@ -4,11 +4,24 @@ import lib.lang as lang
 import lib.utils as utils
 import lib.program as program
 import lib.stack as stack
+import lib.arena as arena
+import lib.runtime as runtime
+import lib.frame as frame
 import lib.info as info
 import lib.values as values
 import lib.names as names
 import lib.contexts as contexts
-import random, os, platform
+import lib.enum as enum
+import lib.trace as trace
+import random, os, platform, contextlib
+
+def reset_global_state():
+    """
+    Resets the state shared by compilations made in the same process. The
+    stacks and arenas runtime is kept by each compiler, see `get_runtime`,
+    and the identified types by the context of each module.
+    """
+    enum.iota_count = 0
 
 class Compiler():
     class InvalidInstructionSyntax(BaseException): ...
@@ -19,16 +32,46 @@ class Compiler():
     class InvalidInstruction(BaseException): ...
     class InvalidNameCase(BaseException): ...
 
+    OPS_OPERATIONS = {  # Operator name of `ops`: operation on the destination value and a value
+        "add": lambda builder, a, b: builder.add(a, b),
+        "fadd": lambda builder, a, b: builder.fadd(a, b),
+        "sub": lambda builder, a, b: builder.sub(a, b),
+        "fsub": lambda builder, a, b: builder.fsub(a, b),
+        "fcmp_equal": lambda builder, a, b: builder.fcmp_ordered("==", a, b),
+        "fcmp_more_equal": lambda builder, a, b: builder.fcmp_ordered(">=", a, b),
+        "fcmp_less_equal": lambda builder, a, b: builder.fcmp_ordered("<=", a, b),
+        "fcmp_not_equal": lambda builder, a, b: builder.fcmp_ordered("!=", a, b),
+        "fcmp_more": lambda builder, a, b: builder.fcmp_ordered(">", a, b),
+        "fcmp_less": lambda builder, a, b: builder.fcmp_ordered("<", a, b)
+    }
+
     def __init__(self, pimo_instance):
         self.pimo_instance = pimo_instance
         self.logger:logger.Logger = self.pimo_instance.logger
         self.error_logger:logger.ErrorLogger = self.pimo_instance.error_logger
+        self.tracer:trace.Tracer = self.pimo_instance.tracer
         self.ids = []
         self.running_programs:list[program.Program] = []
         self.programs:list[program.Program] = [program.Program(pimo_instance.sourcecode_path, pimo_instance.sourcecode, self.generate_id())]
         self.main_program = self.programs[0]
         self.macros = {}
+        self.program_arena_size:int|None = None  # Set by `#mem <size>`
+        self.function_arena_size:int|None = None  # Set by `#mem ~ <size>`
+        self.arena_allocation_limit:int|None = None  # Set by `#acmem <size>`, the bigger allocations use `malloc`
+        self.program_arena:arena.Arena|None = None
+        self.function_arenas:dict[ir.Function, arena.Arena] = {}
+        self.runtimes:dict[ir.Module, runtime.Runtime] = {}
         self.scope = names.GlobalScope(self, self.main_program.module)
+        self.instruction_handlers = {  # Instruction keyword: handler compiling it
+            "func": self.compile_func,
+            "proc": self.compile_proc,
+            "return": self.compile_return,
+            "if": self.compile_if,
+            "elif": self.compile_branch_without_if,
+            "else": self.compile_branch_without_if,
+            "while": self.compile_while,
+            "ops": self.compile_ops
+        }
     
     def generate_id(self) -> str:
         size = 8
@@ -44,7 +87,7 @@ class Compiler():
     def raise_exception(self, exception:BaseException, *args, line:int=None):
         if line is None: line = self.running_programs[-1].line
         prog = self.running_programs[-1].relpath
-        self.pimo_instance.raise_exception(exception, f"{prog}:{line}", "\t" + self.running_programs[-1].content.splitlines()[line - 1].strip(), *args)
+        self.pimo_instance.raise_exception(exception, f"{prog}:{line}", "\t" + self.running_programs[-1].sourcecode.get_line(line).strip(), *args)
     
     def get_target_triple(self):
         sys_platform = platform.system().lower()
@@ -74,10 +117,9 @@ class Compiler():
             program.set_line(line_nb)
 
             for token in tokens:
-                if isinstance(token, lang.Block): continue
-                try: program.set_line(token.line)
-                except: pass
-                else: break
+                if isinstance(token, lang.Block) or token.line is None: continue
+                program.set_line(token.line)
+                break
             
             if tokens[0].verify("operator", lang.HASHTAG):
                 if not len(tokens) >= 2:
@@ -98,10 +140,24 @@ class Compiler():
                     macro_tokens = tokens[3:]
 
                     for mtoken in macro_tokens:
-                        if mtoken.verify("macro", macro_name.token_string):
+                        if mtoken.verify("macro", macro_name.key):
                             self.raise_exception(self.InvalidPreprocessorCommand, "Cannot call a macro within itself.")
 
-                    self.scopes[program["id"]]["macros"][macro_name.token_string] = macro_tokens  # TODO: Use new scopes
+                    self.macros[macro_name.token_string] = macro_tokens
+                elif ppcommand.verify("pposcommand", "mem"):
+                    local = len(tokens) > 2 and tokens[2].verify("operator", lang.TILDE)
+                    if not (lang.format_tokens("%o %pposc %o %i" if local else "%o %pposc %i", tokens) and int(tokens[-1].token_string) > 0):
+                        self.raise_exception(self.InvalidPreprocessorCommand, "Syntax : #mem [~] <size>")
+
+                    if local: self.function_arena_size = int(tokens[-1].token_string)
+                    else: self.program_arena_size = int(tokens[-1].token_string)
+                elif ppcommand.verify("ppcommand", "acmem"):
+                    if lang.format_tokens("%o %ppc %o", tokens) and tokens[2].verify("operator", lang.TILDE):
+                        self.arena_allocation_limit = None  # As much as the arena holds
+                    elif lang.format_tokens("%o %ppc %i", tokens):
+                        self.arena_allocation_limit = int(tokens[2].token_string)
+                    else:
+                        self.raise_exception(self.InvalidPreprocessorCommand, "Syntax : #acmem <size>|~")
                 else:
                     self.raise_exception(self.InvalidPreprocessorCommand, "Wanted a valid preprocessor command name.")
     
@@ -130,7 +186,7 @@ class Compiler():
                         if pass_not_defined:
                             continue
                         else:
-                            self.raise_exception(element.line, self.InvalidMacro, f"Macro '{macro_name}' not defined.")
+                            self.raise_exception(self.InvalidMacro, f"Macro '{macro_name}' not defined.")
                     
                     macro_tokens = self.macros[macro_name]
                     updated_blocks.extend(macro_tokens)
@@ -147,373 +203,380 @@ class Compiler():
 
     def check_instructions(self, blocks:list, scope:names.Name, inner:any=None, context:contexts.Context=None):
         program = self.running_programs[-1]
-        module:ir.Module = program.module
 
         instructions = lang.split_tokens(blocks, "delimiter", lang.SEMICOLON)
 
-        inner_is_block = isinstance(inner, ir.Block)
+        segment = contexts.SegmentContext(None, inner, scope)
 
-        if inner_is_block:
+        if segment.inner_is_block:
             if not len(utils.remove_empty_on_list_list(instructions)):
                 self.raise_exception(self.EmptySegment)
-            function:ir.Function = inner.function
-            builder = ir.IRBuilder(inner)
+            segment.builder = ir.IRBuilder(inner)
 
         for instruction_ in instructions:
             tokens:list[lang.Token] = instruction_
             if not tokens: continue
 
             for token in tokens:
-                try: program.set_line(token.line)
-                except: continue
-                else: break
-            
-            arguments = lang.split_tokens(tokens[1:], "delimiter", lang.COMMA)
-            s_arguments = tokens[1:]
-            instruction = tokens[0]
-
-            instoken = lang.is_a_token(instruction)
-
-            if inner_is_block: builder.comment(f"Line {program.line}")
-
-            if instoken and instruction.verify("instruction", "func"):
-                type_token = lang.pres_token(s_arguments, 0)
-                name_token = lang.pres_token(s_arguments, 1)
-                args_block = None
-                try: args_block = name_token.options
-                except: pass
-                segment_block = lang.pres_block(s_arguments, 2)
-                if not (
-                    lang.are_tokens([type_token, name_token]) and
-                    lang.verify_tokens_types({
-                        type_token: "type",
-                        name_token: "name",
-                    }) and
-                    lang.is_options(args_block) and
-                    lang.is_a_segment(segment_block) and
-                    len(s_arguments) == 3
-                ) and not (
-                    lang.are_tokens([type_token, name_token]) and
-                    lang.verify_tokens_types({
-                        type_token: "type",
-                        name_token: "name",
-                    }) and
-                    lang.is_options(args_block) and
-                    len(s_arguments) == 2
-                ):
-                    self.raise_exception(self.InvalidInstructionSyntax, "Syntax : func <type> <name> (<args>, ...) {<function code>; ...};")
-                func_ret_type = lang.get_type_from_token(type_token)
-                func_name = name_token.token_string
-                if not lang.is_a_lower_name(func_name):
-                    self.raise_exception(self.InvalidInstructionSyntax, "Function names must be in lowercase.")
-                args_parts = lang.split_tokens(args_block.elements, "delimiter", lang.COMMA)
-                arguments = {}
-                for tokens in args_parts:
-                    arg_type_token = lang.pres_token(tokens, 0)
-                    arg_name_token = lang.pres_token(tokens, 1)
-                    arg_type = values.TypeValue(self, arg_type_token, scope).type
-                    if not (
-                        lang.are_tokens([arg_type_token, arg_name_token]) and
-                        arg_name_token.verify_type("name") and
-                        isinstance(arg_type, ir.Type) and
-                        len(tokens) == 2
-                    ):
-                        self.raise_exception(self.InvalidInstructionSyntax, "Arguments syntax : <type> <name>")
-                    arguments[arg_name_token] = arg_type
-                has_segment = lang.is_a_segment(segment_block)
-                try: func_arg_var = instruction.var
-                except: func_arg_var = False
-                func_type = ir.FunctionType(func_ret_type, arguments.values(), var_arg=func_arg_var)
-                func_class:names.Function = self.scope.append(func_name, names.Function, func_type, genargs=False, vararg=func_arg_var)
-                func:ir.Function = func_class.func
-                for argument_index, argument in enumerate(func.args):
-                    argument.name = list(arguments.keys())[argument_index].token_string
-                if has_segment:
-                    func_class.gen_args()
-                    try: entry = func.entry_basic_block
-                    except: entry = func.append_basic_block("entry")
-                    self.check_instructions(segment_block.elements, func_class, entry)
-            elif instoken and instruction.verify("instruction", "proc"):
-                name_token = lang.pres_token(s_arguments, 0)
-                try: args_block = name_token.options
-                except: pass
-                else:
-                    self.raise_exception(self.InvalidInstructionSyntax)
-                segment_block = lang.pres_block(s_arguments, 1)
-                if not (
-                    name_token.verify_type("name") and
-                    lang.is_a_segment(segment_block)
-                ):
-                    self.raise_exception(self.InvalidInstructionSyntax)
+                if token.line is None: continue
+                program.set_line(token.line)
+                break
 
-                func_type = ir.FunctionType(lang.VOID, [])
-                func_name = name_token.token_string
-                if not lang.is_a_lower_name(func_name):
-                    self.raise_exception(self.InvalidInstructionSyntax, "Function names must be in lowercase.")
+            instruction = tokens[0]
 
-                func_class:names.Function = self.scope.append(func_name, names.Function, func_type)
-                func:ir.Function = func_class.func
+            if segment.inner_is_block: segment.builder.comment(f"Line {program.line}")
+
+            handler = None
+            if lang.is_a_token(instruction):
+                if instruction.token_type == "instruction":
+                    handler = self.instruction_handlers.get(instruction.key)
+                elif instruction.token_type == "type" or instruction.token_type == "name":
+                    handler = self.compile_name_instruction
+            if handler is None:
+                if not self.verify_literal_value_type(instruction):
+                    self.raise_exception(self.InvalidInstruction)
+                handler = self.compile_value_instruction
+
+            handler(instruction, tokens, segment)
+            if segment.returned: return None
+
+        if segment.inner_is_block: return segment.builder.block  # The stack operations can end in another block
+        return segment.inner
+
+    def compile_func(self, instruction:lang.Token, tokens:list, segment:contexts.SegmentContext):
+        s_arguments = tokens[1:]
+        type_token = lang.pres_token(s_arguments, 0)
+        name_token = lang.pres_token(s_arguments, 1)
+        args_block = name_token.options
+        segment_block = lang.pres_block(s_arguments, 2)
+        if not (
+            lang.are_tokens([type_token, name_token]) and
+            lang.verify_tokens_types({
+                type_token: "type",
+                name_token: "name",
+            }) and
+            lang.is_options(args_block) and
+            lang.is_a_segment(segment_block) and
+            len(s_arguments) == 3
+        ) and not (
+            lang.are_tokens([type_token, name_token]) and
+            lang.verify_tokens_types({
+                type_token: "type",
+                name_token: "name",
+            }) and
+            lang.is_options(args_block) and
+            len(s_arguments) == 2
+        ):
+            self.raise_exception(self.InvalidInstructionSyntax, "Syntax : func <type> <name> (<args>, ...) {<function code>; ...};")
+        func_ret_type = lang.get_type_from_token(type_token)
+        func_name = name_token.token_string
+        if not lang.is_a_lower_name(func_name):
+            self.raise_exception(self.InvalidInstructionSyntax, "Function names must be in lowercase.")
+        args_parts = lang.split_tokens(args_block.elements, "delimiter", lang.COMMA)
+        arguments = {}
+        for tokens in args_parts:
+            arg_type_token = lang.pres_token(tokens, 0)
+            arg_name_token = lang.pres_token(tokens, 1)
+            arg_type = values.TypeValue(self, arg_type_token, segment.scope).type
+            if not (
+                lang.are_tokens([arg_type_token, arg_name_token]) and
+                arg_name_token.verify_type("name") and
+                isinstance(arg_type, ir.Type) and
+                len(tokens) == 2
+            ):
+                self.raise_exception(self.InvalidInstructionSyntax, "Arguments syntax : <type> <name>")
+            arguments[arg_name_token] = arg_type
+        has_segment = lang.is_a_segment(segment_block)
+        with self.get_function_span("func", func_name, segment):
+            func_arg_var = instruction.var
+            func_type = ir.FunctionType(func_ret_type, arguments.values(), var_arg=func_arg_var)
+            func_class:names.Function = self.scope.append(func_name, names.Function, func_type, genargs=False, vararg=func_arg_var)
+            func:ir.Function = func_class.func
+            for argument_index, argument in enumerate(func.args):
+                argument.name = list(arguments.keys())[argument_index].token_string
+            if has_segment:
                 try: entry = func.entry_basic_block
                 except: entry = func.append_basic_block("entry")
+                func_class.gen_args()  # After the entry block, its arguments are in the frame
                 self.check_instructions(segment_block.elements, func_class, entry)
-                if not entry.is_terminated:
-                    entry_builder = ir.IRBuilder(entry)
-                    entry_builder.ret_void()
-            elif instoken and instruction.verify("instruction", "return"):
-                if not inner_is_block:
-                    self.raise_exception(self.InvalidInstructionContext, "Not in a function.")
-                if inner.is_terminated:
-                    self.raise_exception(self.InvalidInstructionContext, "Block already returned.")
-                rtype = inner.function.function_type.return_type
-                if len(s_arguments) == 1:
-                    value_token = s_arguments[0]
-                    if not self.verify_literal_value_type(value_token):
-                        self.raise_exception(self.InvalidInstructionSyntax, "Not a valid literal value type.")
-                    value = values.LiteralValue(self, value_token, builder, scope, type_context=rtype)
-                    builder.ret(value.value)
-                elif not len(s_arguments):
-                    if rtype == lang.VOID:
-                        builder.ret_void()
-                    else:
-                        builder.ret(ir.Constant(rtype, None))
-                    return
-                else:
-                    self.raise_exception(self.InvalidInstructionSyntax, "Too many arguments.")
-            elif instoken and instruction.verify("instruction", "if"):
-                if not inner_is_block:
-                    self.raise_exception(self.InvalidInstructionContext, "Not in a function.")
-                if not len(tokens) >= 3:
-                    self.raise_exception(self.InvalidInstructionSyntax)
-                state = 0
-                ifblocks = {}
-                for token in tokens:
-                    if state == 0:
-                        if not lang.is_a_token(token):
-                            self.raise_exception(self.InvalidInstructionSyntax)
-                        if not (token.verify("instruction", "if") or token.verify("instruction", "elif") or token.verify("instruction", "else")):
-                            self.raise_exception(self.InvalidInstructionSyntax)
-                        inst = token.token_string.lower()
-                        if inst == "elif":
-                            inst = self.generate_id()
-                        if inst in list(ifblocks.keys()):
-                            self.raise_exception(self.InvalidInstructionSyntax)
-                        ifblocks[inst] = {
-                            "condition": None,
-                            "block": None
-                        }
-                        state = 2 if inst == "else" else 1
-                    elif state == 1:
-                        if not self.verify_literal_value_type(token):
-                            self.raise_exception(self.InvalidInstructionSyntax)
-                        user_condition = values.LiteralValue(self, token, builder, scope)
-                        condition = builder.icmp_unsigned("!=", user_condition.value, lang.FALSE)
-                        ifblocks[list(ifblocks.keys())[-1]]["condition"] = condition
-                        state = 2
-                    elif state == 2:
-                        if not lang.is_a_segment(token):
-                            self.raise_exception(self.InvalidInstructionSyntax)
-                        ifblocks[list(ifblocks.keys())[-1]]["block"] = token
-                        state = 0
-                
-                context = contexts.IfContext(builder)
 
-                for inst_index, (inst_name, block_data) in enumerate(ifblocks.items()):
-                    condition = block_data["condition"]
-                    segment = block_data["block"]
-                    
-                    next_name = None
-                    try: next_name = list(ifblocks.keys())[inst_index + 1]
-                    except: pass
-
-                    interm_after = next_name != "else"
-                    if not inst_name in ["if", "else"] and next_name is None:
-                        interm_after = False
-
-                    if inst_name == "if":
-                        inner = self.check_instructions(segment.elements, scope, context.if_block)
-                        builder = ir.IRBuilder(inner)
-                        context.make_if(condition, builder, interm_after=interm_after)
-                    elif inst_name == "else":
-                        inner = self.check_instructions(segment.elements, scope, context.else_block)
-                        builder = ir.IRBuilder(inner)
-                        context.make_else(builder)
-                    else:
-                        elif_block = context.get_active_elif_block()
-                        inner = self.check_instructions(segment.elements, scope, elif_block)
-                        context.make_elif(condition, builder, interm_after=interm_after)
-                
-                inner = context.final_block
-                builder = ir.IRBuilder(inner)
-                context.position_at_final()
-            elif instoken and instruction.verify("instruction", "while"):
-                if not inner_is_block:
-                    self.raise_exception(self.InvalidInstructionContext, "Not in a function.")
-                if not len(s_arguments) == 2:
+    def compile_proc(self, instruction:lang.Token, tokens:list, segment:contexts.SegmentContext):
+        s_arguments = tokens[1:]
+        name_token = lang.pres_token(s_arguments, 0)
+        if name_token.options is not None:
+            self.raise_exception(self.InvalidInstructionSyntax)
+        segment_block = lang.pres_block(s_arguments, 1)
+        if not (
+            name_token.verify_type("name") and
+            lang.is_a_segment(segment_block)
+        ):
+            self.raise_exception(self.InvalidInstructionSyntax)
+
+        func_type = ir.FunctionType(lang.VOID, [])
+        func_name = name_token.token_string
+        if not lang.is_a_lower_name(func_name):
+            self.raise_exception(self.InvalidInstructionSyntax, "Function names must be in lowercase.")
+
+        with self.get_function_span("proc", func_name, segment):
+            func_class:names.Function = self.scope.append(func_name, names.Function, func_type)
+            func:ir.Function = func_class.func
+            try: entry = func.entry_basic_block
+            except: entry = func.append_basic_block("entry")
+            self.check_instructions(segment_block.elements, func_class, entry)
+            if not entry.is_terminated:
+                entry_builder = ir.IRBuilder(entry)
+                entry_builder.ret_void()
+
+    def get_function_span(self, kind:str, func_name:str, segment:contexts.SegmentContext) -> contextlib.AbstractContextManager:
+        """
+        Trace span of a top-level `func` or `proc`, closed even if its body
+        raises. The nested ones are in the span of their parent.
+        """
+        if segment.inner is None: return self.tracer.span(f"{kind} {func_name}", "function")
+        return contextlib.nullcontext()
+
+    def compile_return(self, instruction:lang.Token, tokens:list, segment:contexts.SegmentContext):
+        s_arguments = tokens[1:]
+        builder = segment.builder
+        if not segment.inner_is_block:
+            self.raise_exception(self.InvalidInstructionContext, "Not in a function.")
+        if segment.inner.is_terminated:
+            self.raise_exception(self.InvalidInstructionContext, "Block already returned.")
+        rtype = segment.inner.function.function_type.return_type
+        if len(s_arguments) == 1:
+            value_token = s_arguments[0]
+            if not self.verify_literal_value_type(value_token):
+                self.raise_exception(self.InvalidInstructionSyntax, "Not a valid literal value type.")
+            value = values.LiteralValue(self, value_token, builder, segment.scope, type_context=rtype)
+            builder.ret(value.value)
+        elif not len(s_arguments):
+            if rtype == lang.VOID:
+                builder.ret_void()
+            else:
+                builder.ret(ir.Constant(rtype, None))
+            segment.returned = True
+        else:
+            self.raise_exception(self.InvalidInstructionSyntax, "Too many arguments.")
+
+    def compile_if(self, instruction:lang.Token, tokens:list, segment:contexts.SegmentContext):
+        builder = segment.builder
+        scope = segment.scope
+        if not segment.inner_is_block:
+            self.raise_exception(self.InvalidInstructionContext, "Not in a function.")
+        if not len(tokens) >= 3:
+            self.raise_exception(self.InvalidInstructionSyntax)
+        state = 0
+        ifblocks = {}
+        for token in tokens:
+            if state == 0:
+                if not lang.is_a_token(token):
+                    self.raise_exception(self.InvalidInstructionSyntax)
+                if not (token.verify("instruction", "if") or token.verify("instruction", "elif") or token.verify("instruction", "else")):
                     self.raise_exception(self.InvalidInstructionSyntax)
-                cond_token = s_arguments[0]
-                segment_token = s_arguments[1]
-                if not (
-                    self.verify_literal_value_type(cond_token) and
-                    lang.is_a_segment(segment_token)
-                ):
+                inst = token.token_string.lower()
+                if inst == "elif":
+                    inst = self.generate_id()
+                if inst in list(ifblocks.keys()):
                     self.raise_exception(self.InvalidInstructionSyntax)
+                ifblocks[inst] = {
+                    "condition": None,
+                    "block": None
+                }
+                state = 2 if inst == "else" else 1
+            elif state == 1:
+                if not self.verify_literal_value_type(token):
+                    self.raise_exception(self.InvalidInstructionSyntax)
+                user_condition = values.LiteralValue(self, token, builder, scope)
+                condition = builder.icmp_unsigned("!=", user_condition.value, lang.FALSE)
+                ifblocks[list(ifblocks.keys())[-1]]["condition"] = condition
+                state = 2
+            elif state == 2:
+                if not lang.is_a_segment(token):
+                    self.raise_exception(self.InvalidInstructionSyntax)
+                ifblocks[list(ifblocks.keys())[-1]]["block"] = token
+                state = 0
 
-                context = contexts.WhileContext(builder)
+        context = contexts.IfContext(builder)
 
-                cond_value_1 = values.LiteralValue(self, cond_token, builder, scope)
+        for inst_index, (inst_name, block_data) in enumerate(ifblocks.items()):
+            condition = block_data["condition"]
+            if_segment = block_data["block"]
 
-                inner = self.check_instructions(segment_token.elements, scope, context.while_block)
-                context.while_builder = context.get_builder(context.while_block)
+            next_name = None
+            try: next_name = list(ifblocks.keys())[inst_index + 1]
+            except: pass
 
-                builder = ir.IRBuilder(inner)
-                cond_value_2 = values.LiteralValue(self, cond_token, context.while_builder, scope)
-                context.make_while(cond_value_1, cond_value_2, builder)
+            interm_after = next_name not in [None, "else"]  # An elif follows
 
-                inner = context.final_block
+            if inst_name == "if":
+                inner = self.check_instructions(if_segment.elements, scope, context.if_block)
                 builder = ir.IRBuilder(inner)
-                context.position_at_final()
-            elif instoken and (instruction.verify("instruction", "elif") or instruction.verify("instruction", "else")):
-                self.raise_exception(self.InvalidInstructionSyntax, "If instruction needed.")
-            elif instoken and (instruction.verify_type("type") or instruction.verify_type("name")):
-                self.check_inner_function(inner_is_block)
-                if instruction.verify_type("type") or isinstance(scope.get_from_path(instruction.token_string, error=False), names.Structure):
-                    d_arguments = lang.split_tokens(tokens, "operator", lang.EQUAL)
-                    vartype_token = lang.pres_token(d_arguments[0], 0)
-                    varname_token = lang.pres_token(d_arguments[0], 1)
-                    varvalue_token = None
-                    if len(d_arguments) == 2:
-                        if len(d_arguments[1]) > 1:
-                            self.raise_exception(self.InvalidInstructionSyntax)
-                        varvalue_token = lang.pres_token(d_arguments[1], 0)
-                        if not self.verify_literal_value_type(varvalue_token):
-                            self.raise_exception(self.InvalidInstructionSyntax)
-                    elif len(d_arguments) > 2:
-                        self.raise_exception(self.InvalidInstructionSyntax)
-                    if not (
-                        lang.are_tokens([vartype_token, varname_token]) and
-                        varname_token.verify_type("name")
-                    ):
-                        self.raise_exception(self.InvalidInstructionSyntax)
-                    varname = varname_token.token_string
-                    if not lang.is_a_lower_name(varname):
-                        self.raise_exception(self.InvalidNameCase, "Variable names must be in lowercase.")
-                    vartype = values.TypeValue(self, vartype_token, scope).type
-                    varvalue = None
-                    if not varvalue_token is None:
-                        literal_value = values.LiteralValue(self, varvalue_token, builder, scope, type_context=vartype)
-                        varvalue = literal_value.value
-                        varvalue_ptr = builder.alloca(vartype)
-                        builder.store(varvalue, varvalue_ptr)
-                    var:names.Variable = scope.append(varname, names.Variable, vartype)
-                    if len(d_arguments) == 2: var.assign_value(builder, varvalue_ptr)
-                    # TODO : Structure definition at declaration
-                elif instruction.verify_type("name") and isinstance(scope.get_from_path(instruction.token_string, error=False), names.Function):
-                    self.check_inner_function(inner_is_block)
-                    if len(s_arguments):
-                        self.raise_exception(self.InvalidInstructionSyntax, "Too many arguments.")
-                    value = values.LiteralValue(self, instruction, builder, scope)
-                else:
-                    self.check_inner_function(inner_is_block)
-                    d_arguments = lang.split_tokens(tokens, "operator", lang.EQUAL)
-                    if not len(d_arguments) == 2:
-                        self.raise_exception(self.InvalidInstructionSyntax)
-                    if not len(d_arguments[0]) == 1:
-                        self.raise_exception(self.InvalidInstructionSyntax)
-                    if not len(d_arguments[1]) == 1:
-                        self.raise_exception(self.InvalidInstructionSyntax)
-                    varname_token = lang.pres_token(d_arguments[0], 0)
-                    varvalue_token = lang.pres_token(d_arguments[1], 0)
-                    if not self.verify_literal_value_type(varvalue_token):
-                        self.raise_exception(self.InvalidInstructionSyntax)
-                    varname = varname_token.token_string
-                    found = scope.get_from_path(varname)
-                    if not isinstance(found, names.Variable):
-                        self.raise_exception(self.InvalidInstructionSyntax, "Need to be a variable.")
-                    found:names.Variable
-                    vartype = found.type
-                    varvalue = values.LiteralValue(self, varvalue_token, builder, scope, type_context=vartype).value
-                    varvalue_ptr = builder.alloca(vartype)
-                    builder.store(varvalue, varvalue_ptr)
-                    found.assign_value(builder, varvalue_ptr)
-            elif instoken and instruction.verify("instruction", "ops"):
-                self.check_inner_function(inner_is_block)
-                if not len(arguments):
-                    self.raise_exception(self.InvalidInstructionSyntax, "Need operations.")
-                operations = arguments[0]
-                for operation in operations:
-                    if not lang.is_options(operation):
-                        self.raise_exception(self.InvalidInstructionSyntax)
-                    operation = operation.elements
-                    if not len(operation) >= 2:
-                        self.raise_exception(self.InvalidInstructionSyntax)
-                    operator = operation[0]
-                    if not (lang.is_a_token(operator) and (
-                            operator.verify_type("operator") or
-                            operator.verify_type("name")
-                        )):
-                        self.raise_exception(self.InvalidInstructionSyntax)
-                    values_tokens = operation[1:]
-                    for value in values_tokens:
-                        if not (self.verify_literal_value_type(value) or value.verify("instruction", "to")):
-                            self.raise_exception(self.InvalidInstructionSyntax)
-                    dest_value_token = values_tokens[0]
-                    for value_index, value_token in enumerate(values_tokens[1:]):
-                        if value_token.verify("instruction", "to"):
-                            v = values_tokens[1:]  # TODO: Change this
-                            if not len(v) == value_index + 2:
-                                self.raise_exception(self.InvalidInstructionSyntax)
-                            dest_value_token = v[value_index + 1]
-                            for i in range(2): values_tokens.pop()
-                            break
-                    if not (lang.is_a_token(dest_value_token) and dest_value_token.verify_type("name")):
-                        self.raise_exception(self.InvalidInstructionSyntax)
-                    dest_name:names.Variable = scope.get_from_path(dest_value_token.token_string)
-                    if not isinstance(dest_name, names.Variable):
-                        self.raise_exception(self.InvalidInstructionSyntax)
-                    values_ = []
-                    for value_token in values_tokens[1:]:
-                        values_.append(values.LiteralValue(self, value_token, builder, scope, dest_name.type).value)
-                    for value in values_:
-                        final_value:ir.Value
-                        
-                        dest_value = values.LiteralValue(self, dest_value_token, builder, scope).value
-
-                        if operator.verify("name", "add"):
-                            final_value = builder.add(dest_value, value)
-                        elif operator.verify("name", "fadd"):
-                            final_value = builder.fadd(dest_value, value)
-                        elif operator.verify("name", "sub"):
-                            final_value = builder.sub(dest_value, value)
-                        elif operator.verify("name", "fsub"):
-                            final_value = builder.fsub(dest_value, value)
-                        elif operator.verify("name", "fcmp_equal"):
-                            final_value = builder.fcmp_ordered("==", dest_value, value)
-                        elif operator.verify("name", "fcmp_more_equal"):
-                            final_value = builder.fcmp_ordered(">=", dest_value, value)
-                        elif operator.verify("name", "fcmp_less_equal"):
-                            final_value = builder.fcmp_ordered("<=", dest_value, value)
-                        elif operator.verify("name", "fcmp_not_equal"):
-                            final_value = builder.fcmp_ordered("!=", dest_value, value)
-                        elif operator.verify("name", "fcmp_more"):
-                            final_value = builder.fcmp_ordered(">", dest_value, value)
-                        elif operator.verify("name", "fcmp_less"):
-                            final_value = builder.fcmp_ordered("<", dest_value, value)
-                        else:
-                            self.raise_exception(self.InvalidInstructionSyntax)
-
-                        final_value_ptr = builder.alloca(dest_name.type)
-                        builder.store(final_value, final_value_ptr)
-                            
-                        dest_name.assign_value(builder, final_value_ptr)
-            elif self.verify_literal_value_type(instruction):
-                self.check_inner_function(inner_is_block)
-                if len(s_arguments):
-                    self.raise_exception(self.InvalidInstructionSyntax, "Too many arguments.")
-                value = values.LiteralValue(self, instruction, builder, scope)
+                context.make_if(condition, builder, interm_after=interm_after)
+            elif inst_name == "else":
+                inner = self.check_instructions(if_segment.elements, scope, context.else_block)
+                builder = ir.IRBuilder(inner)
+                context.make_else(builder)
             else:
-                self.raise_exception(self.InvalidInstruction)
-        
-        return inner
+                elif_block = context.get_active_elif_block()
+                inner = self.check_instructions(if_segment.elements, scope, elif_block)
+                builder = ir.IRBuilder(inner)
+                context.make_elif(condition, builder, interm_after=interm_after)
+
+        segment.inner = context.final_block
+        segment.builder = ir.IRBuilder(segment.inner)
+        context.position_at_final()
+
+    def compile_while(self, instruction:lang.Token, tokens:list, segment:contexts.SegmentContext):
+        s_arguments = tokens[1:]
+        builder = segment.builder
+        scope = segment.scope
+        if not segment.inner_is_block:
+            self.raise_exception(self.InvalidInstructionContext, "Not in a function.")
+        if not len(s_arguments) == 2:
+            self.raise_exception(self.InvalidInstructionSyntax)
+        cond_token = s_arguments[0]
+        segment_token = s_arguments[1]
+        if not (
+            self.verify_literal_value_type(cond_token) and
+            lang.is_a_segment(segment_token)
+        ):
+            self.raise_exception(self.InvalidInstructionSyntax)
+
+        context = contexts.WhileContext(builder)
+
+        cond_value_1 = values.LiteralValue(self, cond_token, builder, scope)
+
+        inner = self.check_instructions(segment_token.elements, scope, context.while_block)
+
+        builder = ir.IRBuilder(inner)
+        cond_value_2 = values.LiteralValue(self, cond_token, builder, scope)
+        context.make_while(cond_value_1, cond_value_2, builder)
+
+        segment.inner = context.final_block
+        segment.builder = ir.IRBuilder(segment.inner)
+        context.position_at_final()
+
+    def compile_branch_without_if(self, instruction:lang.Token, tokens:list, segment:contexts.SegmentContext):
+        self.raise_exception(self.InvalidInstructionSyntax, "If instruction needed.")
+
+    def compile_name_instruction(self, instruction:lang.Token, tokens:list, segment:contexts.SegmentContext):
+        """
+        Declaration of a variable, call of a function or assignment.
+        """
+        s_arguments = tokens[1:]
+        builder = segment.builder
+        scope = segment.scope
+        self.check_inner_function(segment.inner_is_block)
+        if instruction.verify_type("type") or isinstance(scope.get_from_path(instruction.token_string, error=False), names.Structure):
+            d_arguments = lang.split_tokens(tokens, "operator", lang.EQUAL)
+            vartype_token = lang.pres_token(d_arguments[0], 0)
+            varname_token = lang.pres_token(d_arguments[0], 1)
+            varvalue_token = None
+            if len(d_arguments) == 2:
+                if len(d_arguments[1]) > 1:
+                    self.raise_exception(self.InvalidInstructionSyntax)
+                varvalue_token = lang.pres_token(d_arguments[1], 0)
+                if not self.verify_literal_value_type(varvalue_token):
+                    self.raise_exception(self.InvalidInstructionSyntax)
+            elif len(d_arguments) > 2:
+                self.raise_exception(self.InvalidInstructionSyntax)
+            if not (
+                lang.are_tokens([vartype_token, varname_token]) and
+                varname_token.verify_type("name")
+            ):
+                self.raise_exception(self.InvalidInstructionSyntax)
+            varname = varname_token.token_string
+            if not lang.is_a_lower_name(varname):
+                self.raise_exception(self.InvalidNameCase, "Variable names must be in lowercase.")
+            vartype = values.TypeValue(self, vartype_token, scope).type
+            varvalue = None
+            if not varvalue_token is None:
+                literal_value = values.LiteralValue(self, varvalue_token, builder, scope, type_context=vartype)
+                varvalue = literal_value.value
+            var:names.Variable = scope.append(varname, names.Variable, vartype)
+            if len(d_arguments) == 2: var.assign_value(builder, varvalue)
+            # TODO : Structure definition at declaration
+        elif instruction.verify_type("name") and isinstance(scope.get_from_path(instruction.token_string, error=False), names.Function):
+            if len(s_arguments):
+                self.raise_exception(self.InvalidInstructionSyntax, "Too many arguments.")
+            value = values.LiteralValue(self, instruction, builder, scope)
+        else:
+            d_arguments = lang.split_tokens(tokens, "operator", lang.EQUAL)
+            if not len(d_arguments) == 2:
+                self.raise_exception(self.InvalidInstructionSyntax)
+            if not len(d_arguments[0]) == 1:
+                self.raise_exception(self.InvalidInstructionSyntax)
+            if not len(d_arguments[1]) == 1:
+                self.raise_exception(self.InvalidInstructionSyntax)
+            varname_token = lang.pres_token(d_arguments[0], 0)
+            varvalue_token = lang.pres_token(d_arguments[1], 0)
+            if not self.verify_literal_value_type(varvalue_token):
+                self.raise_exception(self.InvalidInstructionSyntax)
+            varname = varname_token.token_string
+            found = scope.get_from_path(varname)
+            if not isinstance(found, names.Variable):
+                self.raise_exception(self.InvalidInstructionSyntax, "Need to be a variable.")
+            found:names.Variable
+            vartype = found.type
+            varvalue = values.LiteralValue(self, varvalue_token, builder, scope, type_context=vartype).value
+            found.assign_value(builder, varvalue)
+
+    def compile_ops(self, instruction:lang.Token, tokens:list, segment:contexts.SegmentContext):
+        arguments = lang.split_tokens(tokens[1:], "delimiter", lang.COMMA)
+        builder = segment.builder
+        scope = segment.scope
+        self.check_inner_function(segment.inner_is_block)
+        if not len(arguments):
+            self.raise_exception(self.InvalidInstructionSyntax, "Need operations.")
+        operations = arguments[0]
+        for operation in operations:
+            if not lang.is_options(operation):
+                self.raise_exception(self.InvalidInstructionSyntax)
+            operation = operation.elements
+            if not len(operation) >= 2:
+                self.raise_exception(self.InvalidInstructionSyntax)
+            operator = operation[0]
+            if not (lang.is_a_token(operator) and (
+                    operator.verify_type("operator") or
+                    operator.verify_type("name")
+                )):
+                self.raise_exception(self.InvalidInstructionSyntax)
+            values_tokens = operation[1:]
+            for value in values_tokens:
+                if not (self.verify_literal_value_type(value) or value.verify("instruction", "to")):
+                    self.raise_exception(self.InvalidInstructionSyntax)
+            dest_value_token = values_tokens[0]
+            for value_index, value_token in enumerate(values_tokens[1:]):
+                if value_token.verify("instruction", "to"):
+                    v = values_tokens[1:]  # TODO: Change this
+                    if not len(v) == value_index + 2:
+                        self.raise_exception(self.InvalidInstructionSyntax)
+                    dest_value_token = v[value_index + 1]
+                    for i in range(2): values_tokens.pop()
+                    break
+            if not (lang.is_a_token(dest_value_token) and dest_value_token.verify_type("name")):
+                self.raise_exception(self.InvalidInstructionSyntax)
+            dest_name:names.Variable = scope.get_from_path(dest_value_token.token_string)
+            if not isinstance(dest_name, names.Variable):
+                self.raise_exception(self.InvalidInstructionSyntax)
+            operation_func = self.OPS_OPERATIONS.get(operator.key) if operator.token_type == "name" else None
+            values_ = []
+            for value_token in values_tokens[1:]:
+                values_.append(values.LiteralValue(self, value_token, builder, scope, dest_name.type).value)
+            for value in values_:
+                dest_value = values.LiteralValue(self, dest_value_token, builder, scope).value
+
+                if operation_func is None:
+                    self.raise_exception(self.InvalidInstructionSyntax)
+                final_value:ir.Value = operation_func(builder, dest_value, value)
+
+                dest_name.assign_value(builder, final_value)
+
+    def compile_value_instruction(self, instruction:lang.Token, tokens:list, segment:contexts.SegmentContext):
+        self.check_inner_function(segment.inner_is_block)
+        if len(tokens) > 1:
+            self.raise_exception(self.InvalidInstructionSyntax, "Too many arguments.")
+        value = values.LiteralValue(self, instruction, segment.builder, segment.scope)
     
     def compile(self, segments:list[lang.Token], blocks:list[lang.Block], program:program.Program=None):
         if not program: program = self.main_program
@@ -539,15 +602,42 @@ class Compiler():
 
         self.running_programs.append(program)
 
-        self.check_pp_static_commands(segments)
+        with self.tracer.span("Compiler.check_pp_static_commands"):
+            self.check_pp_static_commands(segments)
 
-        blocks = self.check_macros(blocks, False)
+        with self.tracer.span("Compiler.check_macros"):
+            blocks = self.check_macros(blocks, False)
 
-        self.check_instructions(blocks, self.scope)
+        with self.tracer.span("Compiler.check_instructions"):
+            self.check_instructions(blocks, self.scope)
 
         ...  # TODO
     
     def verify_literal_value_type(self, token:lang.Token):
         return lang.is_a_stack(token) or lang.is_a_segment(token) or (lang.is_a_token(token) and token.token_type.lower() in lang.LITERAL_TOKEN_TYPES)
 
-    def get_llvm_module(self) -> ir.Module: return self.running_programs[-1].module
\ No newline at end of file
+    def get_llvm_module(self) -> ir.Module: return self.running_programs[-1].module
+
+    def get_runtime(self, module:ir.Module) -> runtime.Runtime:
+        """
+        Runtime of the stacks and arenas of a module, made at its first use.
+        """
+        if module not in self.runtimes: self.runtimes[module] = runtime.Runtime(module)
+        return self.runtimes[module]
+
+    def get_arena(self, builder:ir.IRBuilder, size_in_bytes:int) -> arena.Arena|None:
+        """
+        Arena of the function being built if `#mem ~` is used, else the arena of
+        the program if `#mem` is used. They are made at their first use.
+        """
+        if self.arena_allocation_limit is not None and size_in_bytes > self.arena_allocation_limit: return None
+        if self.function_arena_size is not None:
+            function = builder.function
+            if function not in self.function_arenas:
+                locals_builder = frame.get_locals_builder(function)  # Before all its uses
+                self.function_arenas[function] = arena.Arena(locals_builder, self.function_arena_size, self.generate_id(), True, self.get_runtime(function.module))
+            return self.function_arenas[function]
+        if self.program_arena_size is not None:
+            if self.program_arena is None: self.program_arena = arena.Arena(builder, self.program_arena_size, self.generate_id(), False, self.get_runtime(builder.module))
+            return self.program_arena
+        return None
\ No newline at end of file
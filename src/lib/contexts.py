@@ -41,7 +41,7 @@ class IfContext(Context):
         self.elif_blocks.append(elif_block)
         return elif_block, elif_builder
     
-    def get_builder(self, block:ir.Block) -> ir.IRBuilder: return ir.IRBuilder(block)
+    def get_builder(self, block:ir.Block) -> ir.IRBuilder: return ir.IRBuilder(block)  # Positioned after the current instructions of the block
 
     def position_at_final(self):
         if not self.else_made:
@@ -56,7 +56,7 @@ class IfContext(Context):
             interm, interm_builder = self.create_interm()
             self.builder.cbranch(condition, self.if_block, interm)
         if not self.if_block.is_terminated:
-            self.if_builder.branch(self.final_block)
+            self.get_builder(self.if_block).branch(self.final_block)
         elif not act_builder.block.is_terminated:
             act_builder.branch(self.final_block)
         if interm_after: return interm, interm_builder
@@ -80,6 +80,7 @@ class IfContext(Context):
         self.else_builder:ir.IRBuilder = self.get_builder(self.else_block)
         self.else_made = True
         if not self.else_block.is_terminated:
+            self.else_builder.position_at_end(self.else_block)
             self.else_builder.branch(self.final_block)
         elif not act_builder.block.is_terminated:
             act_builder.branch(self.final_block)
@@ -95,19 +96,23 @@ class WhileContext(Context):
         cond_1 = self.builder.icmp_unsigned("!=", cond_value_1.value, lang.FALSE)
         self.builder.cbranch(cond_1, self.while_block, self.final_block)
 
-        if not self.while_block.is_terminated:
-            self.while_builder.position_at_end(self.while_block)
-            cond_2 = self.while_builder.icmp_unsigned("!=", cond_value_2.value, lang.FALSE)
-            self.while_builder.cbranch(cond_2, self.while_block, self.final_block)
-        elif not act_builder.block.is_terminated:
-            self.while_builder.position_at_end(act_builder.block)
+        if not act_builder.block.is_terminated:
             cond_2 = act_builder.icmp_unsigned("!=", cond_value_2.value, lang.FALSE)
             act_builder.cbranch(cond_2, self.while_block, self.final_block)
-        else:
-            
-            pass  # print(self.while_block)
 
     def position_at_final(self):
         self.builder.position_at_end(self.final_block)
     
-    def get_builder(self, block:ir.Block) -> ir.IRBuilder: return ir.IRBuilder(block)
\ No newline at end of file
+    def get_builder(self, block:ir.Block) -> ir.IRBuilder: return ir.IRBuilder(block)
+class SegmentContext(Context):
+    """
+    The state shared by the instructions of a segment, the handlers move it to
+    the blocks they create.
+    """
+
+    def __init__(self, builder:ir.IRBuilder|None, inner:any, scope):
+        super().__init__(builder)
+        self.inner = inner
+        self.inner_is_block = isinstance(inner, ir.Block)
+        self.scope = scope
+        self.returned = False  # A `return` without value ends the segment
@@ -0,0 +1,25 @@
+import llvmlite.ir as ir
+
+LOCALS_BLOCK_NAME = "locals"
+
+def get_locals_builder(function:ir.Function) -> ir.IRBuilder:
+    """
+    Builder at the end of the first block of the function, who holds its
+    allocas and branches to the code. An alloca made there is made once per
+    call, even in a loop, and LLVM can turn it into a register.
+    """
+    blocks = function.blocks
+    if blocks[0].name != LOCALS_BLOCK_NAME:
+        # A new block, so the builders positioned in the others stay valid
+        locals_block = ir.Block(function, LOCALS_BLOCK_NAME)
+        ir.IRBuilder(locals_block).branch(blocks[0])
+        blocks.insert(0, locals_block)
+    builder = ir.IRBuilder(blocks[0])
+    builder.position_before(blocks[0].terminator)
+    return builder
+
+def alloca(builder:ir.IRBuilder, type:ir.Type, name:str="") -> ir.AllocaInstr:
+    """
+    Alloca in the frame of the function being built.
+    """
+    return get_locals_builder(builder.function).alloca(type, name=name)
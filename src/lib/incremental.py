@@ -0,0 +1,162 @@
+import lib.lang as lang
+import lib.parser as parser
+
+class IncrementalParser():
+    """
+    Keeps the parsed tree of a text, for the editors who parse it again after
+    each change.
+
+    An edit only re-lexes the lines of the innermost `segment`, `stack` or
+    `options` block around it, and rebuilds the elements of this block. The
+    whole text is parsed again when the edit isn't inside a block, when it
+    changes where the block ends, or when a string spans many lines.
+    """
+
+    class InvalidEdit(BaseException): ...
+
+    OPENING_DELIMITERS = {lang.OPEN_HOOK, lang.OPEN_CURLY_BRACE, lang.OPEN_BRACKET}
+    CLOSING_DELIMITERS = {lang.CLOSE_HOOK, lang.CLOSE_CURLY_BRACE, lang.CLOSE_BRACKET}
+
+    def __init__(self, pimo_instance, text:str):
+        self.pimo_instance = pimo_instance
+        self.tracer = self.pimo_instance.tracer
+        self.lines:list[str] = (text + "\n").splitlines()  # A last empty line is kept, like in the editors
+        self.full_parses = 0
+        self.incremental_parses = 0
+        self.parse_all()
+
+    def get_text(self) -> str: return "\n".join(self.lines)
+
+    def parse_all(self):
+        self.parser = parser.Parser(self.pimo_instance)
+        with self.tracer.span("IncrementalParser.parse_all"):
+            self.segments:list[dict] = self.parser.parse(self.get_text())
+            self.blocks:list = self.parser.parse_rest(self.parser.parse_blocks(self.segments))
+        # Each line has its segment, unless a string spans many lines
+        self.aligned = len(self.segments) == len(self.get_text().splitlines()) and not self.parser.unclosed_string
+        self.full_parses += 1
+
+    def apply_edit(self, start_line:int, start_column:int, end_line:int, end_column:int, text:str) -> bool:
+        """
+        Replaces the text between two positions, the lines counted from 1 and
+        the columns from 0. Returns False if the whole text was parsed again.
+        """
+        if not (1 <= start_line <= end_line <= len(self.lines)):
+            self.pimo_instance.raise_exception(self.InvalidEdit, f"Lines {start_line} to {end_line} aren't in the text of {len(self.lines)} lines.")
+        new_lines = (self.lines[start_line - 1][:start_column] + text + self.lines[end_line - 1][end_column:] + "\n").splitlines()
+        self.lines[start_line - 1:end_line] = new_lines
+        delta = len(new_lines) - (end_line - start_line + 1)
+
+        if self.aligned:
+            block = self.find_enclosing_block(start_line, end_line)
+            if block is not None:
+                with self.tracer.span("IncrementalParser.reparse_block"):
+                    reparsed = self.reparse_block(block, delta)
+                if reparsed:
+                    self.incremental_parses += 1
+                    return True
+        self.parse_all()
+        return False
+
+    def find_enclosing_block(self, start_line:int, end_line:int) -> lang.Block|None:
+        """
+        Innermost block whose delimiters are on lines outside the edited ones.
+        """
+        found = None
+        elements = self.blocks
+        while True:
+            for element in elements:
+                if isinstance(element, lang.Block) and element.end_line is not None and element.line < start_line and end_line < element.end_line:
+                    found = element
+                    elements = element.elements
+                    break
+            else:
+                return found
+
+    def find_closing_token(self, lines:list[tuple[int, list[lang.Token], bool]]) -> tuple[int, int]|None:
+        """
+        Position of the token closing the block opened before `lines`, given as
+        (line, tokens, starts the line), the lines ignored by `parse_blocks` are
+        skipped.
+        """
+        depth = 0
+        for line_index, (line_nb, tokens, line_start) in enumerate(lines):
+            if line_start and tokens and tokens[0].verify("operator", lang.HASHTAG): continue
+            for token_index, token in enumerate(tokens):
+                if token.token_type != "delimiter": continue
+                if token.key in self.OPENING_DELIMITERS: depth += 1
+                elif token.key in self.CLOSING_DELIMITERS:
+                    if not depth: return line_index, token_index
+                    depth -= 1
+        return None
+
+    def reparse_block(self, block:lang.Block, delta:int) -> bool:
+        first_line = block.line
+        old_last_line = block.end_line
+        last_line = old_last_line + delta
+        old_segments = self.segments[first_line - 1:old_last_line]
+
+        self.parser.strings = {}  # Only used while lexing, the tokens hold their strings
+        self.parser.strings_count = 0
+        new_segments = self.parser.parse("\n".join(self.lines[first_line - 1:last_line]), first_line)
+        if self.parser.unclosed_string or len(new_segments) != len(self.lines[first_line - 1:last_line]): return False
+
+        old_first_tokens = old_segments[0]["tokens"]
+        new_first_tokens = new_segments[0]["tokens"]
+        if len(old_first_tokens) != len(new_first_tokens): return False
+        opening_index = next(index for index, token in enumerate(old_first_tokens) if token is block.start_token)
+
+        def get_lines(segments:list[dict]) -> list[tuple[int, list[lang.Token], bool]]:
+            return [(segments[0]["line"], segments[0]["tokens"][opening_index + 1:], False)] + [(segment["line"], segment["tokens"], True) for segment in segments[1:]]
+
+        old_lines = get_lines(old_segments)
+        new_lines = get_lines(new_segments)
+        old_closing = self.find_closing_token(old_lines)
+        new_closing = self.find_closing_token(new_lines)
+        if old_closing is None or new_closing != (old_closing[0] + delta, old_closing[1]): return False  # The block ends elsewhere now
+        closing_index = new_closing[1]
+
+        # Rebuilds the elements of the block only
+        block.elements = []
+        active_block = block
+        for line_index, (line_nb, tokens, line_start) in enumerate(new_lines):
+            if line_start and tokens and tokens[0].verify("operator", lang.HASHTAG): continue
+            if line_index == len(new_lines) - 1: tokens = tokens[:closing_index]
+            active_block = self.parser.parse_line_blocks(tokens, line_nb, active_block, block)
+        block.elements = self.parser.parse_rest(block.elements)
+
+        # The tokens out of the block on its first and last lines are kept, the parents refer to them
+        old_last_tokens = old_segments[-1]["tokens"]
+        new_last_tokens = new_segments[-1]["tokens"]
+        new_segments[0]["tokens"] = old_first_tokens[:opening_index + 1] + new_first_tokens[opening_index + 1:]
+        kept_tokens = old_last_tokens[len(old_last_tokens) - len(new_last_tokens) + closing_index + 1:]
+        new_segments[-1]["tokens"] = new_last_tokens[:closing_index + 1] + kept_tokens
+        self.segments[first_line - 1:old_last_line] = new_segments
+
+        if delta:
+            for token in kept_tokens:
+                if token.line is not None: token.line += delta
+            self.shift_lines(block, old_last_line, delta)
+        block.end_line = last_line
+        return True
+
+    def shift_lines(self, block:lang.Block, old_last_line:int, delta:int):
+        """
+        Moves the lines after the rebuilt block, and the end of its parents.
+        """
+        for segment in self.segments[old_last_line + delta:]:
+            segment["line"] += delta
+            for token in segment["tokens"]:
+                if token.line is not None: token.line += delta
+
+        stack = [element for element in self.blocks]
+        while stack:
+            element = stack.pop()
+            if isinstance(element, lang.Token):
+                if element.options is not None: stack.append(element.options)
+                if element.array_stacks is not None: stack.extend(element.array_stacks)
+                continue
+            if element is block: continue  # Already rebuilt
+            if element.line is not None and element.line >= old_last_line: element.line += delta
+            if element.end_line is not None and element.end_line >= old_last_line: element.end_line += delta
+            stack.extend(element.elements)
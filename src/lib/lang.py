@@ -1,8 +1,6 @@
-import llvmlite as llvm
-import llvmlite.ir as ir
 import lib.utils as utils
 from lib.enum import *
-import struct
+import struct, sys, re
 
 #########################
 #  LEXICAL DEFINITIONS  #
@@ -70,51 +68,25 @@ INSTRUCTIONS = ["func", "return", "if", "elif", "else", "while", "proc", "break"
                 "to"
 ]
 
-# Types
-UNSIGNED_8 = ir.IntType(8)
-UNSIGNED_16 = ir.IntType(16)
-UNSIGNED_24 = ir.IntType(24)
-UNSIGNED_32 = ir.IntType(32)
-UNSIGNED_64 = ir.IntType(64)
-UNSIGNED_128 = ir.IntType(128)
-UNSIGNED_256 = ir.IntType(256)
-FLOAT_32 = ir.FloatType()
-FLOAT_64 = ir.DoubleType()
-CHAR = ir.IntType(8)
-BOOLEAN = ir.IntType(1)
-VOID = ir.VoidType()
-VOID_PTR = ir.IntType(8).as_pointer()
-STRING = CHAR.as_pointer()
-
-TYPES_WITH_LLTYPES = {
-    "u8": UNSIGNED_8,
-    "u16": UNSIGNED_16,
-    "u24": UNSIGNED_24,
-    "u32": UNSIGNED_32,
-    "u64": UNSIGNED_64,
-    "u128": UNSIGNED_128,
-    "u256": UNSIGNED_256,
-    "f32": FLOAT_32,
-    "f64": FLOAT_64,
-    "chr": CHAR,
-    "bool": BOOLEAN,
-    "void": VOID,
-    "str": STRING,
-    "any": VOID_PTR,
+# Types, their LLVM types are defined in `lltypes`, loaded at the first use
+TYPES = [
+    "u8", "u16", "u24", "u32", "u64", "u128", "u256", "f32", "f64", "chr", "bool", "void", "str", "any",
     # Aliases :
-    "int": UNSIGNED_32,
-    "dec": FLOAT_64,
-    "byte": UNSIGNED_8,
-    "big": UNSIGNED_256
-}
-
-TYPES = list(TYPES_WITH_LLTYPES.keys())
+    "int", "dec", "byte", "big"
+]
 
-# Constants
+LLTYPES_NAMES = {
+    "UNSIGNED_8", "UNSIGNED_16", "UNSIGNED_24", "UNSIGNED_32", "UNSIGNED_64", "UNSIGNED_128", "UNSIGNED_256",
+    "FLOAT_32", "FLOAT_64", "CHAR", "BOOLEAN", "VOID", "VOID_PTR", "STRING",
+    "TYPES_WITH_LLTYPES", "TRUE", "FALSE", "NULL_PTR"
+}
 
-TRUE = ir.Constant(BOOLEAN, 1)
-FALSE = ir.Constant(BOOLEAN, 0)
-NULL_PTR = ir.Constant(VOID_PTR, None)
+def __getattr__(name:str):  # Keeps llvmlite unloaded for the parse-only runs
+    if name in LLTYPES_NAMES:
+        import lib.lltypes as lltypes
+        globals().update({llname: getattr(lltypes, llname) for llname in LLTYPES_NAMES})
+        return globals()[name]
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 # Alphabet
 AL_LETTERS = "abcdefghijklmnopqrstuvwxyz"
@@ -128,6 +100,20 @@ HEX_DIGITS = "0123456789abcdef"
 # Name chars
 NM_CHARS = AL_LETTERS + AL_LETTERS_UPPER + DIGITS + UNDERSCORE
 
+# Parts of a line : runs of name chars, and every other char alone except the spaces
+PARTS_REGEX = re.compile(f"[{re.escape(NM_CHARS)}]+|[^{re.escape(NM_CHARS + SPACE)}]")
+
+# String literals
+ESCAPES = {  # Escaped char: replacement, the quotes are kept as `ESCAPED_QUOTES` until the end of their string
+    "n": "\n",
+    "t": "\t",
+    "\"": "š",
+    "'": "ž",
+    "s": DOUBLE_SLASH
+}
+ESCAPED_QUOTES = {"š": "\"", "ž": "'"}
+STRINGS_REGEX = re.compile(r"""(?P<backslash>\\\\|\\)(?P<escaped>[nt"'s])?|(?P<quote>["'])""")
+
 PPCommands = { # Pre-processor commands
     "define", "mem", "acmem"
 }
@@ -144,109 +130,146 @@ L_DefaultTokens = list(DefaultTokens)
 
 LITERAL_TOKEN_TYPES = ["integer", "decimal", "boolean", "string", "name"]
 
+OPERATORS_SET = frozenset(OPERATORS)
+DELIMITERS_SET = frozenset(DELIMITERS)
+REGISTERS_SET = frozenset(REGISTERS)
+INSTRUCTIONS_SET = frozenset(INSTRUCTIONS)
+TYPES_SET = frozenset(TYPES)
+
+# Token types of the keywords, by lowered string, the first kind listed wins
+KEYWORDS_TOKEN_TYPES:dict[str, str] = {}
+for token_type, keywords in (
+    ("pposcommand", PPOSCommands), ("ppcommand", PPCommands), ("boolean", ["true", "false"]),
+    ("delimiter", DELIMITERS), ("operator", OPERATORS), ("instruction", INSTRUCTIONS)
+):
+    for keyword in keywords: KEYWORDS_TOKEN_TYPES.setdefault(keyword.lower(), token_type)
+# Token types of the case sensitive keywords
+CASED_TOKEN_TYPES:dict[str, str] = {**{register: "register" for register in REGISTERS}, **{type_name: "type" for type_name in TYPES}}
+del token_type, keywords, keyword
+
+TOKEN_TYPES_CACHE:dict[str, str] = {}  # Token string: token type, for the repeated names
+MAX_CACHED_TOKEN_TYPES = 65536
+
 
 #####################
 #  GRAMMAR METHODS  #
 #####################
 
-def is_a_valid_name(presumed_name: str):
-    if not presumed_name or presumed_name[0] in DIGITS:
-        return False
-    return all(char in NM_CHARS for char in presumed_name)
+def is_a_valid_name(presumed_name: str):  # `[A-Za-z_][A-Za-z0-9_]*`
+    return presumed_name.isascii() and presumed_name.isidentifier()
 
 def is_an_upper_name(presumed_upper_name:str): return presumed_upper_name == presumed_upper_name.upper()
 
 def is_a_lower_name(presumed_lower_name:str): return presumed_lower_name == presumed_lower_name.lower()
 
-def is_an_integer(presumed_integer:str):
-    if not len(presumed_integer): return False
-    for char in presumed_integer:
-        if not char in DIGITS: return False
-    return True
+def is_an_integer(presumed_integer:str):  # `[0-9]+`
+    return presumed_integer.isascii() and presumed_integer.isdigit()
 
 def is_a_decimal(presumed_decimal:str):
-    if not len(presumed_decimal): return False
-    parts = presumed_decimal.split(DOT)
-    if not len(parts) == 2: return False
-    for part in parts:
-        if not is_an_integer(part): return False
-    return True
+    integer_part, dot, decimal_part = presumed_decimal.partition(DOT)
+    return bool(dot) and is_an_integer(integer_part) and is_an_integer(decimal_part)
 
 def is_a_boolean(presumed_boolean:str):
-    if presumed_boolean.lower() in ["true", "false"]: return True
-    return False
+    return KEYWORDS_TOKEN_TYPES.get(presumed_boolean.lower()) == "boolean"
 
 def is_an_operator(presumed_operator:str):
-    if presumed_operator.lower() in OPERATORS: return True
-    return False
+    return presumed_operator.lower() in OPERATORS_SET
 
 def is_a_delimiter(presumed_delimiter:str):
-    if presumed_delimiter.lower() in DELIMITERS: return True
-    return False
+    return presumed_delimiter.lower() in DELIMITERS_SET
 
 def is_a_register(presumed_register:str):
-    if presumed_register in REGISTERS: return True
-    return False
+    return presumed_register in REGISTERS_SET
 
 def is_an_instruction(presumed_instruction:str):
-    if presumed_instruction.lower() in INSTRUCTIONS: return True
-    return False
+    return presumed_instruction.lower() in INSTRUCTIONS_SET
 
 def is_a_type(presumed_type:str):
-    if presumed_type in TYPES: return True
-    return False
-
+    return presumed_type in TYPES_SET
+
+def classify_token(token_string:str) -> str:
+    """
+    Token type of a string, keywords first, then numbers and names.
+    """
+    token_type = KEYWORDS_TOKEN_TYPES.get(token_string.lower()) or CASED_TOKEN_TYPES.get(token_string)
+    if token_type is not None: return token_type
+    if is_an_integer(token_string): return "integer"
+    if is_a_decimal(token_string): return "decimal"
+    if is_a_valid_name(token_string): return "name"
+    return "unknown"
+
+def get_token_type(token_string:str) -> str:
+    token_type = TOKEN_TYPES_CACHE.get(token_string)
+    if token_type is None:
+        token_type = classify_token(token_string)
+        if len(TOKEN_TYPES_CACHE) < MAX_CACHED_TOKEN_TYPES: TOKEN_TYPES_CACHE[token_string] = token_type
+    return token_type
 
 #############
 #  CLASSES  #
 #############
 
 class Token():
+    __slots__ = (
+        "_token_string", "key", "token_type", "type_name", "options", "ptr_iter",
+        "array_stacks", "size", "lenght", "memory", "var", "line", "parent_block"
+    )
+
     def __init__(self, token_string: str, token_type: str = None):
         self.token_string = token_string
-        self.token_type = token_type or self.get_type()
-
-    def get_type(self):
-        if self.token_string.lower() in PPCommands:
-            if self.token_string.lower() in PPOSCommands:
-                return "pposcommand"
-            return "ppcommand"
-        if is_a_boolean(self.token_string):
-            return "boolean"
-        if is_an_integer(self.token_string):
-            return "integer"
-        if is_a_decimal(self.token_string):
-            return "decimal"
-        if is_a_delimiter(self.token_string):
-            return "delimiter"
-        if is_an_operator(self.token_string):
-            return "operator"
-        if is_an_instruction(self.token_string):
-            return "instruction"
-        if is_a_register(self.token_string):
-            return "register"
-        if is_a_type(self.token_string):
-            return "type"
-        if is_a_valid_name(self.token_string):
-            return "name"
-        
-        return "unknown"
+        self.token_type:str = sys.intern(token_type or self.get_type())
+        self.type_name:str|None = None
+        self.options:Block|None = None  # Options block after a name, like function arguments
+        self.ptr_iter:int = 0  # Number of `*` after a type or a name
+        self.array_stacks:list[Block]|None = None  # Stacks after a type or a name
+        self.size:int|None = None
+        self.lenght:int|None = None
+        self.memory:str|None = None
+        self.var:bool = False  # Variadic function
+        self.line:int|None = None
+        self.parent_block:Block|None = None
+
+    @property
+    def token_string(self) -> str: return self._token_string
+
+    @token_string.setter
+    def token_string(self, token_string:str):  # `key` is the lowered string, compared by `verify`
+        self._token_string = token_string
+        self.key = sys.intern(token_string.lower())
+
+    @property
+    def type(self):  # From `type_name`, None if the token isn't typed
+        if self.type_name is None: return None
+        return get_type_from_name(self.type_name)
+
+    def get_type(self): return get_token_type(self.token_string)
 
     def __str__(self):
         return f"Token: '{self.token_string}', {self.token_type}"
 
-    def verify(self, presumed_type:str, presumed_string:str):
-        return self.verify_type(presumed_type) and presumed_string.lower() == self.token_string.lower()
+    def verify(self, presumed_type:str, presumed_string:str):  # `presumed_string` must be in lowercase
+        return self.token_type == presumed_type and self.key == presumed_string
 
     def verify_type(self, presumed_type:str):
-        return presumed_type.lower() == self.token_type.lower()
+        return self.token_type == presumed_type
 
 class Block():
+    __slots__ = ("kind", "parent", "start_token", "elements", "type_name", "size", "line", "end_line")
+
     def __init__(self, kind:str, parent:any=None, start_token:Token=None):
         self.kind = kind
         self.parent:Block = parent
         self.start_token:Token = start_token
         self.elements:list[Token, Block] = []
+        self.type_name:str|None = None
+        self.size:int|None = None
+        self.line:int|None = None
+        self.end_line:int|None = None  # Line of the closing delimiter, None while the block isn't closed
+
+    @property
+    def type(self):  # From `type_name`, None if the block isn't typed
+        if self.type_name is None: return None
+        return get_type_from_name(self.type_name)
     
     def __str__(self):
         return f"Block: of kind '{self.kind}' from [{self.start_token}] with :\n{utils.dump(self.elements)}"
@@ -368,9 +391,95 @@ def verify_blocks_types(pairs:dict[Block, str]):
         if block.kind != kind: return False
     return True
 
+def pack_tree(segments:list[dict], blocks:list) -> tuple:
+    """
+    Flattens the parsed segments and blocks into tuples of plain values, who
+    can be stored with `marshal`. The nodes refer to each other by index, the
+    tokens from 0 and the blocks from -1.
+    """
+    tokens:list[Token] = []
+    all_blocks:list[Block] = []
+    indexes:dict[int, int] = {}
+
+    def ref(node) -> int|None:
+        if node is None: return None
+        index = indexes.get(id(node))
+        if index is None:
+            if isinstance(node, Token):
+                index = len(tokens)
+                tokens.append(node)
+            else:
+                index = -1 - len(all_blocks)
+                all_blocks.append(node)
+            indexes[id(node)] = index
+        return index
+
+    packed_segments = [(segment["line"], [ref(token) for token in segment["tokens"]]) for segment in segments]
+    packed_root = [ref(element) for element in blocks]
+    packed_tokens = []
+    packed_blocks = []
+    while len(packed_tokens) < len(tokens) or len(packed_blocks) < len(all_blocks):  # Packing a node can find new ones
+        while len(packed_tokens) < len(tokens):
+            token = tokens[len(packed_tokens)]
+            extras = None  # Most tokens only have the default values
+            if not (
+                token.type_name is None and token.options is None and not token.ptr_iter and token.array_stacks is None and
+                token.size is None and token.lenght is None and token.memory is None and not token.var
+            ):
+                extras = (
+                    token.type_name, ref(token.options), token.ptr_iter,
+                    None if token.array_stacks is None else [ref(stack) for stack in token.array_stacks],
+                    token.size, token.lenght, token.memory, token.var
+                )
+            packed_tokens.append((token.token_string, token.token_type, token.line, ref(token.parent_block), extras))
+        while len(packed_blocks) < len(all_blocks):
+            block = all_blocks[len(packed_blocks)]
+            packed_blocks.append((
+                block.kind, ref(block.parent), ref(block.start_token), [ref(element) for element in block.elements],
+                block.type_name, block.size, block.line, block.end_line
+            ))
+    return packed_segments, packed_root, packed_tokens, packed_blocks
+
+def unpack_tree(packed:tuple) -> tuple[list[dict], list]:
+    packed_segments, packed_root, packed_tokens, packed_blocks = packed
+    tokens = [Token.__new__(Token) for _ in packed_tokens]
+    blocks = [Block.__new__(Block) for _ in packed_blocks]
+    nodes = lambda indexes: [tokens[index] if index >= 0 else blocks[-1 - index] for index in indexes]
+
+    for token, (token_string, token_type, line, parent_block, extras) in zip(tokens, packed_tokens):
+        token._token_string = token_string
+        token.key = sys.intern(token_string.lower())
+        token.token_type = sys.intern(token_type)
+        token.line = line
+        token.parent_block = None if parent_block is None else blocks[-1 - parent_block]
+        if extras is None:
+            token.type_name = token.options = token.array_stacks = token.size = token.lenght = token.memory = None
+            token.ptr_iter = 0
+            token.var = False
+            continue
+        token.type_name, options, token.ptr_iter, array_stacks, token.size, token.lenght, token.memory, token.var = extras
+        token.options = None if options is None else blocks[-1 - options]
+        token.array_stacks = None if array_stacks is None else nodes(array_stacks)
+    for block, (kind, parent, start_token, elements, type_name, size, line, end_line) in zip(blocks, packed_blocks):
+        block.kind = kind
+        block.parent = None if parent is None else blocks[-1 - parent]
+        block.start_token = None if start_token is None else tokens[start_token]
+        block.elements = nodes(elements)
+        block.type_name = type_name
+        block.size = size
+        block.line = line
+        block.end_line = end_line
+
+    segments = [{"line": line, "tokens": nodes(indexes)} for line, indexes in packed_segments]
+    return segments, nodes(packed_root)
+
 def pres_token(tokens:list[Token], index:int) -> Token: return utils.get_item(tokens, index, Token("", "unknown"))
 
 def pres_block(blocks:list[Token], index:int) -> Block: return utils.get_item(blocks, index, Block(""))
 
-def get_type_from_token(token:Token) -> ir.Type:
-    return TYPES_WITH_LLTYPES[token.token_string]
\ No newline at end of file
+def get_type_from_name(type_name:str):
+    import lib.lltypes as lltypes
+    return lltypes.TYPES_WITH_LLTYPES[type_name]
+
+def get_type_from_token(token:Token):
+    return get_type_from_name(token.token_string)
\ No newline at end of file
@@ -0,0 +1,45 @@
+import llvmlite.ir as ir
+
+# Types, see `lang.TYPES` for their names
+UNSIGNED_8 = ir.IntType(8)
+UNSIGNED_16 = ir.IntType(16)
+UNSIGNED_24 = ir.IntType(24)
+UNSIGNED_32 = ir.IntType(32)
+UNSIGNED_64 = ir.IntType(64)
+UNSIGNED_128 = ir.IntType(128)
+UNSIGNED_256 = ir.IntType(256)
+FLOAT_32 = ir.FloatType()
+FLOAT_64 = ir.DoubleType()
+CHAR = ir.IntType(8)
+BOOLEAN = ir.IntType(1)
+VOID = ir.VoidType()
+VOID_PTR = ir.IntType(8).as_pointer()
+STRING = CHAR.as_pointer()
+
+TYPES_WITH_LLTYPES = {
+    "u8": UNSIGNED_8,
+    "u16": UNSIGNED_16,
+    "u24": UNSIGNED_24,
+    "u32": UNSIGNED_32,
+    "u64": UNSIGNED_64,
+    "u128": UNSIGNED_128,
+    "u256": UNSIGNED_256,
+    "f32": FLOAT_32,
+    "f64": FLOAT_64,
+    "chr": CHAR,
+    "bool": BOOLEAN,
+    "void": VOID,
+    "str": STRING,
+    "any": VOID_PTR,
+    # Aliases :
+    "int": UNSIGNED_32,
+    "dec": FLOAT_64,
+    "byte": UNSIGNED_8,
+    "big": UNSIGNED_256
+}
+
+# Constants
+
+TRUE = ir.Constant(BOOLEAN, 1)
+FALSE = ir.Constant(BOOLEAN, 0)
+NULL_PTR = ir.Constant(VOID_PTR, None)
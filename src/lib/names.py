@@ -1,5 +1,6 @@
 import llvmlite.ir as ir
 import lib.lang as lang
+import lib.frame as frame
 
 class Name():
     """
@@ -58,19 +59,18 @@ class Variable(Name):
         self.name = name
         self.names = {}
         self.type = type
-        self.var = ir.GlobalVariable(self.module, self.type.as_pointer(), f"var_{self.id}" if not self.is_root else self.name)
-        if init_value:
-            self.var.initializer = init_value
+        if isinstance(self.parent, Function):  # In the frame of its function
+            self.var = frame.get_locals_builder(self.parent.func).alloca(self.type, name=f"var_{self.id}")
         else:
-            self.var.initializer = ir.Constant(self.type.as_pointer(), None)
-        self.var.global_constant = constant
+            self.var = ir.GlobalVariable(self.module, self.type, f"var_{self.id}" if not self.is_root else self.name)
+            if init_value:
+                self.var.initializer = init_value
+            else:
+                self.var.initializer = ir.Constant(self.type, None)
+            self.var.global_constant = constant
     
     def get_value(self, builder:ir.IRBuilder, type:ir.Type=None):
-        if type is None: type = self.type
-        if builder.load(self.var).type != self.type.as_pointer():
-            return builder.load(builder.bitcast(builder.load(self.var), self.type.as_pointer()))
-        else:
-            return builder.load(builder.load(self.var))
+        return builder.load(self.var)
     
     def assign_value(self, builder:ir.IRBuilder, value:ir.Value):
         builder.store(value, self.var)
@@ -97,10 +97,8 @@ class Function(Name):
             try: builder = ir.IRBuilder(self.func.entry_basic_block)
             except: builder = ir.IRBuilder(self.func.append_basic_block("entry"))
             for arg in self.func.args:
-                arg_ptr = builder.alloca(arg.type)
-                builder.store(arg, arg_ptr)
                 argvar = self.append(arg.name.replace(".", "_"), Variable, arg.type)
-                argvar.assign_value(builder, arg_ptr)
+                argvar.assign_value(builder, arg)
 
 class Structure(Name):
     ...
\ No newline at end of file
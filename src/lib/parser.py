@@ -1,7 +1,7 @@
+from typing import Iterable, Iterator
 import lib.logger as logger
 import lib.utils as utils
 import lib.lang as lang
-import copy
 
 class Parser():
     class InvalidStringReference(BaseException): ...
@@ -10,127 +10,105 @@ class Parser():
 
     def __init__(self, pimo_instance):
         self.strings = {}
+        self.strings_count = 0
+        self.unclosed_string = False
         self.pimo_instance = pimo_instance
         self.logger:logger.Logger = self.pimo_instance.logger
         self.error_logger:logger.ErrorLogger = self.pimo_instance.error_logger
     
-    def genStringID(self, id:int):
-        r = lang.AMPERSAND
-        r += str(id)
-        if r in self.strings.keys():
-            r = self.genStringID()
-        return r
+    def genStringID(self) -> str:
+        self.strings_count += 1
+        return f"{lang.AMPERSAND}{self.strings_count}"
     
     def mkStringReference(self, string:str, id:str):
         self.strings[id] = string
 
-    def refAllStrings(self, exp:str):
-        ls = {
-            "string": ["\"", "'"],
-            "backslash": ["\\\\"],
-            "new_line": ["\\n"],
-            "tab": ["\\t"],
-            "db_quotes": ["\\\""],
-            "quote": ["\\'"],
-            "db_slash": [r"\s"],
-            "com_open": [r"\so"],
-            "com_close": [r"\sc"],
-            "semicolon": [r"\sm"]
-        }
-        for i in ls["backslash"]:
-            exp = exp.replace(i, "\\")
-        for k, h in {"new_line": "\n", "tab": "\t", "db_quotes": "š", "quote": "ž", "db_slash": "//", "com_open": "/*", "com_close": "*/", "semicolon": "sm"}.items():
-            for i in ls[k]:
-                exp = exp.replace(i, h)
-        string = False
-        buffer = ""
-        buffer2 = ""
-        current_sep = ""
-        strings = []
-        iid = 1
-        for char in [*exp]:
-            ex = char in ls["string"]
-            if current_sep != "":
-                ex = char == current_sep
-            if ex:
-                if string:
-                    current_sep = ""
-                    string = False
-                    id = self.genStringID(iid)
-                    buffer = buffer.replace("š", "\"").replace("ž", "\'")
-                    strings.append([buffer, id])
-                    buffer = ""
-                    buffer2 += id
-                    iid += 1
+    def refAllStrings(self, lines:Iterable[str]) -> Iterator[str]:
+        """
+        Decodes the escapes and replaces the strings by their reference ID, in
+        one pass over the lines given with their line breaks. Yields the lines
+        of code, the lines of a string spanning many of them are joined.
+        Unclosed strings are dropped, `unclosed_string` tells if the content
+        ended in one.
+        """
+        code = []
+        buffer = []
+        current_sep = None
+        for line in lines:
+            last_end = 0
+            for match in lang.STRINGS_REGEX.finditer(line):
+                active = code if current_sep is None else buffer
+                active.append(line[last_end:match.start()])
+                last_end = match.end()
+                quote = match.group("quote")
+                if quote is None:
+                    escaped = match.group("escaped")
+                    active.append(lang.ESCAPES[escaped] if escaped else "\\")
+                elif current_sep is None:
+                    current_sep = quote
+                elif quote == current_sep:
+                    string = "".join(buffer)
+                    for escaped_quote, quote in lang.ESCAPED_QUOTES.items():
+                        string = string.replace(escaped_quote, quote)
+                    id = self.genStringID()
+                    self.mkStringReference(string, id)
+                    code.append(f"{id} ")  # The space keeps the name chars after a string out of its ID
+                    buffer = []
+                    current_sep = None
                 else:
-                    string = True
-                    current_sep = char
+                    buffer.append(quote)
+            if current_sep is None:
+                code.append(line[last_end:])
+                yield from "".join(code).splitlines()
+                code = []
             else:
-                if string:
-                    buffer += char
-                else:
-                    buffer2 += char
-        for string_ in strings:
-            string = string_[0]
-            id = string_[1]
-            self.mkStringReference(string, id)
-        return buffer2
+                buffer.append(line[last_end:])
+        yield from "".join(code).splitlines()  # Before an unclosed string
+        self.unclosed_string = current_sep is not None
     
-    def getStringFromRefID(self, id:str):
-        for string_id, string in self.strings.items():
-            if id == string_id: return string
+    def getStringFromRefID(self, id:str): return self.strings.get(id)
     
     def raise_sourcecode_exception(self, line_content:str, line:int, column:int, exception:BaseException):
         self.pimo_instance.raise_exception(exception, f"Line {line}", line_content.strip(), f"{' ' * column}^")
     
+    def raise_part_exception(self, parts:list[str], index:int, line:int, exception:BaseException):
+        """
+        Shows the line rebuilt from its parts, with a caret under the part at `index`.
+        """
+        line_recreation_ = " ".join(parts)
+        line_recreation = utils.multi_replace(line_recreation_, {
+            "& ": "&"
+        })
+        lr_diff = len(line_recreation_) - len(line_recreation)
+        part_column = len(" ".join(parts[:index])) - lr_diff + 2
+        self.raise_sourcecode_exception(line_recreation, line, part_column, exception)
+
     def raise_exception(self, line:int, exception:BaseException, *args):
         self.pimo_instance.raise_exception(exception, f"Line {line}", *args)
 
-    def parse(self, content:str):
+    def parse(self, content:str|Iterable[str], first_line:int=1):
+        """
+        Lexes a text, or its lines with their line breaks.
+        """
         segments = []
+        if isinstance(content, str): content = content.splitlines(keepends=True)
 
-        content = self.refAllStrings(content)
-
-        lines = content.splitlines()
-
+        lines = self.pimo_instance.tracer.timed(self.refAllStrings(content), "Parser.refAllStrings")
         for line_index, line in enumerate(lines):
-            line.replace("\t", "")
-            segments.append({"line": line_index + 1, "tokens": [], "parts": []})
-            parts = segments[-1]["parts"]
-            for char in line:
-                if char in lang.NM_CHARS:
-                    if not len(parts):
-                        parts.append("")
-                        
-                    parts[-1] += char
-                elif char == lang.SPACE:
-                    parts.append("")
-                else:
-                    parts.append(char)
-                    parts.append("")
-            
-            while "" in parts:
-                try: parts.remove("")
-                except: pass
+            line_nb = line_index + first_line
+            tokens = []
+            segments.append({"line": line_nb, "tokens": tokens})
 
-            parts_to_skip = 0
-            line_recreation_ = " ".join(parts)
-            line_recreation = utils.multi_replace(line_recreation_, {
-                "& ": "&"
-            })
-            lr_diff = len(line_recreation_) - len(line_recreation)
-            for index, part in enumerate(parts):
-                if parts_to_skip:
-                    parts_to_skip -= 1
-                    continue
-                
-                part_column = len(" ".join(parts[:index])) - lr_diff + 2
+            parts = lang.PARTS_REGEX.findall(line)
+            parts_count = len(parts)
+            parts += ["", "", "", ""]  # For the lookahead
+
+            index = 0
+            while index < parts_count:
+                part, next_part, next_part_2, next_part_3, next_part_4 = parts[index:index + 5]
+                parts_to_skip = 0
 
                 token:lang.Token
-                next_part = utils.get_item_safe(parts, index + 1)
-                next_part_2 = utils.get_item_safe(parts, index + 2)
-                next_part_3 = utils.get_item_safe(parts, index + 3)
-                next_part_4 = utils.get_item_safe(parts, index + 4)
 
                 if part + next_part == lang.DOUBLE_SLASH:
                     break
@@ -140,13 +118,13 @@ class Parser():
                 elif part == lang.AMPERSAND and lang.is_an_integer(next_part):
                     string_id = str(int(next_part))
                     string = self.getStringFromRefID(lang.AMPERSAND + string_id)
-                    if not string:
-                        self.raise_sourcecode_exception(line_recreation, segments[-1]["line"], part_column, self.InvalidStringReference)
+                    if string is None:
+                        self.raise_part_exception(parts[:parts_count], index, line_nb, self.InvalidStringReference)
                     token = lang.Token(string, "string")
                     parts_to_skip = 1
                 elif lang.is_a_decimal(part + next_part + next_part_2) and next_part_3 == lang.COLON and lang.is_a_type(next_part_4):
                     token = lang.Token(part + next_part + next_part_2)
-                    token.type = lang.get_type_from_token(lang.Token(next_part_4, "type"))
+                    token.type_name = next_part_4
                     parts_to_skip = 4
                 elif lang.is_a_decimal(part + next_part + next_part_2):
                     token = lang.Token(part + next_part + next_part_2)
@@ -154,7 +132,7 @@ class Parser():
                 elif part == lang.PARAGRAPH and lang.is_a_valid_name(next_part):
                     macro_name = next_part
                     if not lang.is_an_upper_name(macro_name):
-                        self.raise_sourcecode_exception(line_recreation, segments[-1]["line"], part_column, self.NotUpperCaseMacroName)
+                        self.raise_part_exception(parts[:parts_count], index, line_nb, self.NotUpperCaseMacroName)
                     token = lang.Token(macro_name, "macro")
                     parts_to_skip = 1
                 elif part == lang.PERCENTAGE and lang.is_a_register(next_part):
@@ -180,7 +158,7 @@ class Parser():
                     lang.is_an_integer(part) or lang.is_a_valid_name(part) or lang.is_a_boolean(part) or part == lang.CLOSE_HOOK
                 ) and next_part == lang.COLON and lang.is_a_type(next_part_2):
                     token = lang.Token(part)
-                    token.type = lang.get_type_from_token(lang.Token(next_part_2, "type"))
+                    token.type_name = next_part_2
                     parts_to_skip = 2
                 elif part + next_part == lang.DOT_PERCENTAGE:
                     token = lang.Token(lang.DOT_PERCENTAGE, "operator")
@@ -202,10 +180,9 @@ class Parser():
                     parts_to_skip = 1
                 else:
                     token = lang.Token(part)
-                
-                segments[-1]["tokens"].append(token)
-            
-            segments[-1].pop("parts")
+
+                tokens.append(token)
+                index += 1 + parts_to_skip
 
         return segments
 
@@ -222,130 +199,131 @@ class Parser():
 
             if tokens[0].verify("operator", lang.HASHTAG): continue
 
-            for token_index, token in enumerate(tokens):
-                if token.verify("delimiter", lang.OPEN_HOOK):
-                    stack_block = lang.Block("stack", active_block, token)
-                    try: stack_block.size = token.size
-                    except: pass
-                    active_block.elements.append(stack_block)
-                    active_block = stack_block
-                    active_block.line = line_nb
-                elif token.verify("delimiter", lang.OPEN_CURLY_BRACE):
-                    segment_block = lang.Block("segment", active_block, token)
-                    active_block.elements.append(segment_block)
-                    active_block = segment_block
-                    active_block.line = line_nb
-                elif token.verify("delimiter", lang.OPEN_BRACKET):
-                    segment_block = lang.Block("options", active_block, token)
-                    active_block.elements.append(segment_block)
-                    active_block = segment_block
-                    active_block.line = line_nb
-                elif token.verify("delimiter", lang.CLOSE_HOOK):
-                    if active_block == root:
-                        self.raise_exception(line_nb, self.BlockDelimitation, "Can't close a non-existant block.")
-                    if active_block.kind != "stack":
-                        self.raise_exception(line_nb, self.BlockDelimitation, "Can't close a non-stack block.")
-                    
-                    try: active_block.type = token.type
-                    except: pass
-                    active_block = active_block.parent
-                elif token.verify("delimiter", lang.CLOSE_CURLY_BRACE):
-                    if active_block == root:
-                        self.raise_exception(line_nb, self.BlockDelimitation, "Can't close a non-existant block.")
-                    if active_block.kind != "segment":
-                        self.raise_exception(line_nb, self.BlockDelimitation, "Can't close a non-segment block.")
-                    
-                    active_block = active_block.parent
-                elif token.verify("delimiter", lang.CLOSE_BRACKET):
-                    if active_block == root:
-                        self.raise_exception(line_nb, self.BlockDelimitation, "Can't close a non-existant block.")
-                    if active_block.kind != "options":
-                        self.raise_exception(line_nb, self.BlockDelimitation, "Can't close a non-options block.")
-                    
-                    active_block = active_block.parent
-                else:
-                    token.line = line_nb
-                    token.parent_block = active_block
-                    active_block.elements.append(token)
+            active_block = self.parse_line_blocks(tokens, line_nb, active_block, root)
         
         return root.elements
-    
-    def parse_rest(self, blocks:lang.Block):
-        # Names
-        old_blocks = None
-        while old_blocks != blocks:
-            old_blocks = copy.copy(blocks)
-            for element_index, element in enumerate(blocks):
-                if lang.is_a_token(element):
-                    last_element = utils.get_item_safe(blocks, element_index - 1)
-                    if not lang.is_a_token(last_element): last_element = lang.Token("")
 
-                    next_element = utils.get_item_safe(blocks, element_index + 1)
-                    if not lang.is_a_token(next_element): next_element = lang.Token("")
+    def get_preprocessor_segments(self, segments:list[dict]) -> list[dict]:
+        """
+        Segments of the lines skipped by `parse_blocks`, the other tokens are
+        held by the blocks.
+        """
+        return [segment for segment in segments if segment["tokens"] and segment["tokens"][0].verify("operator", lang.HASHTAG)]
+
+    def parse_line_blocks(self, tokens:list[lang.Token], line_nb:int, active_block:lang.Block, root:lang.Block) -> lang.Block:
+        """
+        Adds the tokens of a line to the blocks of `root`, from the active block,
+        and returns the active block after them.
+        """
+        for token in tokens:
+            if token.verify("delimiter", lang.OPEN_HOOK):
+                stack_block = lang.Block("stack", active_block, token)
+                stack_block.size = token.size
+                active_block.elements.append(stack_block)
+                active_block = stack_block
+                active_block.line = line_nb
+            elif token.verify("delimiter", lang.OPEN_CURLY_BRACE):
+                segment_block = lang.Block("segment", active_block, token)
+                active_block.elements.append(segment_block)
+                active_block = segment_block
+                active_block.line = line_nb
+            elif token.verify("delimiter", lang.OPEN_BRACKET):
+                segment_block = lang.Block("options", active_block, token)
+                active_block.elements.append(segment_block)
+                active_block = segment_block
+                active_block.line = line_nb
+            elif token.verify("delimiter", lang.CLOSE_HOOK):
+                if active_block == root:
+                    self.raise_exception(line_nb, self.BlockDelimitation, "Can't close a non-existant block.")
+                if active_block.kind != "stack":
+                    self.raise_exception(line_nb, self.BlockDelimitation, "Can't close a non-stack block.")
+                
+                active_block.type_name = token.type_name
+                active_block.end_line = line_nb
+                active_block = active_block.parent
+            elif token.verify("delimiter", lang.CLOSE_CURLY_BRACE):
+                if active_block == root:
+                    self.raise_exception(line_nb, self.BlockDelimitation, "Can't close a non-existant block.")
+                if active_block.kind != "segment":
+                    self.raise_exception(line_nb, self.BlockDelimitation, "Can't close a non-segment block.")
+                
+                active_block.end_line = line_nb
+                active_block = active_block.parent
+            elif token.verify("delimiter", lang.CLOSE_BRACKET):
+                if active_block == root:
+                    self.raise_exception(line_nb, self.BlockDelimitation, "Can't close a non-existant block.")
+                if active_block.kind != "options":
+                    self.raise_exception(line_nb, self.BlockDelimitation, "Can't close a non-options block.")
+                
+                active_block.end_line = line_nb
+                active_block = active_block.parent
+            else:
+                token.line = line_nb
+                token.parent_block = active_block
+                active_block.elements.append(token)
+
+        return active_block
+    
+    def parse_rest(self, blocks:list) -> list:
+        """
+        Merges the names, the type suffixes and the options into their tokens,
+        in one forward pass building a new list. Children blocks are handled
+        first, once.
+        """
+        rest = []
+        for element in blocks:
+            last_element = rest[-1] if rest else None
+            last_token = last_element if lang.is_a_token(last_element) else lang.Token("")
 
-                    next_element_2 = utils.get_item_safe(blocks, element_index + 2)
-                    if not lang.is_a_token(next_element_2): next_element_2 = lang.Token("")
+            if not lang.is_a_token(element):
+                element.elements = self.parse_rest(element.elements)
 
-                    if last_element.verify("operator", lang.CARET) and element.verify("operator", lang.DOT) and next_element.verify_type("name"):
-                        next_element.token_string = f"^.{next_element.token_string}"
-                        blocks.remove(element)
-                        blocks.pop(element_index - 1)
-                    elif last_element.verify_type("name") and element.verify("operator", lang.DOT) and next_element.verify_type("name"):
-                        last_element.token_string += f".{next_element.token_string}"
-                        blocks.remove(element)
-                        blocks.pop(element_index - 1)
-                    elif last_element.verify_type("name") and element.verify("operator", lang.DOT) and next_element.verify("operator", lang.CARET):
-                        last_element.token_string += f".^"
-                        blocks.remove(element)
-                        blocks.pop(element_index - 1)
-                else:
-                    element.elements = self.parse_rest(element.elements)
-        
-        # Types
-        old_blocks = None
-        while old_blocks != blocks:
-            old_blocks = copy.copy(blocks)
-            for element_index, element in enumerate(blocks):
-                element:lang.Token
-                if lang.is_a_token(element):
-                    next_element = utils.get_item_safe(blocks, element_index + 1)
+                # Array dimensions
+                if (last_token.verify_type("type") or last_token.verify_type("name")) and lang.is_a_stack(element):
+                    if last_token.array_stacks is None: last_token.array_stacks = []
+                    last_token.array_stacks.append(element)
+                    continue
+                # Options, like function arguments
+                if last_token.verify_type("name") and lang.is_options(element) and last_token.options is None:
+                    last_token.options = element
+                    continue
 
-                    if (element.verify_type("type") or element.verify_type("name")) and lang.is_a_token(next_element) and next_element.verify("operator", lang.STAR):
-                        try: element.ptr_iter += 1
-                        except: element.ptr_iter = 1
-                        blocks.pop(element_index + 1)
-                    elif (element.verify_type("type") or element.verify_type("name")) and lang.is_a_stack(next_element):
-                        try: element.array_stacks.append(next_element)
-                        except: element.array_stacks = [next_element]
-                        blocks.pop(element_index + 1)
+                rest.append(element)
+                continue
 
-        # Others
-        for element_index, element in enumerate(blocks):
-            if lang.is_a_token(element):
-                last_element = utils.get_item_safe(blocks, element_index - 1)
-                if not lang.is_a_token(last_element): last_element = lang.Token("")
+            # Names, `^.name`, `name.name` and `name.^`
+            while len(rest) >= 2 and lang.is_a_token(rest[-2]) and lang.is_a_token(rest[-1]) and rest[-1].verify("operator", lang.DOT):
+                merged = rest[-2]
+                if merged.ptr_iter or merged.array_stacks is not None: break  # Not a name anymore
+                if merged.verify("operator", lang.CARET) and element.verify_type("name"):
+                    element.token_string = f"^.{element.token_string}"
+                elif merged.verify_type("name") and element.verify_type("name"):
+                    merged.token_string += f".{element.token_string}"
+                    element = merged
+                elif merged.verify_type("name") and element.verify("operator", lang.CARET):
+                    merged.token_string += ".^"
+                    element = merged
+                else: break
+                del rest[-2:]
+            last_element = rest[-1] if rest else None
+            last_token = last_element if lang.is_a_token(last_element) else lang.Token("")
 
-                next_element = utils.get_item_safe(blocks, element_index + 1)
-                next_element_1 = utils.get_item_safe(blocks, element_index + 1)
-                if not lang.is_a_token(next_element): next_element = lang.Token("")
+            # Pointers
+            if (last_token.verify_type("type") or last_token.verify_type("name")) and element.verify("operator", lang.STAR):
+                last_token.ptr_iter += 1
+                continue
+            # Types, `name : type` and `[...] : type`
+            if element.verify_type("type") and len(rest) >= 2 and last_token.verify("operator", lang.COLON):
+                typed_element = rest[-2]
+                if (lang.is_a_token(typed_element) and typed_element.verify_type("name")) or lang.is_a_stack(typed_element):
+                    typed_element.type_name = element.token_string
+                    rest.pop()
+                    continue
+            # Variadic functions, `func.`
+            if last_token.verify("instruction", "func") and element.verify("operator", lang.DOT):
+                last_token.var = True
+                continue
 
-                next_element_2 = utils.get_item_safe(blocks, element_index + 2)
-                if not lang.is_a_token(next_element_2): next_element_2 = lang.Token("")
+            rest.append(element)
 
-                if element.verify_type("name") and next_element.verify("operator", lang.COLON) and next_element_2.verify_type("type"):
-                    element.type = lang.get_type_from_token(next_element_2)
-                    blocks.pop(element_index + 1)
-                    blocks.pop(element_index + 2)
-                elif lang.is_a_stack(last_element) and element.verify("operator", lang.COLON) and next_element.verify_type("type"):
-                    element.type = lang.get_type_from_token(next_element)
-                    blocks.pop(element_index + 1)
-                elif element.verify_type("name") and lang.is_options(next_element_1):
-                    element.options = next_element_1
-                    blocks.pop(element_index + 1)
-                elif element.verify("instruction", "func") and next_element.verify("operator", lang.DOT):
-                    element.var = True
-                    blocks.pop(element_index + 1)
-            else:
-                element.elements = self.parse_rest(element.elements)
-        
-        return blocks
\ No newline at end of file
+        return rest
@@ -9,9 +9,8 @@ class Program():
     def __init__(self, sourcepath:str, sourcecode:sourcecode.SourceCode, id:str):
         self.sourcepath = sourcepath
         self.sourcecode = sourcecode
-        self.content = self.sourcecode.content
         self.relpath = os.path.relpath(self.sourcepath)
-        self.module = ir.Module(self.relpath)
+        self.module = ir.Module(self.relpath, context=ir.Context())  # Its own identified types
         self.id = id
         self.line = None
         self.ended = False
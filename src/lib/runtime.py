@@ -0,0 +1,52 @@
+import llvmlite.ir as ir
+import lib.lang as lang
+
+class StackRuntime():
+    """
+    Type and functions shared by the stacks of one kind in a module, see
+    `Stack.init_runtime`.
+    """
+    def __init__(self):
+        self.stack_type:ir.IdentifiedStructType|None = None
+        self.push_func:ir.Function|None = None
+        self.pop_func:ir.Function|None = None
+        self.destroy_func:ir.Function|None = None
+        self.unchecked_push_func:ir.Function|None = None
+        self.unchecked_pop_func:ir.Function|None = None
+
+class Runtime():
+    """
+    Declarations and functions shared by the stacks and the arenas of a
+    module, made at their first use. Each compiler has its own, so nothing
+    is kept between the compilations made in the same process.
+    """
+    def __init__(self, module:ir.Module):
+        self.module = module
+        self.malloc_func:ir.Function|None = None
+        self.realloc_func:ir.Function|None = None
+        self.free_func:ir.Function|None = None
+        self.trap_func:ir.Function|None = None
+        self.stacks:dict[str, StackRuntime] = {}  # By stack type name
+        self.arena_type:ir.IdentifiedStructType|None = None
+        self.alloc_func:ir.Function|None = None
+        self.release_func:ir.Function|None = None
+
+    def get_identified_type(self, name:str) -> ir.IdentifiedStructType:
+        return self.module.context.get_identified_type(name)  # The context of the module, not the global one
+
+    def get_stack_runtime(self, type_name:str) -> StackRuntime:
+        if type_name not in self.stacks: self.stacks[type_name] = StackRuntime()
+        return self.stacks[type_name]
+
+    def init_memory_functions(self):
+        if self.malloc_func is None:
+            malloc_func_type = ir.FunctionType(lang.VOID_PTR, [lang.UNSIGNED_64])
+            self.malloc_func = ir.Function(self.module, malloc_func_type, name="malloc")
+
+        if self.realloc_func is None:
+            realloc_func_type = ir.FunctionType(lang.VOID_PTR, [lang.VOID_PTR, lang.UNSIGNED_64])
+            self.realloc_func = ir.Function(self.module, realloc_func_type, name="realloc")
+
+        if self.free_func is None:
+            free_func_type = ir.FunctionType(ir.VoidType(), [lang.VOID_PTR])
+            self.free_func = ir.Function(self.module, free_func_type, name="free")
@@ -0,0 +1,130 @@
+import contextlib, io, json, os, signal, socket, socketserver, sys, tempfile, traceback
+import lib.logger as logger
+
+def get_default_socket_path() -> str:
+    return os.environ.get("PIMO_SOCKET", os.path.join(tempfile.gettempdir(), f"pimo-{os.getuid()}.sock"))
+
+def send_message(file, message:dict):
+    file.write(json.dumps(message).encode("utf-8") + b"\n")
+    file.flush()
+
+def receive_message(file) -> dict|None:
+    line = file.readline()
+    if not line: return None
+    return json.loads(line.decode("utf-8"))
+
+class Server(socketserver.UnixStreamServer):
+    """
+    Compile server keeping the compiler imported and LLVM initialized.
+
+    Requests are compiled one after the other, since a compilation changes the
+    working directory, the environment and the standard outputs of the process.
+    """
+
+    def __init__(self, main_class, socket_path:str=None):
+        import lib.backend as backend
+        import lib.compiler as compiler
+
+        self.main_class = main_class
+        self.compiler_module = compiler
+        self.socket_path = socket_path or get_default_socket_path()
+        self.logger = logger.Logger(True, False)
+        self.error_logger = logger.ErrorLogger(False)
+
+        backend.Backend.init_targets()
+
+        if os.path.exists(self.socket_path):
+            if Client.is_alive(self.socket_path):
+                self.error_logger.log(f"SocketAlreadyUsed: {self.socket_path}, a compile server is already running.", "error")
+                sys.exit(1)
+            os.remove(self.socket_path)
+
+        super().__init__(self.socket_path, ServerHandler)
+
+    def serve(self):
+        self.logger.log(f"Compile server listening on `{self.socket_path}`.", "info")
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit())
+        try: self.serve_forever()
+        except (KeyboardInterrupt, SystemExit): pass
+        finally:
+            self.server_close()
+            if os.path.exists(self.socket_path): os.remove(self.socket_path)
+            self.logger.log("Compile server stopped.", "info")
+
+    def compile(self, argv:list[str], cwd:str, env:dict[str, str]) -> tuple[int, str]:
+        """
+        Compiles in the working directory and the environment of the client,
+        so `PIMO_CACHE_DIR` or the `PATH` searched for clang are its own.
+        """
+        buffer = io.StringIO()
+        code = 0
+        old_cwd = os.getcwd()
+        old_env = dict(os.environ)
+        self.compiler_module.reset_global_state()
+        with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+            try:
+                os.chdir(cwd)
+                os.environ.clear()
+                os.environ.update(env)
+                instance = self.main_class(argv)
+                instance.start()
+                instance.end()
+            except SystemExit as e:
+                code = e.code or 0
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os.chdir(old_cwd)
+                os.environ.clear()
+                os.environ.update(old_env)
+        self.compiler_module.reset_global_state()
+        return code, buffer.getvalue()
+
+class ServerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = receive_message(self.rfile)
+        if request is None: return
+        if request.get("ping"):
+            send_message(self.wfile, {"pong": True})
+            return
+        code, output = self.server.compile(request["argv"], request["cwd"], request["env"])
+        self.server.logger.log(f"{' '.join(request['argv'])} -> {code}", "info")
+        send_message(self.wfile, {"code": code, "output": output})
+
+class Client():
+    """
+    Thin client sending the CLI arguments, the working directory and the
+    environment to a running compile server.
+    """
+
+    def __init__(self, argv:list[str], socket_path:str=None):
+        self.argv = argv
+        self.socket_path = socket_path or get_default_socket_path()
+        self.error_logger = logger.ErrorLogger(False)
+
+    @staticmethod
+    def is_alive(socket_path:str) -> bool:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(socket_path)
+                file = client.makefile("rwb")
+                send_message(file, {"ping": True})
+                return receive_message(file) is not None
+        except OSError: return False
+
+    def send(self) -> int:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(self.socket_path)
+                file = client.makefile("rwb")
+                send_message(file, {"argv": self.argv, "cwd": os.getcwd(), "env": dict(os.environ)})
+                response = receive_message(file)
+        except OSError as e:
+            self.error_logger.log(f"ServerUnreachable: {self.socket_path} ({e.strerror}), start it with `pimo serve`.", "error")
+            return 1
+        if response is None:
+            self.error_logger.log("ServerUnreachable: The compile server closed the connection.", "error")
+            return 1
+        print(response["output"], end="")
+        return response["code"]
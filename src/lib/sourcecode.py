@@ -1,3 +1,72 @@
+from typing import Iterator
+import array, mmap, os, re
+
 class SourceCode():
-    def __init__(self, content:str) -> None:
-        self.content = content
\ No newline at end of file
+    """
+    UTF-8 bytes of a source, between its first and last non-blank characters.
+    The file is mapped in memory and its lines are found through an index of
+    their offsets, each line is decoded when it's read so the whole text is
+    never decoded nor copied.
+    """
+
+    LINE_BREAKS_REGEX = re.compile(r"\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")  # Same breaks as `str.splitlines`
+    LINE_BREAKS_BYTES_REGEX = re.compile(rb"\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]")  # The same breaks, in UTF-8
+    BLANKS = tuple(character.encode("utf-8") for character in (
+        "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005"
+        "\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000"
+    ))  # Characters of `str.isspace`, in UTF-8
+    LEADING_BLANKS_REGEX = re.compile(b"(?:" + b"|".join(re.escape(blank) for blank in BLANKS) + b")*")
+
+    def __init__(self, data:bytes|mmap.mmap, start:int=0, end:int|None=None) -> None:
+        self.data = data
+        if end is None: end = len(data)
+        start = self.LEADING_BLANKS_REGEX.match(data, start, end).end()
+        while end > start:
+            blank = next((blank for blank in self.BLANKS if data[end - len(blank):end] == blank), None)
+            if blank is None: break
+            end -= len(blank)
+        self.start = start
+        self.end = end
+
+        # Offset of each line start, and of the end after the last line
+        self.line_offsets = array.array("q", [start])
+        self.line_offsets.extend(match.end() for match in self.LINE_BREAKS_BYTES_REGEX.finditer(data, start, end))
+        if end > start: self.line_offsets.append(end)  # The text is stripped, so it doesn't end with a break
+
+    @classmethod
+    def from_file(cls, path:str) -> "SourceCode":
+        """
+        Maps the file in memory, the mapping lives as long as the source.
+        """
+        with open(path, "rb") as file:
+            if not os.fstat(file.fileno()).st_size: return cls(b"")  # Empty files can't be mapped
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def get_content(self) -> memoryview:
+        """
+        Bytes of the text, read from the mapping without copying them.
+        """
+        return memoryview(self.data)[self.start:self.end]
+
+    def get_lines_count(self) -> int: return len(self.line_offsets) - 1
+
+    def decode(self, start:int, end:int) -> str: return str(self.data[start:end], "utf-8")
+
+    def get_line(self, line:int) -> str:
+        """
+        Line `line`, counted from 1, without its line break.
+        """
+        if not (1 <= line <= self.get_lines_count()): return ""
+        return self.LINE_BREAKS_REGEX.sub("", self.decode(self.line_offsets[line - 1], self.line_offsets[line]))
+
+    def get_lines(self) -> Iterator[str]:
+        """
+        Lines with their line breaks, the `\\r\\n` and `\\r` ones read as `\\n`
+        like when the file is opened in text mode.
+        """
+        offsets = self.line_offsets
+        for index in range(len(offsets) - 1):
+            line = self.decode(offsets[index], offsets[index + 1])
+            if line.endswith("\r"): line = line[:-1] + "\n"
+            elif line.endswith("\r\n"): line = line[:-2] + "\n"
+            yield line
@@ -1,57 +1,91 @@
 import llvmlite.ir as ir
 import lib.lang as lang
+import lib.frame as frame
+import lib.runtime as runtime
 
 class Stack():
-    malloc_func = None
-    free_func = None
-
-    def __init__(self, builder:ir.IRBuilder, size:int, id:str):
+    HEADER_SIZE = 16  # Top, size and pointer to the elements, who follow it until they grow
+    ELEMENT_SIZE = 8  # Pointers of 8 bytes at most
+    TYPE_NAME = "stacktype"
+    FUNCTIONS_PREFIX = "stack"
+    SLOT_TYPE = lang.VOID_PTR  # Pointers to the values
+    tracks_pushes = False  # If the pushes are followed at compile time, so they can't be in branches
+
+    def __init__(self, builder:ir.IRBuilder, size:int, id:str, runtime:runtime.Runtime, unchecked:bool=False, checked:bool=False, arena=None):
         self.size = size
         self.id = id
+        self.unchecked = unchecked  # Never more elements than its size nor popped when empty
+        self.checked = checked  # Traps instead of popping a null pointer
+        self.arena = arena  # Where it's allocated, else with `malloc`
         self.element_type = ir.ArrayType(lang.UNSIGNED_64, 2)
-        self.type = ir.global_context.get_identified_type(f"stacktype_{id}")
-        self.type.set_body(
-            ir.ArrayType(lang.VOID_PTR, self.size),
-            lang.UNSIGNED_32,  # Top
-            lang.UNSIGNED_32   # Size
-        )
         self.builder = builder
         self.block = self.builder.block
         self.module = self.block.module
+        self.runtime = runtime  # Shared by the stacks of the module
+        self.stack_runtime = self.runtime.get_stack_runtime(self.TYPE_NAME)  # `InlineStack` has its own
 
-        self.init_memory_functions()
+        self.runtime.init_memory_functions()
+        self.init_runtime()
 
-        self.push_function = self.define_push()
-        self.pop_function = self.define_pop()
-        self.destroy_function = self.define_destroy()
+        self.type = self.stack_type
+        self.push_function = self.stack_runtime.unchecked_push_func if self.unchecked else self.stack_runtime.push_func
+        self.pop_function = self.stack_runtime.unchecked_pop_func if self.unchecked else self.stack_runtime.pop_func
+        self.destroy_function = self.stack_runtime.destroy_func
 
-        size_in_bytes = ir.Constant(lang.UNSIGNED_64, self.size)
-        stack_void_ptr = self.builder.call(Stack.malloc_func, [size_in_bytes])
-        self.stack = self.builder.bitcast(stack_void_ptr, self.type.as_pointer(), f"stack_{self.id}")
+        # Only the header and the elements of this stack are made here, in one
+        # allocation. The elements are moved out of it when they grow.
+        size_in_bytes = ir.Constant(lang.UNSIGNED_64, Stack.HEADER_SIZE + self.size * Stack.ELEMENT_SIZE)
+        if self.arena is None: self.stack_void_ptr = self.builder.call(self.runtime.malloc_func, [size_in_bytes])
+        else: self.stack_void_ptr = self.arena.alloc(self.builder, size_in_bytes)
+        self.stack = self.builder.bitcast(self.stack_void_ptr, self.type.as_pointer(), f"stack_{self.id}")
 
         self.top_ptr = self.builder.gep(
             self.stack,
-            [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 1)],
+            [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 0)],
             name=f"stacktop_{id}"
         )
         self.builder.store(ir.Constant(lang.UNSIGNED_32, 0), self.top_ptr)
         
         self.size_ptr = self.builder.gep(
             self.stack,
-            [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 2)],
+            [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 1)],
             name=f"stacksize_{id}"
         )
         self.builder.store(ir.Constant(lang.UNSIGNED_32, self.size), self.size_ptr)
 
-        self.base_ptr = self.builder.gep(
+        self.elements_ptr = self.builder.gep(
             self.stack,
-            [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 0)],
-            name=f"stackbase_{self.id}"
+            [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 2)],
+            name=f"stackelements_{self.id}"
         )
+        elements = self.builder.gep(self.stack_void_ptr, [ir.Constant(lang.UNSIGNED_32, Stack.HEADER_SIZE)])
+        self.builder.store(self.builder.bitcast(elements, self.SLOT_TYPE.as_pointer()), self.elements_ptr)
+
+    def init_runtime(self):
+        """
+        Defines the stack type and its functions once per module, the size of
+        a stack is in its header. A full stack doubles its size when pushed.
+        """
+        stack_runtime = self.stack_runtime
+        if stack_runtime.stack_type is None:
+            stack_runtime.stack_type = self.runtime.get_identified_type(self.TYPE_NAME)
+            stack_runtime.stack_type.set_body(
+                lang.UNSIGNED_32,  # Top
+                lang.UNSIGNED_32,  # Size
+                self.SLOT_TYPE.as_pointer()  # Elements, as many as the size
+            )
+        self.stack_type = stack_runtime.stack_type
+        if stack_runtime.push_func is None:
+            stack_runtime.push_func = self.define_push()
+            stack_runtime.pop_func = self.define_pop()
+            stack_runtime.destroy_func = self.define_destroy()
+        if self.unchecked and stack_runtime.unchecked_push_func is None:
+            stack_runtime.unchecked_push_func = self.define_unchecked_push()
+            stack_runtime.unchecked_pop_func = self.define_unchecked_pop()
     
     def push(self, value:ir.Value):
         if not value.type.is_pointer:
-            alloca = self.builder.alloca(value.type)
+            alloca = frame.alloca(self.builder, value.type)
             self.builder.store(value, alloca)
             value = alloca
         cast_value = self.builder.bitcast(value, lang.VOID_PTR)
@@ -61,7 +95,7 @@ class Stack():
         self.push(self.top_ptr)
 
     def push_base_ptr(self):  # TODO: Fix
-        self.push(self.base_ptr)
+        self.push(self.builder.load(self.elements_ptr))
     
     def push_size(self):
         self.push(self.builder.load(self.size_ptr))
@@ -72,95 +106,346 @@ class Stack():
     def pop_val(self):
         return self.builder.load(self.pop())
 
+    def pop_as(self, value_type:ir.Type) -> ir.Value:
+        return self.builder.load(self.builder.bitcast(self.pop(), value_type.as_pointer()))
+
+    def destroy(self):
+        self.builder.call(self.destroy_function, [self.stack])  # Frees the elements if they grew
+        if self.arena is None: self.builder.call(self.runtime.free_func, [self.stack_void_ptr])
+        else: self.arena.release(self.builder, self.stack_void_ptr)
+
     def define_push(self):
-        push_func_type = ir.FunctionType(ir.VoidType(), [self.type.as_pointer(), lang.VOID_PTR])
-        push_func = ir.Function(self.module, push_func_type, name=f"push_{self.id}")
+        push_func_type = ir.FunctionType(ir.VoidType(), [self.stack_type.as_pointer(), self.SLOT_TYPE])
+        push_func = ir.Function(self.module, push_func_type, name=f"{self.FUNCTIONS_PREFIX}_push")
 
         push_block = push_func.append_basic_block(name="entry")
         push_builder = ir.IRBuilder(push_block)
 
         stack_ptr, value_ptr = push_func.args
 
-        top_ptr = push_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 1)], name="top_ptr")
-        size_ptr = push_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 2)], name="size_ptr")
+        top_ptr = push_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 0)], name="top_ptr")
+        size_ptr = push_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 1)], name="size_ptr")
+        elements_ptr = push_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 2)], name="elements_ptr")
 
         top = push_builder.load(top_ptr, name="top")
         size = push_builder.load(size_ptr, name="size")
 
         is_full = push_builder.icmp_unsigned("==", top, size, name="is_full")
-        with push_builder.if_else(is_full) as (then, otherwise):
-            with then:
-                push_builder.ret_void()
-
-            with otherwise:
-                element_ptr = push_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 0), top], name="element_ptr")
-                element_ptr = push_builder.bitcast(element_ptr, lang.VOID_PTR.as_pointer(), name="cast_element_ptr")
-
-                push_builder.store(value_ptr, element_ptr)
-
-                new_top = push_builder.add(top, ir.Constant(lang.UNSIGNED_32, 1), name="new_top")
-                push_builder.store(new_top, top_ptr)
+        with push_builder.if_then(is_full):
+            is_empty = push_builder.icmp_unsigned("==", size, ir.Constant(lang.UNSIGNED_32, 0), name="is_empty")
+            doubled_size = push_builder.shl(size, ir.Constant(lang.UNSIGNED_32, 1), name="doubled_size")
+            new_size = push_builder.select(is_empty, ir.Constant(lang.UNSIGNED_32, 1), doubled_size, name="new_size")
+
+            new_size_in_bytes = push_builder.mul(
+                push_builder.zext(new_size, lang.UNSIGNED_64),
+                ir.Constant(lang.UNSIGNED_64, Stack.ELEMENT_SIZE),
+                name="new_size_in_bytes"
+            )
+            elements = push_builder.bitcast(push_builder.load(elements_ptr), lang.VOID_PTR)
+            is_inline = push_builder.icmp_unsigned("==", elements, self.get_inline_elements(push_builder, stack_ptr), name="is_inline")
+            with push_builder.if_else(is_inline) as (then, otherwise):
+                with then:
+                    # The elements are still after the header, they are copied out of it
+                    moved_elements = push_builder.call(self.runtime.malloc_func, [new_size_in_bytes], name="moved_elements")
+                    size_in_bytes = push_builder.mul(push_builder.zext(size, lang.UNSIGNED_64), ir.Constant(lang.UNSIGNED_64, Stack.ELEMENT_SIZE))
+                    memcpy = self.module.declare_intrinsic("llvm.memcpy", [lang.VOID_PTR, lang.VOID_PTR, lang.UNSIGNED_64])
+                    push_builder.call(memcpy, [moved_elements, elements, size_in_bytes, ir.Constant(ir.IntType(1), 0)])
+                    moved_block = push_builder.block
+
+                with otherwise:
+                    reallocated_elements = push_builder.call(self.runtime.realloc_func, [elements, new_size_in_bytes], name="reallocated_elements")
+                    reallocated_block = push_builder.block
+
+            new_elements = push_builder.phi(lang.VOID_PTR, name="new_elements")
+            new_elements.add_incoming(moved_elements, moved_block)
+            new_elements.add_incoming(reallocated_elements, reallocated_block)
+            if self.checked:
+                is_null = push_builder.icmp_unsigned("==", new_elements, lang.NULL_PTR, name="is_null")
+                with push_builder.if_then(is_null): self.call_trap(push_builder, "Out of memory for a stack.")
+
+            push_builder.store(push_builder.bitcast(new_elements, self.SLOT_TYPE.as_pointer()), elements_ptr)
+            push_builder.store(new_size, size_ptr)
+
+        elements = push_builder.load(elements_ptr, name="elements")
+        element_ptr = push_builder.gep(elements, [top], name="element_ptr")
+
+        push_builder.store(value_ptr, element_ptr)
+
+        new_top = push_builder.add(top, ir.Constant(lang.UNSIGNED_32, 1), name="new_top")
+        push_builder.store(new_top, top_ptr)
 
         push_builder.ret_void()
 
         return push_func
 
     def define_pop(self):
-        pop_func_type = ir.FunctionType(lang.VOID_PTR, [self.type.as_pointer()])
-        pop_func = ir.Function(self.module, pop_func_type, name=f"pop_{self.id}")
+        pop_func_type = ir.FunctionType(self.SLOT_TYPE, [self.stack_type.as_pointer()])
+        pop_func = ir.Function(self.module, pop_func_type, name=f"{self.FUNCTIONS_PREFIX}_pop")
 
         pop_block = pop_func.append_basic_block(name="entry")
         pop_builder = ir.IRBuilder(pop_block)
 
         stack_ptr = pop_func.args[0]
 
-        top_ptr = pop_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 1)], name="top_ptr")
+        top_ptr = pop_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 0)], name="top_ptr")
         top = pop_builder.load(top_ptr, name="top")
 
         is_empty = pop_builder.icmp_unsigned("==", top, ir.Constant(lang.UNSIGNED_32, 0), name="is_empty")
         with pop_builder.if_else(is_empty) as (then, otherwise):
             with then:
-                pop_builder.ret(lang.NULL_PTR)
+                if self.checked: self.call_trap(pop_builder, "Pop from an empty stack.")
+                else: pop_builder.ret(ir.Constant(self.SLOT_TYPE, None))  # A null pointer in `Stack`
 
             with otherwise:
                 new_top = pop_builder.sub(top, ir.Constant(lang.UNSIGNED_32, 1), name="new_top")
                 pop_builder.store(new_top, top_ptr)
 
-                element_ptr = pop_builder.gep(
-                    stack_ptr,
-                    [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 0), new_top],
-                    name="element_ptr"
-                )
+                elements_ptr = pop_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 2)], name="elements_ptr")
+                elements = pop_builder.load(elements_ptr, name="elements")
+                element_ptr = pop_builder.gep(elements, [new_top], name="element_ptr")
 
                 element_ptr = pop_builder.load(element_ptr)
 
                 pop_builder.ret(element_ptr)
         
-        pop_builder.ret(lang.NULL_PTR)
+        pop_builder.ret(ir.Constant(self.SLOT_TYPE, None))
 
         return pop_func
 
-    def init_memory_functions(self):
-        if Stack.malloc_func is None:
-            malloc_func_type = ir.FunctionType(lang.VOID_PTR, [lang.UNSIGNED_64])
-            Stack.malloc_func = ir.Function(self.module, malloc_func_type, name="malloc")
+    def define_unchecked_push(self):
+        """
+        Push without growing the stack, for the stacks who never hold more
+        elements than their size. It's inlined.
+        """
+        push_func_type = ir.FunctionType(ir.VoidType(), [self.stack_type.as_pointer(), self.SLOT_TYPE])
+        push_func = ir.Function(self.module, push_func_type, name=f"{self.FUNCTIONS_PREFIX}_push_unchecked")
+        push_func.attributes.add("alwaysinline")
+
+        push_block = push_func.append_basic_block(name="entry")
+        push_builder = ir.IRBuilder(push_block)
+
+        stack_ptr, value_ptr = push_func.args
 
-        if Stack.free_func is None:
-            free_func_type = ir.FunctionType(ir.VoidType(), [lang.VOID_PTR])
-            Stack.free_func = ir.Function(self.module, free_func_type, name="free")
+        top_ptr = push_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 0)], name="top_ptr")
+        elements_ptr = push_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 2)], name="elements_ptr")
+
+        top = push_builder.load(top_ptr, name="top")
+        elements = push_builder.load(elements_ptr, name="elements")
+        element_ptr = push_builder.gep(elements, [top], name="element_ptr")
+
+        push_builder.store(value_ptr, element_ptr)
+
+        new_top = push_builder.add(top, ir.Constant(lang.UNSIGNED_32, 1), name="new_top")
+        push_builder.store(new_top, top_ptr)
+
+        push_builder.ret_void()
+
+        return push_func
+
+    def define_unchecked_pop(self):
+        """
+        Pop without checking if the stack is empty, for the stacks who are
+        never popped when empty. It's inlined.
+        """
+        pop_func_type = ir.FunctionType(self.SLOT_TYPE, [self.stack_type.as_pointer()])
+        pop_func = ir.Function(self.module, pop_func_type, name=f"{self.FUNCTIONS_PREFIX}_pop_unchecked")
+        pop_func.attributes.add("alwaysinline")
+
+        pop_block = pop_func.append_basic_block(name="entry")
+        pop_builder = ir.IRBuilder(pop_block)
+
+        stack_ptr = pop_func.args[0]
+
+        top_ptr = pop_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 0)], name="top_ptr")
+        top = pop_builder.load(top_ptr, name="top")
+
+        new_top = pop_builder.sub(top, ir.Constant(lang.UNSIGNED_32, 1), name="new_top")
+        pop_builder.store(new_top, top_ptr)
+
+        elements_ptr = pop_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 2)], name="elements_ptr")
+        elements = pop_builder.load(elements_ptr, name="elements")
+        element_ptr = pop_builder.gep(elements, [new_top], name="element_ptr")
+
+        pop_builder.ret(pop_builder.load(element_ptr))
+
+        return pop_func
+
+    def call_trap(self, builder:ir.IRBuilder, message:str):
+        """
+        Prints the message and aborts, the trap function is defined once per
+        module.
+        """
+        if self.runtime.trap_func is None: self.runtime.trap_func = self.define_trap()
+        data = bytearray(message.encode("utf-8") + b"\0")
+        message_type = ir.ArrayType(lang.UNSIGNED_8, len(data))
+        message_global = ir.GlobalVariable(self.module, message_type, name=self.module.get_unique_name("stack_trap_message"))
+        message_global.global_constant = True
+        message_global.linkage = "private"
+        message_global.initializer = ir.Constant(message_type, data)
+        builder.call(self.runtime.trap_func, [builder.bitcast(message_global, lang.VOID_PTR)])
+        builder.unreachable()
+
+    def define_trap(self):
+        puts_func = ir.Function(self.module, ir.FunctionType(lang.UNSIGNED_32, [lang.VOID_PTR]), name="puts")
+        fflush_func = ir.Function(self.module, ir.FunctionType(lang.UNSIGNED_32, [lang.VOID_PTR]), name="fflush")
+        abort_func = ir.Function(self.module, ir.FunctionType(ir.VoidType(), []), name="abort")
+
+        trap_func_type = ir.FunctionType(ir.VoidType(), [lang.VOID_PTR])
+        trap_func = ir.Function(self.module, trap_func_type, name="stack_trap")
+        trap_func.attributes.add("noreturn")
+
+        trap_block = trap_func.append_basic_block(name="entry")
+        trap_builder = ir.IRBuilder(trap_block)
+
+        trap_builder.call(puts_func, [trap_func.args[0]])
+        trap_builder.call(fflush_func, [lang.NULL_PTR])  # The message is printed before aborting
+        trap_builder.call(abort_func, [])
+        trap_builder.unreachable()
+
+        return trap_func
+
+    def get_inline_elements(self, builder:ir.IRBuilder, stack_ptr:ir.Value) -> ir.Value:
+        """
+        Pointer to the elements allocated after the header.
+        """
+        stack_void_ptr = builder.bitcast(stack_ptr, lang.VOID_PTR)
+        return builder.gep(stack_void_ptr, [ir.Constant(lang.UNSIGNED_32, Stack.HEADER_SIZE)], name="inline_elements")
 
     def define_destroy(self):
-        destroy_func_type = ir.FunctionType(ir.VoidType(), [self.type.as_pointer()])
-        destroy_func = ir.Function(self.module, destroy_func_type, name=f"destroy_{self.id}")
+        destroy_func_type = ir.FunctionType(ir.VoidType(), [self.stack_type.as_pointer()])
+        destroy_func = ir.Function(self.module, destroy_func_type, name=f"{self.FUNCTIONS_PREFIX}_destroy")
 
         destroy_block = destroy_func.append_basic_block(name="entry")
         destroy_builder = ir.IRBuilder(destroy_block)
 
         stack_ptr = destroy_func.args[0]
-        stack_void_ptr = destroy_builder.bitcast(stack_ptr, lang.VOID_PTR)
+        elements_ptr = destroy_builder.gep(stack_ptr, [ir.Constant(lang.UNSIGNED_32, 0), ir.Constant(lang.UNSIGNED_32, 2)], name="elements_ptr")
+        elements_void_ptr = destroy_builder.bitcast(destroy_builder.load(elements_ptr), lang.VOID_PTR)
 
-        destroy_builder.call(Stack.free_func, [stack_void_ptr])
+        # The header is freed by `destroy`, with its arena if it has one
+        grew = destroy_builder.icmp_unsigned("!=", elements_void_ptr, self.get_inline_elements(destroy_builder, stack_ptr), name="grew")
+        with destroy_builder.if_then(grew):
+            destroy_builder.call(self.runtime.free_func, [elements_void_ptr])
 
         destroy_builder.ret_void()
 
-        return destroy_func
\ No newline at end of file
+        return destroy_func
+
+class InlineStack(Stack):
+    """
+    A `Stack` whose elements are 64 bits slots. The integers and floats of 64
+    bits at most are stored in their slot, the other values are pushed as
+    pointers like in `Stack`. Which slots hold a pointer is followed at compile
+    time, so `pop_val` reads the first byte of the value either way.
+    """
+    TYPE_NAME = "stacktype_inline"
+    FUNCTIONS_PREFIX = "stack_inline"
+    SLOT_TYPE = lang.UNSIGNED_64
+    tracks_pushes = True
+
+    def __init__(self, builder:ir.IRBuilder, size:int, id:str, runtime:runtime.Runtime, unchecked:bool=False, checked:bool=False, arena=None):
+        super().__init__(builder, size, id, runtime, unchecked, checked, arena)
+        self.inline_slots:list[bool] = []  # If each slot holds its value, from the bottom
+
+    def is_inlined(self, value_type:ir.Type) -> bool:
+        if isinstance(value_type, ir.IntType): return value_type.width <= 64
+        return isinstance(value_type, (ir.FloatType, ir.DoubleType))
+
+    def push(self, value:ir.Value):
+        inline = self.is_inlined(value.type)
+        if inline:
+            # The first bytes of the slot are the bytes of the value
+            if not isinstance(value.type, ir.IntType):
+                value = self.builder.bitcast(value, ir.IntType(32 if isinstance(value.type, ir.FloatType) else 64))
+            if value.type.width < 64: value = self.builder.zext(value, self.SLOT_TYPE)
+        else:
+            if not value.type.is_pointer:
+                alloca = frame.alloca(self.builder, value.type)
+                self.builder.store(value, alloca)
+                value = alloca
+            value = self.builder.ptrtoint(value, self.SLOT_TYPE)
+        self.inline_slots.append(inline)
+        return self.builder.call(self.push_function, [self.stack, value])
+
+    def pop_slot(self) -> tuple[ir.Value, bool]:
+        inline = self.inline_slots.pop() if self.inline_slots else False  # Empty, a null pointer like in `Stack`
+        return self.builder.call(self.pop_function, [self.stack]), inline
+
+    def get_pointer(self, slot:ir.Value, inline:bool, value_type:ir.Type) -> ir.Value:
+        """
+        Pointer to the value of a slot, an inlined value is copied out of the
+        stack to outlive its slot.
+        """
+        if inline:
+            alloca = frame.alloca(self.builder, self.SLOT_TYPE)
+            self.builder.store(slot, alloca)
+            return self.builder.bitcast(alloca, value_type.as_pointer())
+        return self.builder.inttoptr(slot, value_type.as_pointer())
+
+    def pop(self):
+        return self.get_pointer(*self.pop_slot(), lang.UNSIGNED_8)
+
+    def pop_val(self):
+        return self.pop_as(lang.UNSIGNED_8)
+
+    def pop_as(self, value_type:ir.Type) -> ir.Value:
+        slot, inline = self.pop_slot()
+        if inline and isinstance(value_type, ir.IntType):
+            if value_type.width < 64: return self.builder.trunc(slot, value_type)
+            if value_type.width > 64: return self.builder.zext(slot, value_type)  # The bytes after the slot are undefined
+            return slot
+        if inline and isinstance(value_type, ir.FloatType):
+            return self.builder.bitcast(self.builder.trunc(slot, lang.UNSIGNED_32), value_type)
+        if inline and isinstance(value_type, ir.DoubleType):
+            return self.builder.bitcast(slot, value_type)
+        return self.builder.load(self.get_pointer(slot, inline, value_type))
+
+class StaticStack():
+    """
+    A stack simulated at compile time, with the same operations as `Stack`.
+    It holds the pushed values and the operations become SSA values, so
+    nothing is allocated at runtime. The values are read like in a `Stack`,
+    `pop_val` reads their first byte and `pop_as` their first bytes.
+    It can't give the top or base pointer, nor pop more than it holds.
+    """
+    tracks_pushes = True
+
+    def __init__(self, builder:ir.IRBuilder, size:int):
+        self.size = size
+        self.builder = builder
+        self.values:list[ir.Value] = []
+
+    def push(self, value:ir.Value):
+        if len(self.values) == self.size: self.size = max(self.size * 2, 1)  # Grows like a `Stack`
+        self.values.append(value)
+
+    def push_size(self):
+        self.push(ir.Constant(lang.UNSIGNED_32, self.size))
+
+    def get_pointer(self, value:ir.Value) -> ir.Value:
+        """
+        Pointer to the memory holding the value, the pointers are pushed as is.
+        """
+        if not value.type.is_pointer:
+            alloca = frame.alloca(self.builder, value.type)
+            self.builder.store(value, alloca)
+            value = alloca
+        return self.builder.bitcast(value, lang.VOID_PTR)
+
+    def pop(self):
+        return self.get_pointer(self.values.pop())
+
+    def pop_val(self):
+        return self.pop_as(lang.UNSIGNED_8)
+
+    def pop_as(self, value_type:ir.Type) -> ir.Value:
+        value = self.values.pop()
+        if not value.type.is_pointer:
+            if value.type == value_type: return value
+            if isinstance(value.type, (ir.FloatType, ir.DoubleType)) and isinstance(value_type, ir.IntType):
+                value = self.builder.bitcast(value, ir.IntType(32 if isinstance(value.type, ir.FloatType) else 64))
+            if isinstance(value.type, ir.IntType) and isinstance(value_type, ir.IntType):
+                # The first bytes are the lowest ones, the bytes after a smaller value are undefined
+                if value.type.width > value_type.width: return self.builder.trunc(value, value_type)
+                return self.builder.zext(value, value_type)
+        return self.builder.load(self.builder.bitcast(self.get_pointer(value), value_type.as_pointer()))
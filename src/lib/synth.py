@@ -0,0 +1,101 @@
+def indent(lines:list[str], level:int=1) -> list[str]: return [f"{'    ' * level}{line}" for line in lines]
+
+def gen_functions(size:int) -> str:
+    """
+    `size` small functions, each one calling the previous one.
+    """
+    lines = []
+    for index in range(size):
+        lines.append(f"func byte func_{index}(byte a) {{")
+        if index:
+            lines.append(f"    byte b = ^.func_{index - 1}([a {index % 256} +]);")
+        else:
+            lines.append(f"    byte b = [a 1 +];")
+        lines.append("    return b;")
+        lines.append("};")
+        lines.append("")
+    lines.append("func byte main() {")
+    lines.append(f"    return ^.func_{size - 1}(0);")
+    lines.append("};")
+    return "\n".join(lines)
+
+def gen_nested(size:int) -> str:
+    """
+    `if`/`elif`/`else` and `while` nested `size` times.
+    """
+    body = ["r = [r 1 +];"]
+    for level in range(size, 0, -1):
+        value = level % 256
+        if level % 3 == 0:
+            body = [
+                f"if [r {value} ==] {{", *indent(body), "} elif [r 1 ==] {", "    r = 2;", "} else {", "    r = 3;", "};"
+            ]
+        elif level % 3 == 1:
+            body = [f"while [r {value} ==] {{", *indent(body), "    r = [r 1 +];", "};"]
+        else:
+            body = [f"if [r {value} !=] {{", *indent(body), "};"]
+    lines = [
+        "func byte main() {",
+        "    byte r = 0;",
+        *indent(body),
+        "    return r;",
+        "};"
+    ]
+    return "\n".join(lines)
+
+def gen_stack_literal(size:int) -> str:
+    """
+    One stack literal of `size` values, on a single line.
+    """
+    elements = ["1"]
+    for index in range(1, size):
+        elements.append(f"{index % 256} +")
+    lines = [
+        "func byte main() {",
+        f"    byte r = [{' '.join(elements)}];",
+        "    return r;",
+        "};"
+    ]
+    return "\n".join(lines)
+
+def gen_strings(size:int, per_function:int=100) -> str:
+    """
+    `size` string literals, spread over functions of `per_function` literals.
+    """
+    lines = []
+    functions = 0
+    for index in range(size):
+        if index % per_function == 0:
+            if index: lines.extend(["    return;", "};", ""])
+            lines.append(f"proc strings_{functions} {{")
+            functions += 1
+        lines.append(f"    str s_{index} = \"String number {index}, with \\\"escapes\\\"\\n\";")
+    if size: lines.extend(["    return;", "};", ""])
+    lines.append("func byte main() {")
+    lines.extend(f"    ^.strings_{index}();" for index in range(functions))
+    lines.append("    return 0;")
+    lines.append("};")
+    return "\n".join(lines)
+
+def gen_macros(size:int) -> str:
+    """
+    `size` macros, each one used twice.
+    """
+    lines = [f"#define VALUE_{index} {index % 256}" for index in range(size)]
+    lines.append("#define KIND byte")
+    lines.append("")
+    lines.append("func byte main() {")
+    for index in range(size):
+        lines.append(f"    §KIND v_{index} = §VALUE_{index};")
+        lines.append(f"    v_{index} = [v_{index} §VALUE_{index} +];")
+    lines.append("    return 0;")
+    lines.append("};")
+    return "\n".join(lines)
+
+SCENARIOS = {  # Name: (generator, default sizes)
+    "functions": (gen_functions, [100, 1000, 2000]),
+    "nested": (gen_nested, [10, 50, 100]),
+    "stack": (gen_stack_literal, [100, 1000, 4000]),
+    "strings": (gen_strings, [100, 1000, 5000]),
+    "macros": (gen_macros, [100, 500, 1000])
+}
@@ -0,0 +1,75 @@
+import contextlib, json, os, threading, time
+from typing import Iterable, Iterator
+
+class Tracer():
+    """
+    Records the compile phases as trace events, in the Chrome trace event
+    format read by `chrome://tracing` and Perfetto.
+    """
+
+    def __init__(self, enabled:bool, process_name:str=None):
+        self.enabled = enabled
+        self.events:list[dict] = []
+        self.open_spans:list[tuple[str, str]] = []  # Names and categories, the innermost last
+        if self.enabled and process_name:
+            self.events.append({"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": process_name}})
+
+    def get_timestamp(self) -> float: return time.time_ns() / 1000  # Microseconds, comparable between processes
+
+    def make_event(self, name:str, phase:str, category:str, args:dict=None) -> dict:
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": phase,
+            "ts": self.get_timestamp(),
+            "pid": os.getpid(),
+            "tid": threading.get_ident()
+        }
+        if args: event["args"] = args
+        return event
+
+    def begin(self, name:str, category:str="compile", **args):
+        if self.enabled:
+            self.events.append(self.make_event(name, "B", category, args))
+            self.open_spans.append((name, category))
+
+    def end(self, name:str, category:str="compile"):
+        if self.enabled:
+            self.events.append(self.make_event(name, "E", category))
+            if self.open_spans: self.open_spans.pop()
+
+    @contextlib.contextmanager
+    def span(self, name:str, category:str="compile", **args):
+        self.begin(name, category, **args)
+        try: yield
+        finally: self.end(name, category)
+
+    def timed(self, items:Iterable, name:str, category:str="compile", **args) -> Iterator:
+        """
+        Times a lazy phase, whose work is interleaved with the phase consuming
+        its items. Its complete event starts with the first item and lasts the
+        time spent producing the items only.
+        """
+        if not self.enabled: return iter(items)
+        return self.iterate_timed(iter(items), name, category, args)
+
+    def iterate_timed(self, items:Iterator, name:str, category:str, args:dict) -> Iterator:
+        event = self.make_event(name, "X", category, args)
+        event["dur"] = 0
+        self.events.append(event)  # Added now to be written even if the consumer stops on an error
+        end = object()
+        while True:
+            start_time = self.get_timestamp()
+            item = next(items, end)
+            event["dur"] += self.get_timestamp() - start_time
+            if item is end: return
+            yield item
+
+    def write(self, path:str):
+        """
+        Writes the events, the spans still open when the compilation stops on
+        an error are ended at the time of the writing.
+        """
+        events = self.events + [self.make_event(name, "E", category) for name, category in reversed(self.open_spans)]
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
@@ -2,6 +2,7 @@ import llvmlite.ir as ir
 import lib.lang as lang
 import lib.stack as stack
 import lib.names as names
+import lib.frame as frame
 
 class Value():
     """
@@ -25,7 +26,6 @@ class LiteralValue(Value):
         if lang.is_a_token(self.token): self.token_string = token.token_string
         self.size:int
         self.type:ir.Type
-        self.value_ptr:ir.Value
         self.value:any
         self.type_context = type_context
         self.proc()
@@ -40,24 +40,21 @@ class LiteralValue(Value):
                 self.size = lang.how_much_bytes(integer)
                 self.type = ir.IntType(self.size * 8)
                 self.set_type_from_context()
-                try: self.type = self.token.type
-                except: pass
+                if self.token.type_name is not None: self.type = self.token.type
                 self.value = ir.Constant(self.type, integer)
             elif self.token.verify_type("decimal"):
                 decimal = float(self.token_string)
                 self.size = lang.how_much_bytes_decimal(decimal)
                 self.type = lang.FLOAT_32 if self.size == 4 else lang.FLOAT_64
                 self.set_type_from_context()
-                try: self.type = self.token.type
-                except: pass
+                if self.token.type_name is not None: self.type = self.token.type
                 self.value = ir.Constant(self.type, decimal)
             elif self.token.verify_type("boolean"):
                 boolean = 1 if self.token_string.lower() == "true" else 0
                 self.size = 1
                 self.type = lang.BOOLEAN
                 self.set_type_from_context()
-                try: self.type = self.token.type
-                except: pass
+                if self.token.type_name is not None: self.type = self.token.type
                 self.value = ir.Constant(self.type, boolean)
             elif self.token.verify_type("string"):
                 string = self.token_string
@@ -68,8 +65,7 @@ class LiteralValue(Value):
 
                 self.type = string_type
                 self.set_type_from_context()
-                try: self.type = self.token.type
-                except: pass
+                if self.token.type_name is not None: self.type = self.token.type
                 
                 string_constant = ir.Constant(string_type, bytearray(string_data))
                 
@@ -84,9 +80,7 @@ class LiteralValue(Value):
                 path = self.token_string
                 found:names.Variable = self.scope.get_from_path(path)
                 if not isinstance(found, names.Variable):
-                    options = None
-                    try: options = self.token.options
-                    except: pass
+                    options = self.token.options
                     if isinstance(found, names.Function) and not options is None:
                         arguments = []
                         found:names.Function
@@ -108,117 +102,12 @@ class LiteralValue(Value):
                         self.compiler.raise_exception(self.InvalidElementType, "Need to be a variable or a function with arguments.")
                 else:
                     self.set_type_from_context()
-                    try: self.type = self.token.type
-                    except: self.type = found.type
+                    self.type = found.type if self.token.type_name is None else self.token.type
                     self.value = found.get_value(self.builder, self.type)
             else:
                 self.compiler.raise_exception(self.InvalidLiteralValueType)
-            try:
-                self.value_ptr = self.builder.alloca(self.type)
-                self.builder.store(self.value, self.value_ptr)
-            except: pass
         elif lang.is_a_stack(self.token):
-            self.size = 128  # Default
-            try: self.size = self.token.size
-            except: pass
-            self.stack = stack.Stack(self.builder, self.size, self.compiler.generate_id())
-            for element in self.token.elements:
-                if self.compiler.verify_literal_value_type(element):
-                    value = LiteralValue(self.compiler, element, self.builder, self.scope, self.type_context)
-                    self.stack.push(value.value)
-                elif lang.is_a_token(element) and element.verify_type("operator"):
-                    if element.verify("operator", lang.DOT_PERCENTAGE):
-                        self.stack.push_top_ptr()
-                    elif element.verify("operator", lang.DOT_DOT_PERCENTAGE):
-                        self.stack.push_base_ptr()
-                    elif element.verify("operator", lang.EXCLAM):
-                        self.stack.push_size()
-                    elif element.verify("operator", lang.PERCENTAGE):
-                        self.stack.push(self.stack.pop_val())
-                    elif element.verify("operator", "dup"):
-                        to_dup = self.stack.pop_val()
-                        self.stack.push(to_dup)
-                        self.stack.push(to_dup)
-                    elif element.verify("operator", lang.STAR):
-                        ptr = self.stack.pop()
-                        ptr_ptr = self.builder.alloca(ptr.type)
-                        self.builder.store(ptr, ptr_ptr)
-                        self.stack.push(ptr_ptr)
-                    elif element.verify("operator", lang.PLUS):
-                        value_b = self.stack.pop_val()
-                        value_a = self.stack.pop_val()
-                        self.stack.push(self.builder.add(value_a, value_b))
-                    elif element.verify("operator", lang.DASH):
-                        value_b = self.stack.pop_val()
-                        value_a = self.stack.pop_val()
-                        op_func = self.builder.sub
-                        if value_a.type in [lang.FLOAT_64, lang.FLOAT_32]:  # TODO: Do an get_popularized_type()
-                            op_func = self.builder.fsub
-                        print(op_func, value_a)
-                        self.stack.push(op_func(value_a, value_b))
-                    elif element.verify("operator", lang.BANG):
-                        value = self.stack.pop_val()
-                        cond = self.builder.icmp_unsigned("==", value, lang.FALSE)
-                        with self.builder.if_else(cond) as (then, otherwise):
-                            with then: self.stack.push(lang.TRUE)
-                            with otherwise: self.stack.push(lang.FALSE)
-                    elif element.verify("operator", lang.EQUAL_EQUAL):
-                        value_b = self.stack.pop_val()
-                        value_a = self.stack.pop_val()
-                        self.stack.push(self.builder.icmp_unsigned("==", value_a, value_b))
-                    elif element.verify("operator", lang.BANG_EQUAL):
-                        value_b = self.stack.pop_val()
-                        value_a = self.stack.pop_val()
-                        self.stack.push(self.builder.icmp_unsigned("!=", value_a, value_b))
-                    elif element.verify("operator", lang.LESS_EQUAL):
-                        value_b = self.stack.pop_val()
-                        value_a = self.stack.pop_val()
-                        self.stack.push(self.builder.icmp_unsigned("<=", value_a, value_b))
-                    elif element.verify("operator", lang.GREATER_EQUAL):
-                        value_b = self.stack.pop_val()
-                        value_a = self.stack.pop_val()
-                        self.stack.push(self.builder.icmp_unsigned(">=", value_a, value_b))
-                    elif element.verify("operator", lang.LESS_THAN):
-                        value_b = self.stack.pop_val()
-                        value_a = self.stack.pop_val()
-                        self.stack.push(self.builder.icmp_unsigned("<", value_a, value_b))
-                    elif element.verify("operator", lang.GREATER_THAN):
-                        value_b = self.stack.pop_val()
-                        value_a = self.stack.pop_val()
-                        self.stack.push(self.builder.icmp_unsigned(">", value_a, value_b))
-                    elif element.verify("operator", "and"):
-                        value_b = self.stack.pop_val()
-                        value_a = self.stack.pop_val()
-                        cond_a = self.builder.icmp_unsigned("==", value_a, lang.FALSE)
-                        cond_b = self.builder.icmp_unsigned("==", value_b, lang.FALSE)
-                        not_a = self.builder.not_(cond_a)
-                        not_b = self.builder.not_(cond_b)
-                        cond = self.builder.and_(not_a, not_b)
-                        result = self.builder.select(cond, lang.TRUE, lang.FALSE)
-                        self.stack.push(result)
-                    elif element.verify("operator", "or"):
-                        value_b = self.stack.pop_val()
-                        value_a = self.stack.pop_val()
-                        cond_a = self.builder.icmp_unsigned("==", value_a, lang.FALSE)
-                        cond_b = self.builder.icmp_unsigned("==", value_b, lang.FALSE)
-                        not_a = self.builder.not_(cond_a)
-                        not_b = self.builder.not_(cond_b)
-                        cond = self.builder.or_(not_a, not_b)
-                        result = self.builder.select(cond, lang.TRUE, lang.FALSE)
-                        self.stack.push(result)
-                    else:
-                        self.compiler.raise_exception(self.InvalidOperator)
-                else:
-                    self.compiler.raise_exception(self.InvalidLiteralValueType)
-            conv_type = lang.UNSIGNED_8.as_pointer()
-            try: conv_type = self.token.type.as_pointer()
-            except: pass
-            self.type = conv_type
-            if self.set_type_from_context():
-                self.type = self.type.as_pointer()
-            result = self.stack.pop()
-            typed_result = self.builder.bitcast(result, self.type)
-            self.value = self.builder.load(typed_result)
+            self.proc_stack()
         elif lang.is_a_segment(self.token):
             elements = lang.split_tokens(self.token.elements, "delimiter", lang.COMMA)
             final_list = []
@@ -233,6 +122,293 @@ class LiteralValue(Value):
         else:
             self.compiler.raise_exception(self.InvalidElementType)
 
+    # Operators folded at compile time, on the bytes read by `Stack.pop_val`
+    FOLDED_BINARY_OPERATORS = {  # Operator: (operation, result type)
+        lang.PLUS: (lambda a, b: (a + b) & 0xFF, lang.UNSIGNED_8),
+        lang.DASH: (lambda a, b: (a - b) & 0xFF, lang.UNSIGNED_8),
+        lang.EQUAL_EQUAL: (lambda a, b: a == b, lang.BOOLEAN),
+        lang.BANG_EQUAL: (lambda a, b: a != b, lang.BOOLEAN),
+        lang.LESS_EQUAL: (lambda a, b: a <= b, lang.BOOLEAN),
+        lang.GREATER_EQUAL: (lambda a, b: a >= b, lang.BOOLEAN),
+        lang.LESS_THAN: (lambda a, b: a < b, lang.BOOLEAN),
+        lang.GREATER_THAN: (lambda a, b: a > b, lang.BOOLEAN),
+        "and": (lambda a, b: a != 0 and b != 0, lang.BOOLEAN),
+        "or": (lambda a, b: a != 0 or b != 0, lang.BOOLEAN)
+    }
+
+    def get_stack(self) -> stack.Stack|stack.InlineStack|stack.StaticStack:
+        if self.stack is None:
+            pimo_instance = self.compiler.pimo_instance
+            if self.static:
+                self.stack = stack.StaticStack(self.builder, self.size)
+                return self.stack
+            runtime_stack = stack.InlineStack if pimo_instance.inline_slots else stack.Stack
+            unchecked = pimo_instance.unchecked and self.is_stack_bounded()
+            size_in_bytes = stack.Stack.HEADER_SIZE + self.size * stack.Stack.ELEMENT_SIZE
+            stack_arena = None  # The stacks giving a pointer are never released
+            if not self.gives_stack_pointer(): stack_arena = self.compiler.get_arena(self.builder, size_in_bytes)
+            self.stack = runtime_stack(self.builder, self.size, self.compiler.generate_id(), self.compiler.get_runtime(self.builder.module), unchecked, pimo_instance.checked, stack_arena)
+        return self.stack
+
+    def is_stack_bounded(self) -> bool:
+        """
+        If the stack is never popped when empty nor holds more elements than
+        its size, so its checks can be dropped. Its result is popped once it's
+        built, so it must end with an element.
+        """
+        depths = self.get_stack_depths()
+        return bool(depths) and depths[-1] > 0 and max(depths) <= self.size
+
+    def gives_stack_pointer(self) -> bool:
+        """
+        If an element pushes a pointer in the stack, who can be in the result.
+        """
+        return any(lang.is_a_token(element) and element.verify_type("operator") and element.key in (lang.DOT_PERCENTAGE, lang.DOT_DOT_PERCENTAGE) for element in self.token.elements)
+
+    def get_stack_depths(self) -> list[int]|None:
+        """
+        Depth of the stack after each element, None if an element is unknown
+        or pops an empty stack.
+        """
+        depths = []
+        depth = 0
+        for element in self.token.elements:
+            if not (lang.is_a_token(element) and element.verify_type("operator")):
+                if not self.compiler.verify_literal_value_type(element): return None
+                pops, pushes = 0, 1
+            elif element.key in self.FOLDED_BINARY_OPERATORS: pops, pushes = 2, 1
+            elif element.key in (lang.BANG, lang.PERCENTAGE, lang.STAR): pops, pushes = 1, 1
+            elif element.key == "dup": pops, pushes = 1, 2
+            elif element.key in (lang.EXCLAM, lang.DOT_PERCENTAGE, lang.DOT_DOT_PERCENTAGE): pops, pushes = 0, 1
+            else: return None
+            if depth < pops: return None  # Would pop a null pointer
+            depth += pushes - pops
+            depths.append(depth)
+        return depths
+
+    def can_simulate_stack(self) -> bool:
+        """
+        If the stack can be a `StaticStack`, its depth is known after each
+        element and it never gives its top or base pointer.
+        """
+        depths = self.get_stack_depths()
+        return bool(depths) and depths[-1] > 0 and not self.gives_stack_pointer()
+
+    def get_stack_size(self) -> int:
+        """
+        Initial size of the stack, its maximum depth with the `-fs` option
+        when it's known and the size isn't read by `!`.
+        """
+        if self.token.size is not None: return self.token.size
+        if self.compiler.pimo_instance.fitted_stacks:
+            reads_size = any(lang.is_a_token(element) and element.verify("operator", lang.EXCLAM) for element in self.token.elements)
+            depths = self.get_stack_depths()
+            if depths and not reads_size: return max(depths)
+        return 128  # 128 by default
+
+    def get_stack_constant(self, element) -> ir.Constant|None:
+        """
+        Constant of an integer or boolean element of a stack, typed like
+        `proc` would type it but without emitting anything.
+        """
+        if not lang.is_a_token(element): return None
+        if element.verify_type("integer"):
+            value = int(element.token_string)
+            element_type = ir.IntType(lang.how_much_bytes(value) * 8)
+        elif element.verify_type("boolean"):
+            value = 1 if element.key == "true" else 0
+            element_type = lang.BOOLEAN
+        else:
+            return None
+        if self.type_context: element_type = self.type_context
+        if element.type_name is not None: element_type = element.type
+        if not isinstance(element_type, ir.IntType): return None
+        return ir.Constant(element_type, value)
+
+    def fold_stack_operator(self, operator:lang.Token, pending:list[ir.Constant]) -> bool:
+        """
+        Applies an operator to the constants on top of the stack, returns False
+        if it needs the stack at runtime.
+        """
+        get_byte = lambda constant: int(constant.constant) & 0xFF  # `Stack.pop_val` reads the first byte
+        key = operator.key
+        if key in self.FOLDED_BINARY_OPERATORS:
+            if len(pending) < 2: return False
+            operation, result_type = self.FOLDED_BINARY_OPERATORS[key]
+            value_b = get_byte(pending.pop())
+            value_a = get_byte(pending.pop())
+            pending.append(ir.Constant(result_type, int(operation(value_a, value_b))))
+        elif key == lang.BANG:
+            if not pending: return False
+            pending.append(ir.Constant(lang.BOOLEAN, int(get_byte(pending.pop()) == 0)))
+        elif key == "dup":
+            if not pending: return False
+            value = ir.Constant(lang.UNSIGNED_8, get_byte(pending.pop()))
+            pending += [value, value]
+        else:
+            return False
+        return True
+
+    def proc_stack(self):
+        """
+        The constant elements and the operators on them are folded at compile
+        time, they are only pushed when an element needs the stack at runtime.
+        The stack isn't created if the whole expression is constant, and it's
+        only simulated with the `-ss` option when possible.
+        """
+        self.size = self.get_stack_size()
+        self.stack = None
+        self.static = self.compiler.pimo_instance.static_stacks and self.can_simulate_stack()
+        pending:list[ir.Constant] = []  # Top of the stack, not pushed yet
+        depth = 0  # Known while the stack isn't popped when empty
+        folding = True
+
+        def flush():
+            runtime_stack = self.get_stack()
+            for constant in pending: runtime_stack.push(constant)
+            pending.clear()
+
+        for element in self.token.elements:
+            is_operator = lang.is_a_token(element) and element.verify_type("operator")
+            if folding and not is_operator:
+                constant = self.get_stack_constant(element)
+                if constant is not None:
+                    pending.append(constant)
+                    depth += 1
+                    continue
+            elif folding and is_operator:
+                pending_count = len(pending)
+                if self.fold_stack_operator(element, pending):
+                    depth += len(pending) - pending_count
+                    continue
+
+            self.get_stack()  # Created before the elements, like without folding
+            flush()
+            if self.compiler.verify_literal_value_type(element):
+                value = LiteralValue(self.compiler, element, self.builder, self.scope, self.type_context)
+                self.stack.push(value.value)
+                depth += 1
+            elif is_operator:
+                depth += self.apply_stack_operator(element)
+            else:
+                self.compiler.raise_exception(self.InvalidLiteralValueType)
+            if depth < 0: folding = False
+
+        conv_type = lang.UNSIGNED_8 if self.token.type_name is None else self.token.type
+        self.type = conv_type.as_pointer()
+        if self.set_type_from_context():
+            self.type = self.type.as_pointer()
+        result_type = self.type.pointee
+
+        if self.stack is None and pending and isinstance(result_type, ir.IntType):
+            # Read through a pointer to the top value, so its first bytes
+            value = int(pending[-1].constant) & ((1 << pending[-1].type.width) - 1)
+            self.value = ir.Constant(result_type, value & ((1 << result_type.width) - 1))
+            return
+
+        self.get_stack()
+        flush()
+        self.value = self.stack.pop_as(result_type)
+        if not self.static and not self.gives_stack_pointer():
+            self.stack.destroy()  # Freed once its result is loaded
+
+    def apply_stack_operator(self, element:lang.Token) -> int:
+        """
+        Emits an operator on the stack at runtime, returns how much it changes
+        the stack depth.
+        """
+        if element.verify("operator", lang.DOT_PERCENTAGE):
+            self.stack.push_top_ptr()
+            return 1
+        elif element.verify("operator", lang.DOT_DOT_PERCENTAGE):
+            self.stack.push_base_ptr()
+            return 1
+        elif element.verify("operator", lang.EXCLAM):
+            self.stack.push_size()
+            return 1
+        elif element.verify("operator", lang.PERCENTAGE):
+            self.stack.push(self.stack.pop_val())
+            return 0
+        elif element.verify("operator", "dup"):
+            to_dup = self.stack.pop_val()
+            self.stack.push(to_dup)
+            self.stack.push(to_dup)
+            return 1
+        elif element.verify("operator", lang.STAR):
+            ptr = self.stack.pop()
+            ptr_ptr = frame.alloca(self.builder, ptr.type)
+            self.builder.store(ptr, ptr_ptr)
+            self.stack.push(ptr_ptr)
+            return 0
+        elif element.verify("operator", lang.PLUS):
+            value_b = self.stack.pop_val()
+            value_a = self.stack.pop_val()
+            self.stack.push(self.builder.add(value_a, value_b))
+        elif element.verify("operator", lang.DASH):
+            value_b = self.stack.pop_val()
+            value_a = self.stack.pop_val()
+            op_func = self.builder.sub
+            if value_a.type in [lang.FLOAT_64, lang.FLOAT_32]:  # TODO: Do an get_popularized_type()
+                op_func = self.builder.fsub
+            self.stack.push(op_func(value_a, value_b))
+        elif element.verify("operator", lang.BANG):
+            value = self.stack.pop_val()
+            cond = self.builder.icmp_unsigned("==", value, lang.FALSE)
+            if self.stack.tracks_pushes:
+                self.stack.push(cond)  # The pushed boolean is the condition
+                return 0
+            with self.builder.if_else(cond) as (then, otherwise):
+                with then: self.stack.push(lang.TRUE)
+                with otherwise: self.stack.push(lang.FALSE)
+            return 0
+        elif element.verify("operator", lang.EQUAL_EQUAL):
+            value_b = self.stack.pop_val()
+            value_a = self.stack.pop_val()
+            self.stack.push(self.builder.icmp_unsigned("==", value_a, value_b))
+        elif element.verify("operator", lang.BANG_EQUAL):
+            value_b = self.stack.pop_val()
+            value_a = self.stack.pop_val()
+            self.stack.push(self.builder.icmp_unsigned("!=", value_a, value_b))
+        elif element.verify("operator", lang.LESS_EQUAL):
+            value_b = self.stack.pop_val()
+            value_a = self.stack.pop_val()
+            self.stack.push(self.builder.icmp_unsigned("<=", value_a, value_b))
+        elif element.verify("operator", lang.GREATER_EQUAL):
+            value_b = self.stack.pop_val()
+            value_a = self.stack.pop_val()
+            self.stack.push(self.builder.icmp_unsigned(">=", value_a, value_b))
+        elif element.verify("operator", lang.LESS_THAN):
+            value_b = self.stack.pop_val()
+            value_a = self.stack.pop_val()
+            self.stack.push(self.builder.icmp_unsigned("<", value_a, value_b))
+        elif element.verify("operator", lang.GREATER_THAN):
+            value_b = self.stack.pop_val()
+            value_a = self.stack.pop_val()
+            self.stack.push(self.builder.icmp_unsigned(">", value_a, value_b))
+        elif element.verify("operator", "and"):
+            value_b = self.stack.pop_val()
+            value_a = self.stack.pop_val()
+            cond_a = self.builder.icmp_unsigned("==", value_a, lang.FALSE)
+            cond_b = self.builder.icmp_unsigned("==", value_b, lang.FALSE)
+            not_a = self.builder.not_(cond_a)
+            not_b = self.builder.not_(cond_b)
+            cond = self.builder.and_(not_a, not_b)
+            result = self.builder.select(cond, lang.TRUE, lang.FALSE)
+            self.stack.push(result)
+        elif element.verify("operator", "or"):
+            value_b = self.stack.pop_val()
+            value_a = self.stack.pop_val()
+            cond_a = self.builder.icmp_unsigned("==", value_a, lang.FALSE)
+            cond_b = self.builder.icmp_unsigned("==", value_b, lang.FALSE)
+            not_a = self.builder.not_(cond_a)
+            not_b = self.builder.not_(cond_b)
+            cond = self.builder.or_(not_a, not_b)
+            result = self.builder.select(cond, lang.TRUE, lang.FALSE)
+            self.stack.push(result)
+        else:
+            self.compiler.raise_exception(self.InvalidOperator)
+        return -1
+
 class TypeValue(Value):
     class NotStructure(BaseException): ...
     class NotType(BaseException): ...
@@ -260,15 +436,10 @@ class TypeValue(Value):
             else:
                 self.compiler.raise_exception(self.InvalidTypeValue)
             
-            try: self.token.ptr_iter
-            except: pass
-            else:
-                for i in range(self.token.ptr_iter):
-                    self.type = self.type.as_pointer()
+            for i in range(self.token.ptr_iter):
+                self.type = self.type.as_pointer()
 
-            try: self.token.array_stacks
-            except: pass
-            else:
+            if self.token.array_stacks is not None:
                 for stack in self.token.array_stacks:
                     stack:lang.Block
                     if not len(stack.elements):
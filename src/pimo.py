@@ -8,9 +8,12 @@ PIMO_DIR = os.path.dirname(SRC_DIR)
 sys.path += [SRC_DIR, LIB_DIR]
 
 import lib.sourcecode as sourcecode
-import lib.compiler as compiler
+import lib.batch as batch
+import lib.cache as cache
 import lib.logger as logger
 import lib.parser as parser
+import lib.server as server
+import lib.trace as trace
 import lib.utils as utils
 
 class Main():
@@ -25,8 +28,12 @@ class Main():
     class ExistantAssemblyOutput(BaseException): ...
     class ExistantOutput(BaseException): ...
     class ExecuteWithoutChangeMod(BaseException): ...
+    class OutputWithManySources(BaseException): ...
+    class NoSourceCode(BaseException): ...
+    class IncompatibleOptions(BaseException): ...
 
-    def __init__(self, argv:list[str]) -> None:
+    def __init__(self, argv:list[str], sourcecode_path:str=None) -> None:
+        self.argv = argv
         self.arg_parser = argparse.ArgumentParser(prog="pimo", description="Compile .pim programs.")
         self.arg_parser.add_argument("-t", "--timer", action="store_true")  # For get compile time
         self.arg_parser.add_argument("-o", "--output", type=str)  # For choose a specific output path
@@ -44,7 +51,18 @@ class Main():
         self.arg_parser.add_argument("-e", "--execute", action="store_true")  # For execute the output after compiling
         self.arg_parser.add_argument("-opt", "--optimize", action="store_true")  # For optimize the LLVM file.
         self.arg_parser.add_argument("-w", "--windows", action="store_true")  # For Windows.
-        self.arg_parser.add_argument("sourcecode", type=str)
+        self.arg_parser.add_argument("-ss", "--static-stacks", action="store_true")  # For simulate the stacks at compile time when possible
+        self.arg_parser.add_argument("-is", "--inline-slots", action="store_true")  # For store the scalars in the slots of the runtime stacks
+        self.arg_parser.add_argument("-fs", "--fitted-stacks", action="store_true")  # For size the stacks to their maximum depth when it's known
+        self.arg_parser.add_argument("-uc", "--unchecked", "--release", action="store_true")  # For drop the checks of the stacks who are proven bounded
+        self.arg_parser.add_argument("-ck", "--checked", action="store_true")  # For trap with a message when an empty stack is popped
+        self.arg_parser.add_argument("-ca", "--cache", action="store_true")  # For reuse the cached outputs of an unchanged source
+        self.arg_parser.add_argument("-cd", "--cache-dir", type=str, default=cache.get_default_cache_dir())  # For choose the cache directory
+        self.arg_parser.add_argument("-cl", "--cache-limit", type=int, default=256)  # For the cache size limit, in MB
+        self.arg_parser.add_argument("-cs", "--cache-stats", action="store_true")  # For show the cache statistics
+        self.arg_parser.add_argument("-tr", "--trace", type=str)  # For write a Chrome trace of the compile phases
+        self.arg_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())  # For the number of workers compiling many sources
+        self.arg_parser.add_argument("sourcecode", type=str, nargs="+")  # Source files, or directories of source files
         self.args = vars(self.arg_parser.parse_args(argv))
 
         self.silent:bool = self.args["silent"]
@@ -63,8 +81,34 @@ class Main():
         self.execute:bool = self.args["execute"]
         self.optimize:bool = self.args["optimize"]
         self.windows:bool = self.args["windows"]
+        self.static_stacks:bool = self.args["static_stacks"]
+        self.inline_slots:bool = self.args["inline_slots"]
+        self.fitted_stacks:bool = self.args["fitted_stacks"]
+        self.unchecked:bool = self.args["unchecked"]
+        self.checked:bool = self.args["checked"]
+        self.cache_enabled:bool = self.args["cache"]
+        self.cache_dir:str = self.args["cache_dir"]
+        self.cache_limit:int = self.args["cache_limit"]
+        self.cache_stats:bool = self.args["cache_stats"]
+
+        self.jobs:int = self.args["jobs"]
+        self.trace_output:str = self.args["trace"]
+        self.batch_worker = sourcecode_path is not None
 
-        self.sourcecode_path:str = self.args["sourcecode"]
+        self.logger = logger.Logger(not self.silent, self.uncolored_logs)
+        self.error_logger = logger.ErrorLogger(self.uncolored_errors)
+        self.tracer = trace.Tracer(self.trace_output is not None, sourcecode_path or "pimo")
+
+        if sourcecode_path is None:
+            self.sourcecode_paths:list[str] = batch.find_sources(self.args["sourcecode"])
+            self.batch_mode = len(self.sourcecode_paths) != 1 or os.path.isdir(self.args["sourcecode"][0])
+        else:
+            self.sourcecode_paths:list[str] = [sourcecode_path]
+            self.batch_mode = False
+
+        if self.batch_mode: return
+
+        self.sourcecode_path:str = self.sourcecode_paths[0]
         
         if not self.output:
             self.output = os.path.join(os.path.dirname(self.sourcecode_path), os.path.splitext(os.path.basename(self.sourcecode_path))[0])
@@ -76,20 +120,19 @@ class Main():
         if self.windows:
             self.output += ".exe"
 
-        self.logger = logger.Logger(not self.silent, self.uncolored_logs)
-        self.error_logger = logger.ErrorLogger(self.uncolored_errors)
-
     def raise_exception(self, exception:BaseException, *args):
         error_args = f"\n{self.error_logger.start}      ↳ ".join(args)
         exception_name = f'{exception=}'.replace("=", "").split(".")[-1].replace("'>", "")
         self.error_logger.log(f"{exception_name}: {error_args}", "error")
-        self.end()
-        sys.exit(1)
+        self.end(1)
     
     def execute_command(self, command:str):
         command = command.strip()
         self.logger.log(command, "cmd")
-        output = subprocess.check_output(command, shell=True).decode("utf-8")
+        try: output = subprocess.check_output(command, shell=True, stderr=subprocess.STDOUT).decode("utf-8")
+        except subprocess.CalledProcessError as e:
+            self.logger.log(f"\n{self.logger.start}    ↳ ".join(e.output.decode("utf-8").splitlines() or ["-"]), "out")
+            raise
         output_lines = output.splitlines()
         to_log = "-"
         if len(output_lines):
@@ -110,6 +153,13 @@ class Main():
         if self.timer:
             self.start_time = time.time()
             self.logger.log("Timer started.", "work")
+
+        if self.unchecked and self.checked:
+            self.raise_exception(self.IncompatibleOptions, "The `-uc` unchecked and `-ck` checked options can't be used together.")
+
+        if self.batch_mode:
+            self.start_batch()
+            return
         
         if self.execute and not self.output:
             self.raise_exception(self.ExecuteWithoutChangeMod, "You need to add the `-c` change mod option for execute the output.")
@@ -120,6 +170,12 @@ class Main():
         if os.path.splitext(os.path.basename(self.sourcecode_path))[1].lower() != ".pim":
             self.raise_exception(self.InvalidFileExtension, os.path.basename(self.sourcecode_path))
 
+        if self.bum:
+            self.logger.log("Only parsing due to the `-b` bum option.", "info")
+            self.read_sourcecode()
+            self.parse()
+            return
+
         if os.path.exists(self.llvm_output):
             if self.replace:
                 os.remove(self.llvm_output)
@@ -148,94 +204,195 @@ class Main():
             else:
                 self.raise_exception(self.ExistantOutput, self.output, "Use the `-r` replace option to replace the output.")
         
-        if not self.bum:
-            listed_files = []
-            listed_files.append(self.output)
-            if self.keep_llvm: listed_files.append(self.llvm_output)
-            if self.keep_obj: listed_files.append(self.obj_output)
-            if self.assembly: listed_files.append(self.asm_output)
-
-            self.logger.log(f"Here's the output file who will be created after compilation : {', '.join(listed_files)}", "info")
-
+        listed_files = []
+        listed_files.append(self.output)
+        if self.keep_llvm: listed_files.append(self.llvm_output)
+        if self.keep_obj: listed_files.append(self.obj_output)
+        if self.assembly: listed_files.append(self.asm_output)
+
+        self.logger.log(f"Here's the output file who will be created after compilation : {', '.join(listed_files)}", "info")
+
+        self.read_sourcecode()
+
+        if self.cache_enabled:
+            self.cache = cache.BuildCache(self, self.cache_dir, self.cache_limit * 1024 * 1024)
+            content = self.sourcecode.get_content()
+            self.cache_key = self.cache.make_key(content, self.get_codegen_flags())
+            self.parse_cache_key = self.cache.make_parse_key(content)
+            content.release()  # Hashed from the mapping
+
+        if not (self.cache_enabled and self.restore_from_cache()):
+            self.build()
+
+        self.finish()
+
+    def start_batch(self):
+        if self.args["output"]:
+            self.raise_exception(self.OutputWithManySources, "The `-o` output option can't be used with many sources.")
+        if not self.sourcecode_paths:
+            self.raise_exception(self.NoSourceCode, *self.args["sourcecode"])
+
+        if not batch.Batch(self, self.sourcecode_paths, self.jobs).run():
+            self.end(1)
+
+    def get_codegen_flags(self) -> dict:
+        """
+        Flags who change the generated code, used in the cache keys.
+        """
+        return {
+            "optimize": self.optimize,
+            "windows": self.windows,
+            "static_stacks": self.static_stacks,
+            "inline_slots": self.inline_slots,
+            "fitted_stacks": self.fitted_stacks,
+            "unchecked": self.unchecked,
+            "checked": self.checked
+        }
+
+    def get_cached_outputs(self) -> dict[str, str]:
+        outputs = {"bin": self.output}
+        if self.keep_llvm: outputs["ll"] = self.llvm_output
+        if self.keep_obj: outputs["obj"] = self.obj_output
+        if self.assembly: outputs["asm"] = self.asm_output
+        return outputs
+
+    def restore_from_cache(self) -> bool:
+        outputs = self.get_cached_outputs()
+        with self.tracer.span("BuildCache.lookup", "cache"):
+            paths = self.cache.lookup(self.cache_key, list(outputs.keys()))
+        if paths is None:
+            self.logger.log("No cached outputs found, compiling.", "info")
+            return False
+        self.logger.log("Restoring cached outputs...", "work")
+        if not self.cache.restore(paths, outputs):
+            self.logger.log("Cached outputs evicted while restoring them, compiling.", "info")
+            return False
+        self.logger.log(f"Cached outputs restored : {', '.join(outputs.values())}", "success")
+        return True
+
+    def read_sourcecode(self):
         self.logger.log("Reading the source code content...", "work")
-        self.sourcecode_content:str = open(self.sourcecode_path, "r", encoding="utf-8").read().strip()
-        self.sourcecode = sourcecode.SourceCode(self.sourcecode_content)
+        self.sourcecode = sourcecode.SourceCode.from_file(self.sourcecode_path)
         self.logger.log("Source code content ready to be used.", "success")
 
-        self.parser = parser.Parser(self)
+    def restore_parsed_from_cache(self) -> bool:
+        with self.tracer.span("BuildCache.lookup_parsed", "cache"):
+            parsed = self.cache.lookup_parsed(self.parse_cache_key)
+        if parsed is None: return False
+        self.segments, self.blocks, self.parser.strings = parsed
+        self.parser.strings_count = len(self.parser.strings)
+        self.logger.log("Parsed tree restored from the cache.", "success")
+        return True
 
-        self.logger.log("Starting parsing...", "work")
-        self.segments = self.parser.parse(self.sourcecode.content)
-        self.blocks = self.parser.parse_blocks(self.segments)
-        self.blocks = self.parser.parse_rest(self.blocks)
-        self.logger.log("Parsed.", "success")
+    def parse(self):
+        self.parser = parser.Parser(self)
+        use_cache = self.cache_enabled and not self.bum and not self.parsed  # The cached segments are only the preprocessor ones
+
+        if not (use_cache and self.restore_parsed_from_cache()):
+            self.logger.log("Starting parsing...", "work")
+            with self.tracer.span("Parser.parse"):
+                segments = self.parser.parse(self.sourcecode.get_lines())
+            with self.tracer.span("Parser.parse_blocks"):
+                self.blocks = self.parser.parse_blocks(segments)
+            shown_segments = segments if self.parsed else None  # Kept whole only to be shown
+            # The blocks hold the tokens, only the preprocessor lines are still compiled from the segments
+            self.segments = self.parser.get_preprocessor_segments(segments)
+            del segments
+            with self.tracer.span("Parser.parse_rest"):
+                self.blocks = self.parser.parse_rest(self.blocks)
+            self.logger.log("Parsed.", "success")
+
+            if use_cache:
+                with self.tracer.span("BuildCache.store_parsed", "cache"):
+                    self.cache.store_parsed(self.parse_cache_key, self.segments, self.blocks, self.parser.strings)
 
         if self.parsed:
-            self.show_parsed(self.segments)
+            self.show_parsed(shown_segments)
             self.show_parsed_blocks(self.blocks)
 
+    def build(self):
+        # Imported here since they load llvmlite, which the parser doesn't need
+        import lib.backend as backend
+        import lib.compiler as compiler
+
+        self.parse()
+
+        compiler.reset_global_state()
         self.compiler = compiler.Compiler(self)
         
         self.logger.log("Starting compiling...", "work")
-        self.compiler.compile(self.segments, self.blocks)
+        with self.tracer.span("Compiler.compile"):
+            self.compiler.compile(self.segments, self.blocks)
         self.logger.log("Compiled.", "success")
 
-        self.logger.log("Generating LLVM file...", "work")
-        llvm_module = self.compiler.get_llvm_module()
-        llvm_file = open(self.llvm_output, "w+")
-        llvm_file.write(str(llvm_module))
-        llvm_file.close()
-        self.logger.log(f"The file `{self.llvm_output}` now contains the LLVM module.", "success")
+        self.logger.log("Loading LLVM module in the backend...", "work")
+        self.backend = backend.Backend(self, self.compiler.get_llvm_module())
+        self.logger.log("LLVM module loaded.", "success")
 
-        # Optimize with the `opt` command
+        # Optimize the module in memory
         if self.optimize:
-            self.logger.log("Optimizing LLVM file...", "work")
-            try: self.execute_command(f"opt -O3 -S {self.llvm_output} -o {self.llvm_output}")
-            except: pass
+            self.logger.log("Optimizing LLVM module...", "work")
+            self.backend.optimize()
             self.logger.log(f"Optimized.", "success")
+        elif self.unchecked:
+            self.backend.optimize(0)  # Only inlines the unchecked push and pop
 
-        # Generate the object file
+        llvm_ir = None
+        if self.keep_llvm or self.cache_enabled: llvm_ir = self.backend.get_llvm_ir()  # Before the code generation, who changes the module
+
+        if self.keep_llvm:
+            self.logger.log("Generating LLVM file...", "work")
+            llvm_file = open(self.llvm_output, "w+")
+            llvm_file.write(llvm_ir)
+            llvm_file.close()
+            self.logger.log(f"The file `{self.llvm_output}` now contains the LLVM module.", "success")
+
+        # Generate the object file, the linker needs it on the disk
         self.logger.log("Generating object file...", "work")
-        try: self.execute_command(f"llc -filetype=obj {self.llvm_output} -o {self.obj_output}")
-        except: pass
-        if os.path.exists(self.obj_output):
-            self.logger.log(f"Object file generated at the path `{self.obj_output}`.", "success")
-        else:
-            self.error_logger.log(f"Object file not found, maybe due to an error.", "error")
-            self.end()
+        obj_content = self.backend.emit_object()
+        obj_file = open(self.obj_output, "wb+")
+        obj_file.write(obj_content)
+        obj_file.close()
+        self.logger.log(f"Object file generated at the path `{self.obj_output}`.", "success")
 
         # Generate the binary file
         self.logger.log("Generating binary file...", "work")
-        try: self.execute_command(f"clang {self.obj_output} -o {self.output} -Woverride-module")
-        except: pass
+        with self.tracer.span("clang (link)", "backend"):
+            try: self.execute_command(f"clang {self.obj_output} -o {self.output} -Woverride-module")
+            except: pass
         if os.path.exists(self.output):
-            self.logger.log(f"Binary file generated at the path `{self.obj_output}`.", "success")
+            self.logger.log(f"Binary file generated at the path `{self.output}`.", "success")
         else:
             self.error_logger.log(f"Binary file not found, maybe due to an error.", "error")
-            self.end()
+            self.end(1)
         
-        # Generate assembly if user asked
+        # Generate assembly if user asked, from the same module
         if self.assembly:
             self.logger.log("Generating assembly file...", "work")
-            try: self.execute_command(f"clang -S {self.llvm_output} -o {self.asm_output}")
-            except: pass
-            if os.path.exists(self.asm_output):
-                self.logger.log(f"Assembly file generated at the path `{self.asm_output}`.", "success")
-            else:
-                self.error_logger.log(f"Assembly file not found, maybe due to an error.", "error")
-                self.end()
+            asm_content = self.backend.emit_assembly()
+            asm_file = open(self.asm_output, "w+")
+            asm_file.write(asm_content)
+            asm_file.close()
+            self.logger.log(f"Assembly file generated at the path `{self.asm_output}`.", "success")
         
         # Delete files
-        if not self.keep_llvm:
-            self.logger.log("Deleting LLVM file...", "work")
-            os.remove(self.llvm_output)
-            self.logger.log("LLVM file deleted.", "success")
-        
         if not self.keep_obj:
             self.logger.log("Deleting object file...", "work")
             os.remove(self.obj_output)
             self.logger.log("Object file deleted.", "success")
 
+        if self.cache_enabled:
+            self.logger.log("Storing outputs in the cache...", "work")
+            artifacts = {"ll": llvm_ir, "obj": obj_content, "bin": self.output}
+            if self.assembly: artifacts["asm"] = asm_content
+            with self.tracer.span("BuildCache.store", "cache"):
+                self.cache.store(self.cache_key, artifacts)
+            self.logger.log("Outputs stored in the cache.", "success")
+
+    def finish(self):
+        if self.cache_enabled and self.cache_stats:
+            self.logger.log(f"Cache : {self.cache.get_summary()}", "info")
+
         if self.change_mod:
             self.logger.log(f"Changing mod due to the `-c` change mod option.", "info")
             self.execute_command(f"chmod +x {self.output}")
@@ -252,18 +409,27 @@ class Main():
                 self.execute_command(f"\"{stt}{self.output}\"")
             except Exception as e:
                 self.error_logger.log(f"Exception during the output execution : {e}", "error")
-                self.end()
+                self.end(1)
             else:
                 self.logger.log(f"Output executed.", "success")
 
-    def end(self):
+    def end(self, code:int=0):
         if self.timer:
             self.end_time = time.time()
             self.logger.log(f"Process time : {self.end_time - self.start_time}s", "info")
+
+        if self.trace_output and not self.batch_worker:
+            self.tracer.write(self.trace_output)
+            self.logger.log(f"Trace written at the path `{self.trace_output}`.", "info")
         
-        sys.exit()
+        sys.exit(code)
 
 if __name__ == "__main__":
-    instance = Main(sys.argv[1:])
-    instance.start()
-    instance.end()
+    if sys.argv[1:2] == ["serve"]:  # pimo serve [socket path]
+        server.Server(Main, utils.get_item(sys.argv, 2, None)).serve()
+    elif sys.argv[1:2] == ["client"]:  # pimo client <compile arguments>
+        sys.exit(server.Client(sys.argv[2:]).send())
+    else:
+        instance = Main(sys.argv[1:])
+        instance.start()
+        instance.end()